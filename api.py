@@ -0,0 +1,226 @@
+import hmac
+import logging
+from flask import Response, current_app, jsonify, request, stream_with_context
+from flask_login import current_user
+from models import User, Book
+from recommendation import get_popular_books
+from metrics import observe_stage
+from catalog import get_catalog
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Book columns a client may ask for with ?fields=
+BOOK_FIELDS = {
+    'title': Book.title,
+    'author': Book.author,
+    'year': Book.year_of_publication,
+    'publisher': Book.publisher,
+    'image_url': Book.image_url_m,
+    'avg_rating': Book.avg_rating,
+    'num_ratings': Book.num_ratings,
+}
+
+# Upper bounds keeping a single API call cheap
+MAX_TOP_N = 100
+MAX_BATCH_USERS = 100
+MAX_EXPORT_WORKERS = 4
+
+def requested_fields(value):
+    """Parse a comma-separated field list, keeping only known book fields."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [field.strip() for field in value if field.strip() in BOOK_FIELDS]
+
+def clamp_top_n(value, default):
+    """Clamp a requested result count to 1..MAX_TOP_N."""
+    try:
+        return max(1, min(int(value), MAX_TOP_N))
+    except (TypeError, ValueError):
+        return default
+
+def catalog_book_fields(catalog, isbns, fields):
+    """The requested fields of many books, read from the in-memory catalog."""
+    attributes = [BOOK_FIELDS[field].key for field in fields]
+    return {record.isbn: {field: getattr(record, attribute) for field, attribute in zip(fields, attributes)}
+            for record in catalog.get_many(isbns)}
+
+def _book_fields(db, isbns, fields):
+    """
+    Load the requested fields of many books, from the catalog or in one query.
+
+    Returns:
+        Dict of ISBN -> dict of field values
+    """
+    if not fields or not isbns:
+        return {}
+
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog_book_fields(catalog, isbns, fields)
+
+    columns = [BOOK_FIELDS[field] for field in fields]
+    with observe_stage('db_hydrate'):
+        rows = db.session.query(Book.isbn, *columns).filter(Book.isbn.in_(set(isbns))).all()
+    return {row[0]: dict(zip(fields, row[1:])) for row in rows}
+
+def result_items(scored, books):
+    """Compact result items: ISBN, score (rounded, None for fallbacks) and book fields."""
+    items = []
+    for isbn, score in scored:
+        item = {'isbn': isbn, 'score': round(float(score), 4) if score is not None else None}
+        item.update(books.get(isbn, {}))
+        items.append(item)
+    return items
+
+def _error(message, status_code):
+    return jsonify(error=message), status_code
+
+def has_api_token(authorization, api_token):
+    """Whether an Authorization header carries the configured API token."""
+    scheme, _, token = (authorization or '').partition(' ')
+    if not api_token or scheme.lower() != 'bearer':
+        return False
+    return hmac.compare_digest(token.strip().encode(), api_token.encode())
+
+def _access_error(user_ids):
+    """
+    Check the caller may read these users' recommendations.
+
+    The API token and admins may read any user's, logged-in users only their own.
+
+    Args:
+        user_ids: IDs of the users read, or None for all users (exports)
+
+    Returns:
+        Error response (401 or 403), or None if access is allowed
+    """
+    if has_api_token(request.headers.get('Authorization'), current_app.config['API_TOKEN']):
+        return None
+    if not current_user.is_authenticated:
+        return _error("authentication required", 401)
+    if current_user.username in current_app.config['ADMIN_USERNAMES']:
+        return None
+    if user_ids is None or any(user_id != current_user.id for user_id in user_ids):
+        return _error("not allowed to read other users' recommendations", 403)
+    return None
+
+def register_api(app):
+    """
+    Register the JSON recommendation API under /api/v1.
+
+    Args:
+        app: Flask application instance
+    """
+    from app import db
+
+    def _engine():
+        # The engine is built after startup; until then the fallbacks are used
+        import app as app_module
+        return app_module.recommendation_engine
+
+    @app.route('/api/v1/users/<int:user_id>/recommendations')
+    def api_user_recommendations(user_id):
+        """Recommendations for one user: ?top_n=24&fields=title,author (the user, an admin or the API token)"""
+        top_n = clamp_top_n(request.args.get('top_n'), 24)
+        fields = requested_fields(request.args.get('fields'))
+
+        denied = _access_error([user_id])
+        if denied:
+            return denied
+        if db.session.get(User, user_id) is None:
+            return _error(f"user {user_id} not found", 404)
+
+        engine = _engine()
+        if engine:
+            model_version, results = engine.get_versioned_recommendations([user_id], top_n)
+            scored = results[user_id]
+        else:
+            model_version, scored = None, [(isbn, None) for isbn in get_popular_books(top_n)]
+
+        books = _book_fields(db, [isbn for isbn, _ in scored], fields)
+        return jsonify(user_id=user_id, model_version=model_version,
+                       items=result_items(scored, books))
+
+    @app.route('/api/v1/books/<isbn>/similar')
+    def api_similar_books(isbn):
+        """Books similar to one book: ?top_n=6&fields=title"""
+        top_n = clamp_top_n(request.args.get('top_n'), 6)
+        fields = requested_fields(request.args.get('fields'))
+
+        if db.session.query(Book.id).filter(Book.isbn == isbn).first() is None:
+            return _error(f"book {isbn} not found", 404)
+
+        engine = _engine()
+        similar = engine.get_similar_books(isbn, top_n) if engine else []
+        scored = [(similar_isbn, None) for similar_isbn in similar[:top_n]]
+
+        books = _book_fields(db, similar, fields)
+        return jsonify(isbn=isbn, model_version=engine.version if engine else None,
+                       items=result_items(scored, books))
+
+    @app.route('/api/v1/recommendations/batch', methods=['POST'])
+    def api_batch_recommendations():
+        """
+        Recommendations for many users in one engine pass.
+
+        Body: {"user_ids": [1, 2, 3], "top_n": 10, "fields": ["title"]}
+        Admins and the API token may ask for any users, other callers only for themselves.
+        """
+        payload = request.get_json(silent=True) or {}
+        user_ids = payload.get('user_ids')
+        if not isinstance(user_ids, list) or not user_ids:
+            return _error("user_ids must be a non-empty list", 400)
+        try:
+            user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        except (TypeError, ValueError):
+            return _error("user_ids must be integers", 400)
+        if len(user_ids) > MAX_BATCH_USERS:
+            return _error(f"at most {MAX_BATCH_USERS} user_ids per request", 400)
+        denied = _access_error(user_ids)
+        if denied:
+            return denied
+
+        top_n = clamp_top_n(payload.get('top_n'), 24)
+        fields = requested_fields(payload.get('fields'))
+
+        engine = _engine()
+        if engine:
+            model_version, results = engine.get_versioned_recommendations(user_ids, top_n)
+        else:
+            popular = [(isbn, None) for isbn in get_popular_books(top_n)]
+            model_version, results = None, {user_id: popular for user_id in user_ids}
+
+        # Book fields for all users' recommendations in one query
+        books = _book_fields(db, [isbn for scored in results.values() for isbn, _ in scored], fields)
+        return jsonify(model_version=model_version, results=[
+            {'user_id': user_id, 'items': result_items(results[user_id], books)} for user_id in user_ids
+        ])
+
+    @app.route('/api/v1/recommendations/export')
+    def api_export_recommendations():
+        """
+        Stream recommendations for all users as NDJSON, one line per user.
+
+        Query: ?after=<user id>&top_n=24&limit=1000&chunk_size=100&workers=2
+        Resume an interrupted download with the user_id of its last line.
+        Admins and the API token only; `flask export-recommendations` writes the same file.
+        """
+        from export import DEFAULT_CHUNK_SIZE, iter_recommendation_records, to_ndjson
+
+        denied = _access_error(None)
+        if denied:
+            return denied
+
+        start_after = request.args.get('after', 0, type=int)
+        top_n = clamp_top_n(request.args.get('top_n'), 24)
+        limit = request.args.get('limit', None, type=int)
+        chunk_size = max(1, min(request.args.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int), MAX_BATCH_USERS))
+        workers = max(1, min(request.args.get('workers', 1, type=int), MAX_EXPORT_WORKERS))
+
+        records = iter_recommendation_records(app, db, _engine(), start_after=start_after, top_n=top_n,
+                                              chunk_size=chunk_size, workers=workers, limit=limit)
+        lines = (to_ndjson(record) for record in records)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
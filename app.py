@@ -1,10 +1,16 @@
+import gc
 import os
+import sys
 import logging
-from flask import Flask, render_template, redirect, url_for, flash, request, session
+import time
+from flask import Flask, render_template, redirect, url_for, flash, request, session, jsonify, make_response, g, abort
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import DeclarativeBase, joinedload
+import sqlite3
 import pickle
 import numpy as np
 import pandas as pd
@@ -18,16 +24,106 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "booklovers-secret-key")
 
-# Configure database to use SQLite
+# Configure database: taken from the environment, SQLite in the instance folder by default
 # Make sure the instance directory exists
 app_dir = os.path.abspath(os.path.dirname(__file__))
 instance_dir = os.path.join(app_dir, 'instance')
 os.makedirs(instance_dir, exist_ok=True)
 database_path = os.path.join(instance_dir, 'booksite.db')
 
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database_path}"
+database_url = (os.environ.get("SQLALCHEMY_DATABASE_URI")
+                or os.environ.get("DATABASE_URL")
+                or f"sqlite:///{database_path}")
+# Hosting providers still hand out the postgres:// scheme SQLAlchemy no longer accepts
+if database_url.startswith("postgres://"):
+    database_url = "postgresql://" + database_url[len("postgres://"):]
+
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# SQLite: milliseconds a writer waits for the lock before failing with "database is locked"
+app.config["SQLITE_BUSY_TIMEOUT"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+
+if not database_url.startswith("sqlite"):
+    # Connection pool for server databases (PostgreSQL)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") != "0",
+    }
+
+@event.listens_for(Engine, "connect")
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """Enable WAL and a busy timeout so readers don't block the single writer."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT']:d}")
+    cursor.close()
+
+# Set by gunicorn.conf.py when gunicorn imports the app once in its master and forks
+# the workers from it: startup then finishes before the fork, and the background
+# threads start in each worker instead of the master
+app.config["PRELOAD_APP"] = os.environ.get("PRELOAD_APP", "0") == "1"
+
+# Load data and build the recommendation engine without blocking the first requests
+# (never when preloading, so no worker forks from a half-started master)
+app.config["STARTUP_IN_BACKGROUND"] = (os.environ.get("STARTUP_IN_BACKGROUND", "1") != "0"
+                                       and not app.config["PRELOAD_APP"])
+
+# Import the BookCrossing CSV files into an empty database at startup; disable
+# to fill the database another way (e.g. flask generate-synthetic-data)
+app.config["LOAD_DATASET"] = os.environ.get("LOAD_DATASET", "1") != "0"
+
+# Seconds between checks for new model versions to hot-reload; 0 disables the watcher
+app.config["MODEL_RELOAD_INTERVAL"] = int(os.environ.get("MODEL_RELOAD_INTERVAL", 30))
+
+# Seconds between incremental refreshes of the in-memory book catalog (new books,
+# new rating counts); 0 disables the refresh
+app.config["CATALOG_REFRESH_INTERVAL"] = int(os.environ.get("CATALOG_REFRESH_INTERVAL", 60))
+
+# Milliseconds the recommended section and the profile page wait for the model
+# before answering from collaborative filtering or popular books (the model's
+# results are cached for the next request); 0 waits for the model however long
+app.config["RECOMMENDATION_BUDGET_MS"] = int(os.environ.get("RECOMMENDATION_BUDGET_MS", 300))
+
+# Pagination mode for /books: 'keyset' (cursor based) or 'offset' (page numbers)
+app.config["BOOKS_PAGINATION_MODE"] = os.environ.get("BOOKS_PAGINATION_MODE", "keyset")
+
+# Statements slower than this many milliseconds are logged with their parameter shape; 0 disables
+app.config["SLOW_QUERY_MS"] = int(os.environ.get("SLOW_QUERY_MS", 100))
+
+# Maximum SQL statements per request, by endpoint; QUERY_BUDGET applies to the
+# others (unset: no limit). Over-budget requests are logged, or fail under
+# QUERY_BUDGET_STRICT=1 and in tests
+app.config["QUERY_BUDGETS"] = {
+    'index': 2,
+    'section_fragment': 4,
+    'books': 8,
+    'books_fragment': 6,
+    'book_details': 10,
+    'profile': 10,
+    'rate_book': 20,
+}
+app.config["QUERY_BUDGET"] = int(os.environ["QUERY_BUDGET"]) if os.environ.get("QUERY_BUDGET") else None
+app.config["QUERY_BUDGET_STRICT"] = os.environ.get("QUERY_BUDGET_STRICT", "0") == "1"
+
+# Comma-separated users allowed to profile a request with ?profile=1 or an "X-Profile: 1"
+# header and to read any user's recommendations through the JSON API; none by default
+app.config["ADMIN_USERNAMES"] = set(filter(None, os.environ.get("ADMIN_USERNAMES", "").split(",")))
+app.config["PROFILE_INTERVAL_MS"] = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+app.config["PROFILES_MAX_FILES"] = int(os.environ.get("PROFILES_MAX_FILES", 100))
+app.config["PROFILES_MAX_AGE_DAYS"] = int(os.environ.get("PROFILES_MAX_AGE_DAYS", 7))
+
+# Bearer token ("Authorization: Bearer <token>") letting services read any user's
+# recommendations through the JSON API; unset: only admins and the users themselves
+app.config["API_TOKEN"] = os.environ.get("API_TOKEN") or None
+
 # Initialize SQLAlchemy
 class Base(DeclarativeBase):
     pass
@@ -42,9 +138,20 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
 # Import models, forms and utils after db initialization to avoid circular imports
-from models import User, Book, Rating, UserLibrary
+from models import User, Book, Rating, UserLibrary, BookFacet
 from forms import LoginForm, RegisterForm, RatingForm
 from data_loader import load_data_to_db
+from facets import refresh_facets, get_filter_facets, get_search_facets
+from pagination import SORT_ORDERS, InvalidCursor, filter_condition, keyset_paginate, approximate_book_count
+from migrations import run_migrations
+from startup import StartupState, run_in_background
+from recommendation import get_popular_books
+from catalog import book_catalog, get_catalog
+from metrics import REGISTRY, REQUEST_LATENCY, REQUEST_QUERIES, CONTENT_TYPE, observe_stage
+from query_stats import configure_slow_query_log, start_collecting, stop_collecting, check_query_budget
+from profiler import SamplingProfiler
+
+configure_slow_query_log(app.config["SLOW_QUERY_MS"])
 
 # We'll import RecommendationEngine only when needed to avoid TensorFlow issues
 recommendation_engine = None
@@ -53,79 +160,338 @@ recommendation_engine = None
 def load_user(user_id):
     return db.session.get(User, int(user_id))
 
-# Function to initialize the app
-def initialize_app():
-    """Initialize the application by creating DB tables and loading data."""
-    global recommendation_engine
+# Startup phases, reported by /healthz and /readyz
+startup_state = StartupState(['schema', 'data', 'engine', 'warmup'])
+
+def _initialize_schema():
+    """Create all tables and apply pending migrations."""
+    with app.app_context():
+        db.create_all()
+        
+        # Bring existing databases up to date (e.g. new indexes)
+        run_migrations(db)
+
+def _initialize_data():
+    """Load the dataset into an empty database, build the facet tables and load the book catalog."""
+    with app.app_context():
+        # Check if data needs to be loaded
+        if app.config["LOAD_DATASET"] and db.session.query(Book.id).first() is None:
+            logger.info("No books found in database. Loading data from CSV files...")
+            load_data_to_db(db)
+            logger.info("Data loaded successfully!")
+        
+        # Build facet tables for databases created before they existed
+        if db.session.query(BookFacet.id).first() is None and db.session.query(Book.id).first() is not None:
+            logger.info("Facet tables are empty. Building them from the book table...")
+            refresh_facets(db)
+        
+        # Read-only copy of the books for the engine and the display of recommendations
+        startup_state.phases['data'].details['catalog_books'] = book_catalog.load(db)
+    
+    # A preloaded master leaves refreshing to its workers (init_forked_worker)
+    if not app.config["PRELOAD_APP"]:
+        book_catalog.start_refreshing(app, db, interval=app.config["CATALOG_REFRESH_INTERVAL"])
+
+# Engine built by the 'engine' phase, published by the 'warmup' phase
+_pending_engine = None
+
+def _initialize_engine():
+    """Build the recommendation engine."""
+    global _pending_engine
+    
+    logger.info("Initializing recommendation engine...")
+    # Import here instead of at the top level to avoid TensorFlow import issues
+    from recommendation import RecommendationEngine
+    _pending_engine = RecommendationEngine()
+    logger.info("Recommendation engine initialized!")
+
+def _warm_up_engine():
+    """Trace the model at the serving batch sizes before the engine takes traffic."""
+    if _pending_engine is None:
+        raise RuntimeError("recommendation engine was not built")
     
     try:
-        # Create all tables
-        with app.app_context():
-            db.create_all()
-            
-            # Check if data needs to be loaded
-            if db.session.query(Book).count() == 0:
-                logger.info("No books found in database. Loading data from CSV files...")
-                load_data_to_db(db)
-                logger.info("Data loaded successfully!")
+        startup_state.phases['warmup'].details['batch_ms'] = _pending_engine.warm_up()
         
-        # Initialize recommendation engine with fallback mechanism
-        logger.info("Initializing recommendation engine...")
+        # Encode the in-vocabulary books now rather than on the first recommendation request
+        with app.app_context():
+            candidates = _pending_engine.get_candidate_index()
+        startup_state.phases['warmup'].details['candidates'] = len(candidates) if candidates is not None else None
+    finally:
+        # Published before the phase finishes, so a ready worker always has the engine
+        _publish_engine()
+
+def _publish_engine():
+    """Hand the built engine to the request handlers and start watching for new versions."""
+    global recommendation_engine
+    
+    # Requests use the popular-books fallback until this assignment; a failed
+    # warm-up only costs first-request latency, so the engine is published anyway
+    recommendation_engine = _pending_engine
+    
+    # Pick up newly published model versions without a restart (in each worker when preloading)
+    if not app.config["PRELOAD_APP"]:
+        recommendation_engine.start_watching(app, interval=app.config["MODEL_RELOAD_INTERVAL"])
+
+def _run_deferred_phases():
+    """Run the slow startup phases; a failure leaves the app on its fallbacks."""
+    for name, phase_func in (('data', _initialize_data), ('engine', _initialize_engine),
+                             ('warmup', _warm_up_engine)):
         try:
-            # Import here instead of at the top level to avoid TensorFlow import issues
-            from recommendation import RecommendationEngine
-            recommendation_engine = RecommendationEngine()
-            logger.info("Recommendation engine initialized!")
-        except ImportError as e:
-            logger.error(f"Could not import recommendation module: {str(e)}")
-            recommendation_engine = None
-        except Exception as e:
-            logger.error(f"Error initializing recommendation engine: {str(e)}")
-            # Set recommendation_engine to None to ensure the app still works
-            recommendation_engine = None
+            with startup_state.phase(name):
+                phase_func()
+        except Exception:
+            # Already logged by the phase; continue running with minimum functionality
+            pass
+
+# Function to initialize the app
+def initialize_app():
+    """
+    Initialize the application.
     
-    except Exception as e:
-        logger.error(f"Error during app initialization: {str(e)}")
+    The schema is created before serving; loading data and building the
+    recommendation engine run in a background thread unless
+    STARTUP_IN_BACKGROUND is disabled.
+    """
+    try:
+        with startup_state.phase('schema'):
+            _initialize_schema()
+    except Exception:
         # Continue running the app with minimum functionality
+        pass
+    
+    if app.config["STARTUP_IN_BACKGROUND"]:
+        run_in_background(_run_deferred_phases, name='app-startup')
+    else:
+        _run_deferred_phases()
+
+def prepare_for_fork():
+    """
+    Get a preloaded app ready for gunicorn to fork its workers from.
+    
+    Closes the master's database connections, which the workers must not
+    share, and moves every object loaded so far (book catalog, candidate
+    index, model state) into the garbage collector's permanent generation.
+    Collections in the workers then never write to those objects' pages, so
+    they stay shared copy-on-write instead of being copied into each worker;
+    the bundle's arrays are memory-mapped and shared through the page cache.
+    """
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    
+    if 'tensorflow' in sys.modules:
+        logger.warning("TensorFlow was imported before forking; its thread pools don't survive fork. "
+                       "Serve with MODEL_QUANTIZATION set to keep it out of the master.")
+    
+    gc.collect()
+    gc.freeze()
+    logger.info(f"App preloaded: {gc.get_freeze_count()} objects frozen before forking workers")
+
+def init_forked_worker():
+    """Start the background work of a worker forked from a preloaded master."""
+    with app.app_context():
+        # Pooled connections inherited from the master are its own; don't close them here
+        db.engine.dispose(close=False)
+    
+    book_catalog.start_refreshing(app, db, interval=app.config["CATALOG_REFRESH_INTERVAL"])
+    if recommendation_engine is not None:
+        # A version published later is loaded by each worker separately
+        recommendation_engine.start_watching(app, interval=app.config["MODEL_RELOAD_INTERVAL"])
 
 # Initialize the app at startup
 initialize_app()
 
-@app.route('/')
-def index():
-    """Home page with featured books."""
-    # Get some popular books to display
-    popular_books = Book.query.order_by(Book.avg_rating.desc()).limit(12).all()
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    start_collecting()
+    
+    # Only admins may profile; the flag is checked first so other requests never load the user
+    if request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1':
+        if current_user.is_authenticated and current_user.username in app.config["ADMIN_USERNAMES"]:
+            g.profiler = SamplingProfiler(interval=app.config["PROFILE_INTERVAL_MS"] / 1000).start()
+
+@app.after_request
+def _record_request_latency(response):
+    """Observe the request duration and SQL statements per URL rule (not per path, to bound label cardinality)."""
+    started = g.pop('request_started', None)
+    stats = stop_collecting()
+    if started is None:
+        return response
     
-    # If user is logged in, get personalized recommendations
-    recommended_books = []
-    if current_user.is_authenticated and recommendation_engine:
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        # A profile that can't be written must not fail the request it profiled
         try:
-            # Get user recommendations
-            recommended_ids = recommendation_engine.get_recommendations_for_user(current_user.id)
-            recommended_books = Book.query.filter(Book.isbn.in_(recommended_ids)).limit(8).all()
+            path = profiler.stop().write(f"{request.endpoint}-{request.path}",
+                                         max_files=app.config["PROFILES_MAX_FILES"],
+                                         max_age_days=app.config["PROFILES_MAX_AGE_DAYS"])
+            response.headers['X-Profile-File'] = os.path.basename(path)
         except Exception as e:
-            logger.error(f"Error getting recommendations: {str(e)}")
-            flash("Could not load personalized recommendations.", "warning")
+            logger.error(f"Error writing request profile: {str(e)}")
+    
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_LATENCY.observe(elapsed, route=route, method=request.method, status=response.status_code)
     
-    # If no recommendations or user not logged in, show top-rated books
-    if not recommended_books:
-        recommended_books = Book.query.order_by(Book.avg_rating.desc()).limit(8).all()
+    if stats is not None:
+        REQUEST_QUERIES.observe(stats.count, route=route)
+        response.headers.add('Server-Timing', stats.server_timing())
+        response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+        check_query_budget(request.endpoint, stats, app.config["QUERY_BUDGETS"], app.config["QUERY_BUDGET"],
+                           strict=app.config["QUERY_BUDGET_STRICT"] or app.testing)
+    return response
+
+@app.teardown_request
+def _stop_query_stats(exception=None):
+    # after_request is skipped when a view raises; don't count into the next request
+    stop_collecting()
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+
+@app.route('/metrics')
+def metrics():
+    """Request, engine stage, fallback and cache metrics in the Prometheus text format."""
+    return REGISTRY.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+def _model_status():
+    """Version and load timings of the live recommendation model, if built."""
+    return recommendation_engine.status() if recommendation_engine else None
+
+@app.route('/healthz')
+def healthz():
+    """Liveness probe: the process is up, with the state of each startup phase."""
+    return jsonify(status='ok', model=_model_status(), **startup_state.to_dict())
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe: 503 until every startup phase has finished."""
+    state = startup_state.to_dict()
+    status_code = 200 if state['ready'] else 503
+    return jsonify(status='ready' if state['ready'] else 'starting', model=_model_status(), **state), status_code
+
+@app.route('/')
+def index():
+    """Home page; the book sections are fetched as fragments after first paint."""
+    return render_template('index.html')
+
+def _fragment_response(html, cache_control, next_url=None):
+    """HTML fragment response with caching headers and an ETag for revalidation."""
+    response = make_response(html)
+    response.headers['Cache-Control'] = cache_control
+    if next_url:
+        # Read by the infinite scroll in main.js
+        response.headers['X-Next-Url'] = next_url
+    response.add_etag()
+    return response.make_conditional(request)
+
+def _books_for_display(isbns, limit):
+    """Books of a list of ISBNs in that order, from the catalog once it is loaded."""
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.get_many(isbns, limit=limit)
+    
+    books = {book.isbn: book for book in Book.query.filter(Book.isbn.in_(isbns))}
+    return [books[isbn] for isbn in isbns if isbn in books][:limit]
+
+def _recommendations_within_budget(user_id):
+    """
+    A user's recommendations within RECOMMENDATION_BUDGET_MS.
     
-    # Get recently added books
-    recent_books = Book.query.order_by(Book.id.desc()).limit(8).all()
+    Returns:
+        Tuple (list of ISBNs, tier that answered or None without a budget,
+        whether a lower tier answered because the budget ran out)
+    """
+    budget_ms = app.config["RECOMMENDATION_BUDGET_MS"]
+    if not budget_ms:
+        return recommendation_engine.get_recommendations_for_user(user_id), None, False
+    return recommendation_engine.recommend_within_budget(user_id, budget_ms)
+
+def _with_recommendation_tier(response, tier):
+    """Name the recommendation tier that answered in an X-Recommendation-Tier header."""
+    if tier:
+        response.headers['X-Recommendation-Tier'] = tier
+    return response
+
+@app.route('/fragments/<section>')
+def section_fragment(section):
+    """Book cards of one home page section: popular, recent or recommended."""
+    if section == 'popular':
+        # Get some popular books to display
+        books = Book.query.order_by(Book.avg_rating.desc()).limit(12).all()
+        cache_control = 'public, max-age=300'
+    elif section == 'recent':
+        # Get recently added books
+        books = Book.query.order_by(Book.id.desc()).limit(8).all()
+        cache_control = 'public, max-age=300'
+    elif section == 'recommended':
+        # If user is logged in, get personalized recommendations
+        books, tier, degraded = [], None, False
+        if current_user.is_authenticated and recommendation_engine:
+            try:
+                # Get user recommendations
+                recommended_ids, tier, degraded = _recommendations_within_budget(current_user.id)
+                with observe_stage('db_hydrate'):
+                    books = _books_for_display(recommended_ids, 8)
+            except Exception as e:
+                logger.error(f"Error getting recommendations: {str(e)}")
+        
+        # If no recommendations or user not logged in, show top-rated books
+        if not books:
+            books = Book.query.order_by(Book.avg_rating.desc()).limit(8).all()
+        # A degraded answer is revalidated, so the model's results show up once they are cached
+        cache_control = 'private, no-cache' if degraded else 'private, max-age=60'
+    else:
+        return render_template('error.html', error_code=404, message="Page not found"), 404
+    
+    response = _fragment_response(render_template('fragments/book_cards.html', books=books), cache_control)
+    if section == 'recommended':
+        response.vary.add('Cookie')
+        _with_recommendation_tier(response, tier)
+    return response
+
+def _filtered_books(search='', author='', publisher='', year=''):
+    """
+    Build the /books query for a search and filters.
+    
+    Returns:
+        Tuple of (filtered query, search-only query used for the facets)
+    """
+    query = db.session.query(Book)
+    
+    if search:
+        query = query.filter(Book.title.ilike(f'%{search}%') | 
+                             Book.author.ilike(f'%{search}%') |
+                             Book.isbn.ilike(f'%{search}%'))
+    search_query = query
+    
+    if author:
+        query = query.filter(filter_condition(Book.author, 'author', author))
+    if publisher:
+        query = query.filter(filter_condition(Book.publisher, 'publisher', publisher))
+    if year:
+        query = query.filter(filter_condition(Book.year_of_publication, 'year', year))
     
-    return render_template('index.html', 
-                          popular_books=popular_books,
-                          recommended_books=recommended_books,
-                          recent_books=recent_books)
+    return query, search_query
 
 @app.route('/books')
 def books():
     """Browse books page with filtering and pagination."""
-    page = request.args.get('page', 1, type=int)
     per_page = 24
     
+    # Keyset pagination by default; explicit page numbers keep the OFFSET mode working
+    pagination_mode = request.args.get('mode', app.config['BOOKS_PAGINATION_MODE'])
+    if 'page' in request.args:
+        pagination_mode = 'offset'
+    page = request.args.get('page', 1, type=int)
+    sort = request.args.get('sort', 'id')
+    if sort not in SORT_ORDERS:
+        sort = 'id'
+    after = request.args.get('after')
+    before = request.args.get('before')
+    
     # Get filter parameters
     author = request.args.get('author', '')
     publisher = request.args.get('publisher', '')
@@ -133,41 +499,67 @@ def books():
     search = request.args.get('search', '')
     
     # Build query
-    query = db.session.query(Book)
+    query, search_query = _filtered_books(search, author, publisher, year)
     
+    # Get filter values: scoped to the search, or from the materialized facet table
     if search:
-        query = query.filter(Book.title.ilike(f'%{search}%') | 
-                             Book.author.ilike(f'%{search}%') |
-                             Book.isbn.ilike(f'%{search}%'))
-    if author:
-        query = query.filter(Book.author.ilike(f'%{author}%'))
-    if publisher:
-        query = query.filter(Book.publisher.ilike(f'%{publisher}%'))
-    if year:
-        query = query.filter(Book.year_of_publication == year)
+        facets = get_search_facets(db, search_query)
+    else:
+        facets = get_filter_facets()
     
     # Execute paginated query
-    pagination = query.paginate(page=page, per_page=per_page)
+    if pagination_mode == 'keyset':
+        try:
+            pagination = keyset_paginate(query, sort=sort, after=after, before=before, per_page=per_page)
+        except InvalidCursor:
+            abort(400)
+        pagination.total = approximate_book_count(db, author=author, publisher=publisher,
+                                                  year=year, search=search)
+    else:
+        pagination_mode = 'offset'
+        if sort != 'id':
+            query = query.order_by(*[column.desc() if descending else column
+                                     for column, descending in SORT_ORDERS[sort]])
+        pagination = query.paginate(page=page, per_page=per_page)
     books = pagination.items
     
-    # Get distinct authors and publishers for filters
-    authors = db.session.query(Book.author).distinct().order_by(Book.author).limit(100).all()
-    publishers = db.session.query(Book.publisher).distinct().order_by(Book.publisher).limit(100).all()
-    years = db.session.query(Book.year_of_publication).distinct().order_by(Book.year_of_publication.desc()).all()
-    
     return render_template('books.html', 
                           books=books, 
                           pagination=pagination,
-                          authors=authors,
-                          publishers=publishers,
-                          years=years,
+                          pagination_mode=pagination_mode,
+                          authors=facets['author'],
+                          publishers=facets['publisher'],
+                          years=facets['year'],
                           current_filters={
                               'author': author,
                               'publisher': publisher,
                               'year': year,
-                              'search': search
+                              'search': search,
+                              'sort': sort
                           })
 
+@app.route('/fragments/books')
+def books_fragment():
+    """Next page of /books as book cards, for infinite scroll; X-Next-Url points to the page after."""
+    per_page = 24
+    sort = request.args.get('sort', 'id')
+    if sort not in SORT_ORDERS:
+        sort = 'id'
+    filters = {name: request.args.get(name, '') for name in ('search', 'author', 'publisher', 'year')}
+    
+    query, _ = _filtered_books(**filters)
+    try:
+        pagination = keyset_paginate(query, sort=sort, after=request.args.get('after'), per_page=per_page)
+    except InvalidCursor:
+        abort(400)
+    
+    next_url = None
+    if pagination.has_next:
+        next_url = url_for('books_fragment', after=pagination.next_cursor, sort=sort, **filters)
+    
+    html = render_template('fragments/book_cards.html', books=pagination.items, show_counts=True)
+    return _fragment_response(html, 'public, max-age=60', next_url=next_url)
+
 @app.route('/book/<isbn>')
 def book_details(isbn):
     """Book details page."""
@@ -191,7 +583,8 @@ def book_details(isbn):
     if recommendation_engine:
         try:
             similar_isbns = recommendation_engine.get_similar_books(isbn)
-            similar_books = Book.query.filter(Book.isbn.in_(similar_isbns)).limit(6).all()
+            with observe_stage('db_hydrate'):
+                similar_books = _books_for_display(similar_isbns, 6)
         except Exception as e:
             logger.error(f"Error getting similar books: {str(e)}")
     
@@ -242,14 +635,20 @@ def rate_book(isbn):
     return redirect(url_for('book_details', isbn=isbn))
 
 def update_book_avg_rating(isbn):
-    """Update a book's average rating."""
-    ratings = Rating.query.filter_by(isbn=isbn).all()
-    if ratings:
-        avg = sum(r.rating for r in ratings) / len(ratings)
+    """Update a book's average rating, aggregated in the database."""
+    num_ratings, avg_rating = db.session.query(
+        func.count(Rating.id),
+        func.avg(Rating.rating)
+    ).filter(Rating.isbn == isbn).one()
+    
+    if num_ratings:
         book = Book.query.filter_by(isbn=isbn).first()
-        book.avg_rating = avg
-        book.num_ratings = len(ratings)
+        book.avg_rating = float(avg_rating)
+        book.num_ratings = num_ratings
         db.session.commit()
+        
+        # Other workers pick the change up on their next catalog refresh
+        book_catalog.update_book(book)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -321,31 +720,56 @@ def logout():
 @login_required
 def profile():
     """User profile page."""
-    # Get user's ratings
-    user_ratings = Rating.query.filter_by(user_id=current_user.id).order_by(Rating.timestamp.desc()).all()
+    per_page = 20
+    ratings_page = request.args.get('ratings_page', 1, type=int)
+    library_page = request.args.get('library_page', 1, type=int)
+    
+    # Get one page of the user's ratings with their books in the same query
+    ratings = Rating.query.options(
+        joinedload(Rating.book)
+    ).filter_by(
+        user_id=current_user.id
+    ).order_by(
+        Rating.timestamp.desc()
+    ).paginate(page=ratings_page, per_page=per_page, error_out=False)
     
-    # Get books for these ratings
-    rated_books = {}
-    for rating in user_ratings:
-        book = Book.query.filter_by(isbn=rating.isbn).first()
-        if book:
-            rated_books[rating.isbn] = book
+    # Get one page of the user's library the same way
+    library = UserLibrary.query.options(
+        joinedload(UserLibrary.book)
+    ).filter_by(
+        user_id=current_user.id
+    ).order_by(
+        UserLibrary.added_on.desc()
+    ).paginate(page=library_page, per_page=per_page, error_out=False)
+    
+    # Reading stats over all ratings, aggregated in the database
+    rating_count, rating_avg = db.session.query(
+        func.count(Rating.id),
+        func.avg(Rating.rating)
+    ).filter(Rating.user_id == current_user.id).one()
     
     # Get personalized recommendations if recommendation engine is available
-    recommended_books = []
+    recommended_books, tier = [], None
     if recommendation_engine:
         try:
-            recommended_ids = recommendation_engine.get_recommendations_for_user(current_user.id)
-            recommended_books = Book.query.filter(Book.isbn.in_(recommended_ids)).limit(12).all()
+            recommended_ids, tier, _ = _recommendations_within_budget(current_user.id)
+            with observe_stage('db_hydrate'):
+                recommended_books = _books_for_display(recommended_ids, 12)
         except Exception as e:
             logger.error(f"Error getting recommendations: {str(e)}")
             flash("Could not load personalized recommendations.", "warning")
+    else:
+        # Engine still starting (or unavailable): show popular books instead
+        recommended_books = _books_for_display(get_popular_books(12), 12)
     
-    return render_template('profile.html', 
+    html = render_template('profile.html', 
                           user=current_user,
-                          ratings=user_ratings,
-                          rated_books=rated_books,
+                          ratings=ratings,
+                          library=library,
+                          rating_count=rating_count,
+                          rating_avg=rating_avg,
                           recommended_books=recommended_books)
+    return _with_recommendation_tier(make_response(html), tier)
 
 @app.route('/add_to_library/<isbn>')
 @login_required
@@ -393,5 +817,13 @@ def server_error(e):
     """500 error handler."""
     return render_template('error.html', error_code=500, message="Server error"), 500
 
+# Register the JSON API
+from api import register_api
+register_api(app)
+
+# Register CLI commands
+from commands import register_commands
+register_commands(app)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,243 @@
+"""
+ASGI entry point serving the recommendation API with asyncio.
+
+    uvicorn asgi:application --workers 1
+
+The recommendation and similar-books endpoints run here natively: their
+database queries use SQLAlchemy's asyncio extension and the CPU-bound
+scoring runs in a thread pool, so one process holds many slow requests at
+once with a single copy of the model. Every other route is served by the
+Flask app, mounted as WSGI.
+
+Needs the optional packages starlette, uvicorn, sqlalchemy[asyncio] and an
+async database driver (aiosqlite for SQLite, asyncpg for PostgreSQL);
+a2wsgi is used for the Flask mount when installed.
+"""
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from itsdangerous import BadSignature
+from sqlalchemy import select
+
+try:
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Mount, Route
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+except ImportError as e:
+    raise ImportError("ASGI serving needs the optional packages: "
+                      "pip install starlette uvicorn 'sqlalchemy[asyncio]' aiosqlite asyncpg a2wsgi") from e
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import app as app_module
+from app import app as flask_app
+from models import User, Book, Rating
+from api import BOOK_FIELDS, requested_fields, clamp_top_n, result_items, catalog_book_fields, has_api_token
+from catalog import get_catalog
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Async drivers for the sync database URLs used by the Flask app
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+}
+
+def async_database_url(url):
+    """Map the app's database URL to the matching asyncio driver."""
+    scheme, sep, rest = url.partition('://')
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+database_url = os.environ.get('ASYNC_DATABASE_URL') or async_database_url(
+    flask_app.config['SQLALCHEMY_DATABASE_URI']
+)
+async_engine = create_async_engine(database_url, pool_pre_ping=True)
+Session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# Threads running the CPU-bound scoring; the event loop only waits on them
+scoring_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('ASGI_SCORING_THREADS', 4)),
+    thread_name_prefix='scoring',
+)
+
+async def run_scoring(func, *args):
+    """Run a CPU-bound engine call in the scoring thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(scoring_executor, functools.partial(func, *args))
+
+def _engine_call(engine, state, func, *args):
+    """
+    Call a sync engine method inside a Flask app context, against a pinned model state.
+
+    Each request pins the live state once and runs all its engine calls and
+    its reported model_version against it, so a hot reload mid-request can't
+    mix two versions.
+    """
+    with flask_app.app_context(), engine._using_state(state):
+        return func(*args)
+
+def _rank_against_catalog(engine, catalog, book, top_n):
+    """Rank every other catalog book by similarity to a book; a full catalog scan, so run in the pool."""
+    books = [other for other in catalog.records if other.isbn != book.isbn]
+    return engine.rank_similar_books(book, books, top_n)
+
+def _session_user_id(request):
+    """ID of the user logged in to the Flask app, read from its signed session cookie."""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if not cookie or serializer is None:
+        return None
+    try:
+        data = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+        return int(data['_user_id'])
+    except (BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+async def _access_error(request, session, user_id):
+    """The API's access rule: the API token, an admin or the user themselves; None if allowed."""
+    if has_api_token(request.headers.get('authorization'), flask_app.config['API_TOKEN']):
+        return None
+    caller_id = _session_user_id(request)
+    if caller_id is None:
+        return _error("authentication required", 401)
+    if caller_id == user_id:
+        return None
+    caller = await session.get(User, caller_id)
+    if caller is None or caller.username not in flask_app.config['ADMIN_USERNAMES']:
+        return _error("not allowed to read other users' recommendations", 403)
+    return None
+
+async def _popular_books(session, limit):
+    """Async version of recommendation.get_popular_books."""
+    result = await session.execute(
+        select(Book.isbn).where(Book.num_ratings >= 5).order_by(Book.avg_rating.desc()).limit(limit)
+    )
+    return list(result.scalars())
+
+async def _book_fields(session, isbns, fields):
+    """Async version of the API's book field lookup, for while the catalog loads."""
+    if not fields or not isbns:
+        return {}
+
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog_book_fields(catalog, isbns, fields)
+
+    columns = [BOOK_FIELDS[field] for field in fields]
+    result = await session.execute(select(Book.isbn, *columns).where(Book.isbn.in_(set(isbns))))
+    return {row[0]: dict(zip(fields, row[1:])) for row in result}
+
+def _error(message, status_code):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+async def user_recommendations(request):
+    """Recommendations for one user: ?top_n=24&fields=title,author"""
+    user_id = request.path_params['user_id']
+    top_n = clamp_top_n(request.query_params.get('top_n'), 24)
+    fields = requested_fields(request.query_params.get('fields'))
+    engine = app_module.recommendation_engine
+    state = engine._active_state() if engine is not None else None
+
+    async with Session() as session:
+        denied = await _access_error(request, session, user_id)
+        if denied:
+            return denied
+        user = await session.get(User, user_id)
+        if user is None:
+            return _error(f"user {user_id} not found", 404)
+
+        scored = None
+        if state is not None and state.model is not None:
+            with engine._using_state(state):
+                scored = engine._cached_recommendations(user_id, top_n)
+            if scored is None:
+                rated = set((await session.execute(
+                    select(Rating.isbn).where(Rating.user_id == user_id)
+                )).scalars())
+                # Candidates come from the engine's in-vocabulary index; the app context is
+                # only used when the index is due for a rebuild
+                results = await run_scoring(_engine_call, engine, state, engine.score_loaded_users, [user_id],
+                                            {user_id: user}, {user_id: rated}, None, top_n)
+                scored = results.get(user_id)
+        elif engine is not None:
+            # Collaborative filtering fallback without the neural model
+            isbns = await run_scoring(_engine_call, engine, state, engine._get_recommendations_fallback,
+                                      user_id, top_n)
+            scored = [(isbn, None) for isbn in isbns]
+
+        if scored is None:
+            scored = [(isbn, None) for isbn in await _popular_books(session, top_n)]
+
+        books = await _book_fields(session, [isbn for isbn, _ in scored], fields)
+
+    return JSONResponse({
+        'user_id': user_id,
+        'model_version': state.version if state else None,
+        'items': result_items(scored, books),
+    })
+
+async def similar_books(request):
+    """Books similar to one book: ?top_n=6&fields=title"""
+    isbn = request.path_params['isbn']
+    top_n = clamp_top_n(request.query_params.get('top_n'), 6)
+    fields = requested_fields(request.query_params.get('fields'))
+    engine = app_module.recommendation_engine
+    state = engine._active_state() if engine is not None else None
+
+    catalog = get_catalog()
+    async with Session() as session:
+        book = catalog.get(isbn) if catalog is not None else None
+        if book is None:
+            book = (await session.execute(select(Book).where(Book.isbn == isbn))).scalar_one_or_none()
+        if book is None:
+            return _error(f"book {isbn} not found", 404)
+
+        similar = []
+        if state is not None and isbn in state.similar_books_cache:
+            similar = state.similar_books_cache[isbn]
+        elif state is not None and state.model is not None:
+            if catalog is not None:
+                similar = await run_scoring(_engine_call, engine, state, _rank_against_catalog,
+                                            engine, catalog, book, top_n)
+            else:
+                books = list((await session.execute(select(Book).where(Book.isbn != isbn))).scalars())
+                similar = await run_scoring(_engine_call, engine, state, engine.rank_similar_books,
+                                            book, books, top_n)
+        elif engine is not None:
+            # Metadata fallback without the neural model
+            similar = await run_scoring(_engine_call, engine, state, engine._get_similar_books_fallback,
+                                        book, top_n)
+
+        similar = similar[:top_n]
+        books = await _book_fields(session, similar, fields)
+
+    return JSONResponse({
+        'isbn': isbn,
+        'model_version': state.version if state else None,
+        'items': result_items([(similar_isbn, None) for similar_isbn in similar], books),
+    })
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    scoring_executor.shutdown(wait=False)
+    await async_engine.dispose()
+
+application = Starlette(
+    routes=[
+        Route('/api/v1/users/{user_id:int}/recommendations', user_recommendations),
+        Route('/api/v1/books/{isbn}/similar', similar_books),
+        # Everything else, including the batch and export endpoints, stays on Flask
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import func
+from models import User, Book, Rating
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where results are stored; compare against baseline.json by default
+RESULTS_DIR = os.path.join('instance', 'benchmarks')
+BASELINE_FILE = 'baseline.json'
+
+# Ordered list of (name, function, slow) tuples; slow ones only run when asked for
+BENCHMARKS = []
+
+def benchmark(name, slow=False):
+    """Register a function as a benchmark; it receives a BenchmarkContext and runs once."""
+    def decorator(func):
+        BENCHMARKS.append((name, func, slow))
+        return func
+    return decorator
+
+class BenchmarkContext:
+    """Application, engine and sample inputs shared by the benchmarks."""
+
+    def __init__(self, app, db, engine, sample_size=10):
+        self.app = app
+        self.db = db
+        self.engine = engine
+        self.iteration = 0
+
+        # Most active users and most rated books: the expensive end of the workload
+        self.user_ids = [user_id for (user_id,) in db.session.query(Rating.user_id).group_by(
+            Rating.user_id
+        ).order_by(func.count(Rating.id).desc()).limit(sample_size)]
+        self.isbns = [isbn for (isbn,) in db.session.query(Book.isbn).order_by(
+            Book.num_ratings.desc()
+        ).limit(sample_size)]
+        self.books = db.session.query(Book).filter(Book.isbn.in_(self.isbns)).all()
+
+    def next_user_id(self):
+        return self.user_ids[self.iteration % len(self.user_ids)]
+
+    def next_isbn(self):
+        return self.isbns[self.iteration % len(self.isbns)]
+
+    def next_book(self):
+        return self.books[self.iteration % len(self.books)]
+
+@benchmark('recommendations_for_user')
+def _bench_recommendations(context):
+    # Cold: the per-user cache would otherwise serve every run after the first
+    user_id = context.next_user_id()
+    context.engine.user_cache.pop(user_id, None)
+    context.engine.get_recommendations_for_user(user_id)
+
+@benchmark('recommendations_for_user_cached')
+def _bench_recommendations_cached(context):
+    context.engine.get_recommendations_for_user(context.next_user_id())
+
+@benchmark('recommendations_batch_10_users')
+def _bench_recommendations_batch(context):
+    context.engine.get_scored_recommendations(context.user_ids, use_cache=False)
+
+@benchmark('similar_books')
+def _bench_similar_books(context):
+    isbn = context.next_isbn()
+    context.engine.similar_books_cache.pop(isbn, None)
+    context.engine.get_similar_books(isbn)
+
+@benchmark('recommendations_fallback')
+def _bench_recommendations_fallback(context):
+    context.engine._get_recommendations_fallback(context.next_user_id())
+
+@benchmark('similar_books_fallback')
+def _bench_similar_books_fallback(context):
+    context.engine._get_similar_books_fallback(context.next_book())
+
+@benchmark('popular_books')
+def _bench_popular_books(context):
+    from recommendation import get_popular_books
+    get_popular_books()
+
+@benchmark('load_data_to_db', slow=True)
+def _bench_load_data(context):
+    """Import the CSV dataset into a fresh SQLite database."""
+    from flask import Flask
+    from data_loader import load_data_to_db
+
+    with tempfile.TemporaryDirectory() as directory:
+        load_app = Flask('benchmark_load')
+        load_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(directory, 'load.db')}"
+        context.db.init_app(load_app)
+        with load_app.app_context():
+            context.db.create_all()
+            load_data_to_db(context.db)
+            context.db.engine.dispose()
+
+def _summarize(timings):
+    """Milliseconds statistics of a list of durations in seconds."""
+    values = sorted(value * 1000 for value in timings)
+    p95_index = min(len(values) - 1, int(round(0.95 * (len(values) - 1))))
+    return {
+        'runs': len(values),
+        'min_ms': round(values[0], 3),
+        'median_ms': round(statistics.median(values), 3),
+        'p95_ms': round(values[p95_index], 3),
+        'mean_ms': round(statistics.fmean(values), 3),
+    }
+
+def run_benchmarks(app, db, engine, repeat=5, only=None, include_slow=False):
+    """
+    Time the engine paths and the data import.
+
+    Every benchmark runs once untimed to warm caches and connections, then
+    `repeat` timed runs (slow benchmarks run once).
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+        engine: RecommendationEngine
+        repeat: Timed runs per benchmark
+        only: Optional list of benchmark names to run
+        include_slow: Also run slow benchmarks (load_data_to_db)
+
+    Returns:
+        Result dict with environment details and per-benchmark statistics
+    """
+    results = {}
+    with app.app_context():
+        context = BenchmarkContext(app, db, engine)
+        environment = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': db.engine.dialect.name,
+            'books': db.session.query(func.count(Book.id)).scalar(),
+            'users': db.session.query(func.count(User.id)).scalar(),
+            'ratings': db.session.query(func.count(Rating.id)).scalar(),
+            'model_version': engine.version if engine else None,
+            'neural_model': bool(engine and engine.model is not None),
+        }
+
+        for name, func_, slow in BENCHMARKS:
+            if only and name not in only:
+                continue
+            if slow and not include_slow and not only:
+                continue
+            if not context.user_ids or not context.isbns:
+                logger.warning("Database has no ratings, skipping benchmarks")
+                break
+
+            runs = 1 if slow else repeat
+            if not slow:
+                func_(context)
+
+            timings = []
+            for iteration in range(runs):
+                context.iteration = iteration
+                start = time.perf_counter()
+                func_(context)
+                timings.append(time.perf_counter() - start)
+            results[name] = _summarize(timings)
+            logger.info(f"Benchmark {name}: {results[name]}")
+
+    return {
+        'created': datetime.utcnow().isoformat(),
+        'environment': environment,
+        'results': results,
+    }
+
+def save_results(results, path=None, directory=RESULTS_DIR):
+    """Write results as JSON; defaults to <directory>/<timestamp>.json."""
+    if path is None:
+        path = os.path.join(directory, datetime.utcnow().strftime('%Y%m%d%H%M%S') + '.json')
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def compare_results(current, baseline, threshold=0.2, metric='median_ms'):
+    """
+    Compare timings against a baseline run.
+
+    Args:
+        current: Result dict of this run
+        baseline: Result dict of the baseline run
+        threshold: Relative slowdown counted as a regression (0.2 = 20%)
+        metric: Statistic to compare
+
+    Returns:
+        List of (name, baseline value, current value, ratio, regressed) tuples
+    """
+    rows = []
+    for name, stats in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or metric not in base or metric not in stats:
+            continue
+        ratio = stats[metric] / base[metric] if base[metric] else float('inf')
+        rows.append((name, base[metric], stats[metric], ratio, ratio > 1 + threshold))
+    return rows
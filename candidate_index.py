@@ -0,0 +1,161 @@
+import logging
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Book features stored per candidate, named like RecommendationEngine._get_book_features
+BOOK_FEATURES = ('isbn', 'author', 'publisher', 'year', 'avg_rating_scaled', 'num_ratings_scaled')
+
+def _scaled_ratings(records, item_scaler):
+    """Scaled avg_rating and num_ratings features, as in RecommendationEngine._get_book_features."""
+    avg_rating = np.array([record.avg_rating or 0.0 for record in records], dtype=np.float64)
+    num_ratings = np.array([record.num_ratings or 0 for record in records], dtype=np.float64)
+    if item_scaler is not None:
+        avg_rating_scaled = avg_rating * item_scaler['scale'][0] + item_scaler['min'][0]
+        num_ratings_scaled = num_ratings * item_scaler['scale'][1] + item_scaler['min'][1]
+    else:
+        avg_rating_scaled = avg_rating / 10
+        num_ratings_scaled = np.minimum(num_ratings / 100.0, 1.0)
+    return {
+        'avg_rating_scaled': avg_rating_scaled.astype(np.float32),
+        'num_ratings_scaled': num_ratings_scaled.astype(np.float32),
+    }
+
+class CandidateIndex:
+    """
+    Books the model can score, as arrays sorted by ISBN code.
+
+    Books outside the model's ISBN vocabulary all encode to the unknown code
+    0 and get the same embedding, so scoring them is wasted inference. The
+    index keeps only in-vocabulary books: `codes` is the sorted int64 array
+    of their ISBN codes, and position i of `isbns`, of `rows` (their rows in
+    the book catalog) and of every feature array belongs to codes[i]. Removing a
+    user's rated books is then a binary search of their codes instead of a
+    set lookup per book.
+    """
+
+    def __init__(self, codes, rows, isbns, features, vocabularies, item_scaler, catalog_version):
+        self.codes = codes
+        self.rows = rows
+        self.isbns = isbns
+        self.features = features  # Feature name -> array aligned with codes
+        self.vocabularies = vocabularies
+        self.item_scaler = item_scaler
+        self.catalog_version = catalog_version
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def isbn_vocabulary(self):
+        return self.vocabularies['isbn']
+
+    @classmethod
+    def build(cls, catalog, vocabularies, item_scaler=None):
+        """
+        Encode the in-vocabulary books of the catalog.
+
+        Args:
+            catalog: Loaded BookCatalog
+            vocabularies: Dict of 'isbn', 'author', 'publisher', 'year' -> Vocabulary
+            item_scaler: Dict with the min-max 'min' and 'scale' arrays, or None
+                for the engine's fallback normalisation
+
+        Returns:
+            CandidateIndex
+        """
+        version = catalog.version
+        records = list(catalog.records)
+
+        codes = vocabularies['isbn'].encode_many([record.isbn for record in records], default=-1)
+        # np.unique keeps the first row of duplicate codes
+        codes, rows = np.unique(codes, return_index=True)
+        known = codes >= 0
+        codes, rows = codes[known], rows[known]
+        candidates = [records[row] for row in rows]
+
+        def encoded(name, field):
+            vocabulary = vocabularies.get(name)
+            if vocabulary is None:
+                return np.zeros(len(candidates), dtype=np.int64)
+            return vocabulary.encode_many([getattr(record, field) for record in candidates])
+
+        features = {
+            'isbn': codes,
+            'author': encoded('author', 'author'),
+            'publisher': encoded('publisher', 'publisher'),
+            'year': encoded('year', 'year_of_publication'),
+        }
+        features.update(_scaled_ratings(candidates, item_scaler))
+        isbns = np.array([record.isbn for record in candidates], dtype=object)
+
+        logger.info(f"Candidate index built: {len(codes)} of {len(records)} books are in the model vocabulary")
+        return cls(codes, rows, isbns, features, vocabularies, item_scaler, version)
+
+    def with_updated_rows(self, catalog, catalog_rows):
+        """
+        Copy of the index with the rating features of some catalog rows re-read.
+
+        Rating counts change far more often than the catalog grows, and only
+        the two scaled rating features depend on them.
+
+        Args:
+            catalog: BookCatalog the index was built from
+            catalog_rows: Catalog rows updated in place since the index was built
+
+        Returns:
+            CandidateIndex
+        """
+        version = catalog.version
+        positions = np.flatnonzero(np.isin(self.rows, np.fromiter(catalog_rows, dtype=np.int64)))
+        features = dict(self.features)
+        for name, values in _scaled_ratings([catalog.records[self.rows[position]] for position in positions],
+                                            self.item_scaler).items():
+            features[name] = features[name].copy()
+            features[name][positions] = values
+        return CandidateIndex(self.codes, self.rows, self.isbns, features, self.vocabularies,
+                              self.item_scaler, version)
+
+    def unrated_positions(self, rated_isbns):
+        """
+        Positions of the candidates a user has not rated.
+
+        Positions index the index's own arrays (codes, isbns, features), not
+        the book catalog; self.rows maps them to catalog rows.
+
+        Args:
+            rated_isbns: ISBNs the user rated
+
+        Returns:
+            Sorted int64 array of candidate positions
+        """
+        rated = self.isbn_vocabulary.encode_many(rated_isbns, default=-1)
+        rated = rated[rated >= 0]
+        keep = np.ones(len(self.codes), dtype=bool)
+        if len(rated) and len(self.codes):
+            positions = np.minimum(np.searchsorted(self.codes, rated), len(self.codes) - 1)
+            keep[positions[self.codes[positions] == rated]] = False
+        return np.flatnonzero(keep)
+
+    def feature_columns(self, user_candidates):
+        """
+        Model features of many user-candidate pairs, as one array per feature.
+
+        Args:
+            user_candidates: List of (candidate positions, encoded user ID, encoded age bin)
+
+        Returns:
+            Dict of feature name -> array with one entry per pair, users in order
+        """
+        if not user_candidates:
+            return {name: self.features[name][:0] for name in BOOK_FEATURES}
+
+        positions = np.concatenate([candidates for candidates, _, _ in user_candidates])
+        counts = [len(candidates) for candidates, _, _ in user_candidates]
+        columns = {name: self.features[name][positions] for name in BOOK_FEATURES}
+        columns['user_id'] = np.repeat(np.array([user_code for _, user_code, _ in user_candidates],
+                                                dtype=np.int64), counts)
+        columns['age_bin'] = np.repeat(np.array([age_code for _, _, age_code in user_candidates],
+                                                dtype=np.int64), counts)
+        return columns
@@ -0,0 +1,211 @@
+import logging
+import sys
+import threading
+from datetime import timedelta
+from sqlalchemy import func
+from models import Book, Rating
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Book columns held in memory: what the templates display and the engine encodes
+FIELDS = ('id', 'isbn', 'title', 'author', 'year_of_publication', 'publisher',
+          'image_url_s', 'image_url_m', 'image_url_l', 'avg_rating', 'num_ratings')
+
+# Columns with few distinct values, shared between records
+INTERNED_FIELDS = ('author', 'year_of_publication', 'publisher')
+
+# Change log entries kept for incremental consumers like the candidate index
+MAX_CHANGES = 100
+
+# Ratings this far before the last refresh are read again, for transactions
+# that committed after it with an earlier timestamp
+RATINGS_LOOKBACK = timedelta(seconds=60)
+
+class BookRecord:
+    """
+    Read-only copy of one book's columns.
+
+    Has the attributes of a Book, so templates and the recommendation engine
+    accept it in place of the ORM object, without the identity map, instance
+    state and attribute dict each of those carries.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, values):
+        for name, value in zip(FIELDS, values):
+            if name in INTERNED_FIELDS and value is not None:
+                value = sys.intern(value)
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BookRecord is read-only")
+
+    def __repr__(self):
+        return f"<BookRecord {self.isbn}>"
+
+class BookCatalog:
+    """
+    In-memory, read-only catalog of every book with ISBN -> row lookup.
+
+    Loaded once per process and refreshed incrementally: books added since
+    the last refresh are appended, and books with new ratings get a fresh
+    record (records are replaced, never mutated, so readers need no lock).
+    Rows never move, so a row number identifies a book for the lifetime of
+    the catalog.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.rows = {}
+        self.version = 0
+        self.loaded = False
+        self._max_id = 0
+        self._ratings_since = None
+        self._changes = []  # (version, appended, rows updated in place)
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stop_refreshing = threading.Event()
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, isbn):
+        """Record of a book, or None."""
+        row = self.rows.get(isbn)
+        return self.records[row] if row is not None else None
+
+    def get_many(self, isbns, limit=None):
+        """Records of books in the given order, skipping unknown ISBNs."""
+        records = [record for record in map(self.get, isbns) if record is not None]
+        return records[:limit] if limit is not None else records
+
+    def load(self, db):
+        """
+        Read the whole book table.
+
+        Args:
+            db: SQLAlchemy database instance
+
+        Returns:
+            Number of books
+        """
+        with self._lock:
+            self._ratings_since = db.session.query(func.max(Rating.timestamp)).scalar()
+            records, rows = [], {}
+            for values in db.session.query(*_columns()).order_by(Book.id).yield_per(10000):
+                rows[values[1]] = len(records)
+                records.append(BookRecord(values))
+
+            self.records, self.rows = records, rows
+            self._max_id = records[-1].id if records else 0
+            self._changes = []
+            self.version += 1
+            self.loaded = True
+
+        logger.info(f"Book catalog loaded: {len(records)} books")
+        return len(records)
+
+    def refresh(self, db):
+        """
+        Pick up books added and books rated since the last load or refresh.
+
+        Args:
+            db: SQLAlchemy database instance
+
+        Returns:
+            Tuple (books appended, books updated)
+        """
+        if not self.loaded:
+            return self.load(db), 0
+
+        with self._lock:
+            latest = db.session.query(func.max(Rating.timestamp)).scalar()
+            rated = db.session.query(Rating.isbn)
+            if self._ratings_since is not None:
+                rated = rated.filter(Rating.timestamp >= self._ratings_since - RATINGS_LOOKBACK)
+            changed = db.session.query(*_columns()).filter(Book.isbn.in_(rated), Book.id <= self._max_id).all()
+            self._ratings_since = latest or self._ratings_since
+
+            added = db.session.query(*_columns()).filter(Book.id > self._max_id).order_by(Book.id).all()
+            for values in added:
+                self.rows[values[1]] = len(self.records)
+                self.records.append(BookRecord(values))
+            if added:
+                self._max_id = added[-1][0]
+
+            updated = set()
+            for values in changed:
+                # Books read again through the lookback are only replaced if they changed
+                record = self.get(values[1])
+                if record is not None and tuple(values) != tuple(getattr(record, name) for name in FIELDS):
+                    updated.add(self._replace(values))
+
+            if added or updated:
+                self._record_change(bool(added), updated)
+
+        if added or updated:
+            logger.info(f"Book catalog refreshed: {len(added)} books added, {len(updated)} updated")
+        return len(added), len(updated)
+
+    def update_book(self, book):
+        """Copy a just-committed Book into the catalog, so this process sees its change at once."""
+        if not self.loaded or book.isbn not in self.rows:
+            return
+        with self._lock:
+            self._record_change(False, {self._replace(tuple(getattr(book, name) for name in FIELDS))})
+
+    def _replace(self, values):
+        row = self.rows[values[1]]
+        self.records[row] = BookRecord(values)
+        return row
+
+    def _record_change(self, appended, rows):
+        self.version += 1
+        self._changes.append((self.version, appended, rows))
+        del self._changes[:-MAX_CHANGES]
+
+    def changes_since(self, version):
+        """
+        What changed after a catalog version.
+
+        Returns:
+            Tuple (whether books were appended, set of rows updated in place),
+            or None if the change log no longer reaches back to `version`
+        """
+        changes = [change for change in self._changes if change[0] > version]
+        if version < self.version and (not changes or changes[0][0] != version + 1):
+            return None
+        return (any(appended for _, appended, _ in changes),
+                set().union(*(rows for _, _, rows in changes)))
+
+    def start_refreshing(self, app, db, interval=60):
+        """Refresh the catalog every `interval` seconds in a daemon thread."""
+        if self._refresher is not None or interval <= 0:
+            return
+
+        def _refresh():
+            while not self._stop_refreshing.wait(interval):
+                try:
+                    with app.app_context():
+                        self.refresh(db)
+                        db.session.remove()
+                except Exception as e:
+                    logger.error(f"Error refreshing book catalog: {str(e)}")
+
+        self._refresher = threading.Thread(target=_refresh, name='catalog-refresh', daemon=True)
+        self._refresher.start()
+
+    def stop_refreshing(self):
+        self._stop_refreshing.set()
+
+def _columns():
+    return [getattr(Book, name) for name in FIELDS]
+
+# The process's catalog, loaded by the app's 'data' startup phase
+book_catalog = BookCatalog()
+
+def get_catalog():
+    """The loaded book catalog, or None while it is loading (callers then query the database)."""
+    return book_catalog if book_catalog.loaded else None
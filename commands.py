@@ -0,0 +1,405 @@
+import logging
+import click
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def register_commands(app):
+    """
+    Register the application's maintenance commands with the Flask CLI.
+    
+    Args:
+        app: Flask application instance
+    """
+    from app import db
+    
+    @app.cli.command('refresh-facets')
+    def refresh_facets_command():
+        """Rebuild the materialized author/publisher/year facet tables."""
+        from facets import refresh_facets
+        
+        refresh_facets(db)
+        click.echo("Facet tables refreshed.")
+    
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Apply pending schema migrations (e.g. new indexes)."""
+        from migrations import run_migrations
+        
+        db.create_all()
+        applied = run_migrations(db)
+        if applied:
+            click.echo(f"Applied migrations: {', '.join(applied)}")
+        else:
+            click.echo("Database schema is up to date.")
+    
+    @app.cli.command('check-query-plans')
+    @click.option('--verbose', is_flag=True, help='Print the plan of every query.')
+    def check_query_plans_command(verbose):
+        """EXPLAIN the hot queries and fail if any degrades to a full scan."""
+        import app as app_module
+        from query_plans import check_query_plans
+        
+        # The engine is built in the background; its fallback queries are part of the check
+        app_module.startup_state.wait_until_ready()
+        results = check_query_plans(app, db, engine=app_module.recommendation_engine)
+        failures = [result for result in results if not result.ok]
+        
+        for result in results:
+            if verbose or not result.ok:
+                status = 'OK' if result.ok else 'FAIL: ' + '; '.join(result.problems)
+                click.echo(f"[{result.source}] {status}")
+                click.echo(f"    {' '.join(result.statement.split())}")
+                for line in result.plan:
+                    click.echo(f"    -> {line}")
+        
+        click.echo(f"{len(results)} queries checked, {len(failures)} degraded.")
+        if failures:
+            raise SystemExit(1)
+    
+    @app.cli.command('build-model-bundle')
+    @click.option('--output', default=None, help='Bundle file to write (default: models/wide_deep_top50k.bundle).')
+    @click.option('--model-path', default=None, help='Keras model to pack (default: the usual locations).')
+    @click.option('--version', 'model_version', default=None, help='Version string stored in the bundle.')
+    @click.option('--publish', is_flag=True,
+                  help='Write into the versions directory so running servers hot-reload it.')
+    def build_model_bundle_command(output, model_path, model_version, publish):
+        """Pack the encoder/scaler pickles and Keras weights into one mmap-able bundle."""
+        import os
+        from datetime import datetime
+        from model_bundle import DEFAULT_BUNDLE_PATH, DEFAULT_VERSIONS_DIR, version_bundle_path, build_bundle_from_legacy
+        
+        if publish:
+            model_version = model_version or datetime.utcnow().strftime('%Y%m%d%H%M%S')
+            versions_dir = os.environ.get('MODEL_VERSIONS_DIR', DEFAULT_VERSIONS_DIR)
+            output = version_bundle_path(model_version, versions_dir)
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        
+        path = build_bundle_from_legacy(output or DEFAULT_BUNDLE_PATH, model_path=model_path,
+                                        model_version=model_version)
+        click.echo(f"Model bundle written to {path}.")
+    
+    @app.cli.command('export-recommendations')
+    @click.option('--output', default='-', help='NDJSON file to write (default: stdout).')
+    @click.option('--top-n', default=24, show_default=True, help='Recommendations per user.')
+    @click.option('--start-after', default=0, help='Resume after this user ID.')
+    @click.option('--resume', is_flag=True, help='Append to --output after its last complete record.')
+    @click.option('--chunk-size', default=100, show_default=True, help='Users scored per engine call.')
+    @click.option('--workers', default=1, show_default=True, help='Chunks scored in parallel.')
+    @click.option('--limit', default=None, type=int, help='Stop after this many users.')
+    def export_recommendations_command(output, top_n, start_after, resume, chunk_size, workers, limit):
+        """Stream top-N recommendations for every user as NDJSON."""
+        import sys
+        import app as app_module
+        from export import iter_recommendation_records, prepare_resume, to_ndjson
+        
+        mode = 'w'
+        if resume and output != '-':
+            start_after = max(start_after, prepare_resume(output))
+            mode = 'a'
+        
+        # Scoring needs the model, which is loaded in the background
+        app_module.startup_state.wait_until_ready()
+        records = iter_recommendation_records(app, db, app_module.recommendation_engine,
+                                              start_after=start_after, top_n=top_n,
+                                              chunk_size=chunk_size, workers=workers, limit=limit)
+        
+        file = sys.stdout if output == '-' else open(output, mode, encoding='utf-8')
+        count = 0
+        try:
+            for record in records:
+                file.write(to_ndjson(record))
+                count += 1
+                if count % 10000 == 0:
+                    file.flush()
+                    logger.info(f"Exported {count} users (last user ID {record['user_id']})")
+        finally:
+            if file is not sys.stdout:
+                file.close()
+        
+        click.echo(f"Exported recommendations for {count} users.", err=True)
+    
+    @app.cli.command('generate-synthetic-data')
+    @click.option('--books', default=10000, show_default=True, help='Number of books (10k to 1M).')
+    @click.option('--users', default=5000, show_default=True, help='Number of users.')
+    @click.option('--ratings', default=100000, show_default=True, help='Number of ratings (up to 10M).')
+    @click.option('--seed', default=42, show_default=True, help='Random seed.')
+    def generate_synthetic_data_command(books, users, ratings, seed):
+        """Fill an empty database with a seeded, power-law distributed dataset."""
+        from models import Book
+        from synthetic_data import generate_synthetic_data, SYNTHETIC_PASSWORD
+        
+        if db.session.query(Book.id).first() is not None:
+            raise click.ClickException("The database already has books; use an empty database "
+                                       "and LOAD_DATASET=0 so startup does not import the CSV files.")
+        
+        counts = generate_synthetic_data(db, books=books, users=users, ratings=ratings, seed=seed)
+        click.echo(f"Generated {counts['books']} books, {counts['users']} users and "
+                   f"{counts['ratings']} ratings (password '{SYNTHETIC_PASSWORD}').")
+    
+    @app.cli.command('build-random-model')
+    @click.option('--output', default=None, help='Bundle file to write (default: models/wide_deep_top50k.bundle).')
+    @click.option('--version', 'model_version', default=None, help='Version string stored in the bundle.')
+    @click.option('--publish', is_flag=True,
+                  help='Write into the versions directory so running servers hot-reload it.')
+    @click.option('--embedding-dim', default=16, show_default=True, help='Width of the deep embeddings.')
+    @click.option('--seed', default=42, show_default=True, help='Seed for the random weights.')
+    def build_random_model_command(output, model_version, publish, embedding_dim, seed):
+        """Write a random-weight wide & deep bundle sized for the database."""
+        import os
+        from datetime import datetime
+        from model_bundle import DEFAULT_BUNDLE_PATH, DEFAULT_VERSIONS_DIR, version_bundle_path
+        from wide_deep import build_random_model_bundle
+        
+        model_version = model_version or 'random-' + datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        if publish:
+            output = version_bundle_path(model_version, os.environ.get('MODEL_VERSIONS_DIR', DEFAULT_VERSIONS_DIR))
+        
+        path = build_random_model_bundle(db, output or DEFAULT_BUNDLE_PATH, model_version=model_version,
+                                         embedding_dim=embedding_dim, seed=seed)
+        click.echo(f"Random model bundle written to {path}.")
+    
+    @app.cli.command('benchmark')
+    @click.option('--repeat', default=5, show_default=True, help='Timed runs per benchmark.')
+    @click.option('--only', multiple=True, help='Run only this benchmark (repeatable).')
+    @click.option('--include-load', is_flag=True, help='Also time load_data_to_db on a temporary database.')
+    @click.option('--output', default=None, help='Results file (default: instance/benchmarks/<timestamp>.json).')
+    @click.option('--baseline', default=None,
+                  help='Results to compare against (default: instance/benchmarks/baseline.json if present).')
+    @click.option('--save-baseline', is_flag=True, help='Also store the results as the new baseline.')
+    @click.option('--threshold', default=0.2, show_default=True, help='Relative slowdown counted as a regression.')
+    def benchmark_command(repeat, only, include_load, output, baseline, save_baseline, threshold):
+        """Time the recommendation engine and compare with a baseline; exits 1 on regressions."""
+        import os
+        import sys
+        import app as app_module
+        from benchmarks import BASELINE_FILE, RESULTS_DIR, run_benchmarks, save_results
+        
+        app_module.startup_state.wait_until_ready()
+        results = run_benchmarks(app, db, app_module.recommendation_engine, repeat=repeat,
+                                 only=list(only), include_slow=include_load)
+        
+        for name, stats in results['results'].items():
+            click.echo(f"{name:34} median {stats['median_ms']:10.2f} ms  p95 {stats['p95_ms']:10.2f} ms")
+        click.echo(f"Results written to {save_results(results, output)}.")
+        
+        regressions = _compare_with_baseline(results, baseline, RESULTS_DIR, threshold, 'median_ms',
+                                             ('database', 'books', 'ratings', 'neural_model'))
+        if save_baseline:
+            click.echo(f"Baseline written to {save_results(results, os.path.join(RESULTS_DIR, BASELINE_FILE))}.")
+        
+        if regressions:
+            click.echo(f"{len(regressions)} benchmarks regressed by more than {threshold:.0%}.", err=True)
+            sys.exit(1)
+    
+    @app.cli.command('load-test')
+    @click.option('--sessions', default=100, show_default=True, help='User sessions to replay.')
+    @click.option('--concurrency', default=8, show_default=True, help='Sessions in flight at once.')
+    @click.option('--base-url', default=None, help='Running server to test (default: in-process test client).')
+    @click.option('--seed', default=42, show_default=True, help='Seed of the session choices.')
+    @click.option('--output', default=None, help='Results file (default: instance/loadtests/<timestamp>.json).')
+    @click.option('--baseline', default=None,
+                  help='Results to compare against (default: instance/loadtests/baseline.json if present).')
+    @click.option('--save-baseline', is_flag=True, help='Also store the results as the new baseline.')
+    @click.option('--threshold', default=0.2, show_default=True, help='Relative p95 slowdown counted as a regression.')
+    def load_test_command(sessions, concurrency, base_url, seed, output, baseline, save_baseline, threshold):
+        """Replay synthetic user sessions and report per-route latency percentiles; exits 1 on regressions."""
+        import os
+        import sys
+        import app as app_module
+        from benchmarks import BASELINE_FILE, save_results
+        from loadtest import RESULTS_DIR, HttpTransport, SessionPlan, TestClientTransport, run_load_test
+        
+        if base_url:
+            transport = HttpTransport(base_url)
+        else:
+            # In-process runs should measure a warm engine, like a server taking traffic
+            app_module.startup_state.wait_until_ready()
+            transport = TestClientTransport(app)
+        
+        try:
+            results = run_load_test(transport, SessionPlan(db), sessions=sessions,
+                                    concurrency=concurrency, seed=seed)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        
+        totals = results['totals']
+        click.echo(f"{totals['requests']} requests in {totals['elapsed_s']:.1f}s "
+                   f"({totals['throughput_rps']:.1f} req/s), {totals['errors']} errors")
+        for route, stats in results['results'].items():
+            click.echo(f"{route:18} {stats['requests']:6d} req {stats['errors']:4d} err  "
+                       f"p50 {stats['p50_ms']:9.2f}  p95 {stats['p95_ms']:9.2f}  p99 {stats['p99_ms']:9.2f} ms")
+        click.echo(f"Results written to {save_results(results, output, directory=RESULTS_DIR)}.")
+        
+        regressions = _compare_with_baseline(results, baseline, RESULTS_DIR, threshold, 'p95_ms',
+                                             ('target', 'sessions', 'concurrency'))
+        if save_baseline:
+            click.echo(f"Baseline written to {save_results(results, os.path.join(RESULTS_DIR, BASELINE_FILE))}.")
+        
+        if regressions:
+            click.echo(f"{len(regressions)} routes regressed by more than {threshold:.0%}.", err=True)
+            sys.exit(1)
+    
+    @app.cli.command('train-model')
+    @click.option('--epochs', default=10, show_default=True, help='Maximum epochs; stops early on validation loss.')
+    @click.option('--batch-size', default=1024, show_default=True, help='Examples per training step.')
+    @click.option('--chunk-size', default=50000, show_default=True, help='Rating IDs read per database query.')
+    @click.option('--validation-fraction', default=0.1, show_default=True, help='Share of ratings used for validation.')
+    @click.option('--patience', default=2, show_default=True, help='Epochs without improvement before stopping.')
+    @click.option('--embedding-dim', default=16, show_default=True, help='Width of the deep embeddings.')
+    @click.option('--learning-rate', default=0.001, show_default=True, help='Adam learning rate.')
+    @click.option('--warm-start/--no-warm-start', default=True, show_default=True,
+                  help='Initialize from the previous model version.')
+    @click.option('--from', 'warm_start_path', default=None,
+                  help='Bundle to warm-start from (default: the latest published version).')
+    @click.option('--version', 'model_version', default=None, help='Version string (default: UTC timestamp).')
+    @click.option('--output', default=None,
+                  help='Bundle file to write (default: publish into the versions directory for hot reload).')
+    @click.option('--seed', default=42, show_default=True, help='Seed of the initialization and example order.')
+    def train_model_command(epochs, batch_size, chunk_size, validation_fraction, patience, embedding_dim,
+                            learning_rate, warm_start, warm_start_path, model_version, output, seed):
+        """Retrain the wide & deep model from the database and write a new versioned bundle."""
+        import os
+        from datetime import datetime
+        from model_bundle import DEFAULT_VERSIONS_DIR, find_latest_version, version_bundle_path
+        from training import train_model
+        
+        versions_dir = os.environ.get('MODEL_VERSIONS_DIR', DEFAULT_VERSIONS_DIR)
+        model_version = model_version or datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        output = output or version_bundle_path(model_version, versions_dir)
+        
+        if warm_start and warm_start_path is None:
+            latest = find_latest_version(versions_dir)
+            warm_start_path = latest[1] if latest else None
+            if warm_start_path is None:
+                click.echo("No published model version to warm-start from; training from scratch.", err=True)
+        
+        try:
+            result = train_model(db, output, model_version,
+                                 warm_start_path=warm_start_path if warm_start else None,
+                                 epochs=epochs, batch_size=batch_size, chunk_size=chunk_size,
+                                 validation_fraction=validation_fraction, patience=patience,
+                                 embedding_dim=embedding_dim, learning_rate=learning_rate, seed=seed)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        
+        click.echo(f"Model {model_version} written to {result['path']} after {result['epochs_run']} epochs "
+                   f"(best validation loss {result['best_val_loss']:.4f} at epoch {result['best_epoch']}"
+                   + (f", warm-started from {result['warm_start_from']}" if result['warm_start_from'] else '') + ").")
+    
+    @app.cli.command('evaluate')
+    @click.option('--split', 'method', type=click.Choice(['time', 'leave_one_out']), default='time',
+                  show_default=True, help='Hold out the latest ratings overall or each user\'s latest rating.')
+    @click.option('--engine', 'engines', multiple=True,
+                  help='Recommender to evaluate (repeatable; default: wide_deep, collaborative_filtering, popularity).')
+    @click.option('--k', default=10, show_default=True, help='Recommendations per user and metric cutoff.')
+    @click.option('--test-fraction', default=0.2, show_default=True, help='Share of ratings held out by the time split.')
+    @click.option('--min-ratings', default=5, show_default=True, help='Minimum ratings per user for leave-one-out.')
+    @click.option('--users', 'max_users', default=1000, show_default=True, help='Evaluate at most this many users.')
+    @click.option('--relevant-rating', default=0, show_default=True, help='Minimum held-out rating counted as relevant.')
+    @click.option('--workers', default=4, show_default=True, help='Worker processes.')
+    @click.option('--seed', default=42, show_default=True, help='Seed of the user sample.')
+    @click.option('--output', default=None, help='Report file (default: instance/evaluations/<timestamp>.json).')
+    def evaluate_command(method, engines, k, test_fraction, min_ratings, max_users, relevant_rating,
+                         workers, seed, output):
+        """Compare ranking quality and latency of the recommenders on held-out ratings."""
+        from benchmarks import save_results
+        from evaluation import ENGINES, RESULTS_DIR, evaluate
+        
+        unknown = set(engines) - set(ENGINES)
+        if unknown:
+            raise click.ClickException(f"Unknown engines {', '.join(sorted(unknown))}; choose from {', '.join(ENGINES)}.")
+        
+        try:
+            report = evaluate(app, db, engines=engines or ENGINES, method=method, k=k,
+                              test_fraction=test_fraction, min_ratings=min_ratings, max_users=max_users,
+                              relevant_rating=relevant_rating, workers=workers, seed=seed)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        
+        split = report['split']
+        click.echo(f"{split['users']} users, {split['held_out_ratings']} held-out ratings ({method} split), k={k}")
+        for engine_name, result in report['engines'].items():
+            metrics, latency = result['metrics'], result['latency']
+            label = engine_name + (' (no model: fallback)' if result['neural_model'] is False else '')
+            click.echo(f"{label:34} " + '  '.join(f"{name} {value:.4f}" for name, value in metrics.items())
+                       + f"  latency p50 {latency['p50_ms']:.1f} ms  p95 {latency['p95_ms']:.1f} ms")
+        click.echo(f"Report written to {save_results(report, output, directory=RESULTS_DIR)}.")
+    
+    @app.cli.command('quantization-report')
+    @click.option('--mode', 'modes', multiple=True,
+                  help='Quantization mode to compare (repeatable; default: float32, float16, int8).')
+    @click.option('--users', default=200, show_default=True, help='Users sampled from those with ratings.')
+    @click.option('--k', default=10, show_default=True, help='Cutoff of the top-k agreement.')
+    @click.option('--seed', default=42, show_default=True, help='Seed of the user sample.')
+    @click.option('--output', default=None, help='Report file (default: instance/quantization/<timestamp>.json).')
+    def quantization_report_command(modes, users, k, seed, output):
+        """Compare quantized embedding tables with the full-precision model: score drift, memory and latency."""
+        import app as app_module
+        from benchmarks import save_results
+        from quantization import QUANTIZATION_MODES, RESULTS_DIR, drift_report
+        
+        unknown = set(modes) - set(QUANTIZATION_MODES)
+        if unknown:
+            raise click.ClickException(f"Unknown modes {', '.join(sorted(unknown))}; "
+                                       f"choose from {', '.join(QUANTIZATION_MODES)}.")
+        
+        app_module.startup_state.wait_until_ready()
+        engine = app_module.recommendation_engine
+        if engine is None or engine._state.bundle is None:
+            raise click.ClickException("No model bundle is loaded.")
+        
+        with app.app_context():
+            try:
+                report = drift_report(engine, engine._state.bundle, modes=modes or QUANTIZATION_MODES,
+                                      users=users, k=k, seed=seed)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+        
+        reference = report['reference']
+        click.echo(f"Model {report['model_version']}: {report['users']} users, {report['pairs']} pairs, "
+                   f"reference {reference['model']} {reference['ms_per_1000_pairs']} ms/1000 pairs")
+        for mode, result in report['modes'].items():
+            click.echo(f"{mode:8} mean abs error {result['mean_abs_error']:.2e}  max {result['max_abs_error']:.2e}  "
+                       f"top{k} overlap {result[f'top{k}_overlap']:.3f}  embeddings {result['embedding_mb']} MB  "
+                       f"{result['ms_per_1000_pairs']} ms/1000 pairs")
+        click.echo(f"Report written to {save_results(report, output, directory=RESULTS_DIR)}.")
+
+def _compare_with_baseline(results, baseline, results_dir, threshold, metric, environment_keys):
+    """
+    Print the comparison of a benchmark or load test run with its baseline.
+    
+    Args:
+        results: Result dict of this run
+        baseline: Baseline file given on the command line, or None for <results_dir>/baseline.json
+        results_dir: Directory holding the default baseline
+        threshold: Relative slowdown counted as a regression
+        metric: Statistic to compare
+        environment_keys: Environment entries that should match for a fair comparison
+    
+    Returns:
+        Names of the regressed entries
+    """
+    import os
+    from benchmarks import BASELINE_FILE, compare_results, load_results
+    
+    baseline_path = baseline or os.path.join(results_dir, BASELINE_FILE)
+    if not os.path.exists(baseline_path):
+        if baseline:
+            raise click.ClickException(f"Baseline {baseline} not found.")
+        return []
+    
+    baseline_results = load_results(baseline_path)
+    click.echo(f"Compared with {baseline_path} ({metric}):")
+    for key in environment_keys:
+        before, after = baseline_results.get('environment', {}).get(key), results['environment'][key]
+        if before != after:
+            click.echo(f"Warning: baseline ran with {key}={before}, this run with {key}={after}.", err=True)
+    
+    regressions = []
+    for name, base_ms, current_ms, ratio, regressed in compare_results(results, baseline_results, threshold, metric):
+        click.echo(f"{name:34} {base_ms:10.2f} -> {current_ms:10.2f} ms  x{ratio:.2f}"
+                   + ("  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return regressions
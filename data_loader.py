@@ -1,10 +1,12 @@
 import logging
 import csv
+import io
 import os
 from datetime import datetime
 from werkzeug.security import generate_password_hash
-from sqlalchemy import func
+from sqlalchemy import func, insert, text, update
 from models import User, Book, Rating
+from facets import refresh_facets
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -37,6 +39,14 @@ def load_data_to_db(db):
         db.session.commit()
         logger.info("All data loaded successfully!")
         
+        # Rebuild filter facets for the imported catalog
+        logger.info("Refreshing facet tables...")
+        refresh_facets(db)
+        
+        # Refresh planner statistics, also used for approximate listing totals
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+        
     except Exception as e:
         logger.error(f"Error loading data: {str(e)}")
         db.session.rollback()
@@ -59,7 +69,7 @@ def load_books(db):
             
             # Process each row
             count = 0
-            batch_size = 1000
+            batch_size = _batch_size(db, 1000)
             books = []
             
             for row in reader:
@@ -67,33 +77,33 @@ def load_books(db):
                 if not row.get('ISBN'):
                     continue
                 
-                # Create book object
-                book = Book(
-                    isbn=row.get('ISBN', ''),
-                    title=row.get('Book-Title', 'Unknown Title'),
-                    author=row.get('Book-Author', 'Unknown Author'),
-                    year_of_publication=row.get('Year-Of-Publication', ''),
-                    publisher=row.get('Publisher', 'Unknown Publisher'),
-                    image_url_s=row.get('Image-URL-S', ''),
-                    image_url_m=row.get('Image-URL-M', ''),
-                    image_url_l=row.get('Image-URL-L', '')
-                )
+                # Create book row
+                book = {
+                    'isbn': row.get('ISBN', ''),
+                    'title': row.get('Book-Title', 'Unknown Title'),
+                    'author': row.get('Book-Author', 'Unknown Author'),
+                    'year_of_publication': row.get('Year-Of-Publication', ''),
+                    'publisher': row.get('Publisher', 'Unknown Publisher'),
+                    'image_url_s': row.get('Image-URL-S', ''),
+                    'image_url_m': row.get('Image-URL-M', ''),
+                    'image_url_l': row.get('Image-URL-L', ''),
+                    'avg_rating': 0.0,
+                    'num_ratings': 0
+                }
                 
                 # Add to batch
                 books.append(book)
                 count += 1
                 
-                # Commit in batches
+                # Insert in batches
                 if len(books) >= batch_size:
-                    db.session.add_all(books)
-                    db.session.flush()
+                    _insert_rows(db, Book, books)
                     logger.info(f"Loaded {count} books")
                     books = []
             
             # Add remaining books
             if books:
-                db.session.add_all(books)
-                db.session.flush()
+                _insert_rows(db, Book, books)
             
             # Log progress
             logger.info(f"Loaded {count} books in total")
@@ -172,7 +182,7 @@ def load_users(db):
             
             # Process each row
             count = 0
-            batch_size = 1000
+            batch_size = _batch_size(db, 1000)
             users = []
             
             # Generate a default password hash for all users
@@ -204,32 +214,33 @@ def load_users(db):
                 username = f"user_{user_id}"
                 email = f"user_{user_id}@example.com"
                 
-                # Create user object
-                user = User(
-                    id=user_id,
-                    username=username,
-                    email=email,
-                    password_hash=password_hash,
-                    location=location,
-                    age=age,
-                    registration_date=datetime.utcnow()
-                )
+                # Create user row
+                user = {
+                    'id': user_id,
+                    'username': username,
+                    'email': email,
+                    'password_hash': password_hash,
+                    'location': location,
+                    'age': age,
+                    'registration_date': datetime.utcnow()
+                }
                 
                 # Add to batch
                 users.append(user)
                 count += 1
                 
-                # Commit in batches
+                # Insert in batches
                 if len(users) >= batch_size:
-                    db.session.add_all(users)
-                    db.session.flush()
+                    _insert_rows(db, User, users)
                     logger.info(f"Loaded {count} users")
                     users = []
             
             # Add remaining users
             if users:
-                db.session.add_all(users)
-                db.session.flush()
+                _insert_rows(db, User, users)
+            
+            # Explicit ids bypass the PostgreSQL sequence, move it past them
+            _sync_id_sequence(db, User)
             
             # Log progress
             logger.info(f"Loaded {count} users in total")
@@ -311,8 +322,9 @@ def load_ratings(db):
             
             # Process each row
             count = 0
-            batch_size = 5000
+            batch_size = _batch_size(db, 5000)
             ratings = []
+            seen = set()
             
             for row in reader:
                 # Skip if user ID or ISBN is missing
@@ -333,22 +345,26 @@ def load_ratings(db):
                     if user_id not in valid_users or isbn not in valid_books:
                         continue
                     
-                    # Create rating object
-                    rating = Rating(
-                        user_id=user_id,
-                        isbn=isbn,
-                        rating=rating_value,
-                        timestamp=datetime.utcnow()
-                    )
+                    # Skip duplicates of the (user, book) unique constraint
+                    if (user_id, isbn) in seen:
+                        continue
+                    seen.add((user_id, isbn))
+                    
+                    # Create rating row
+                    rating = {
+                        'user_id': user_id,
+                        'isbn': isbn,
+                        'rating': rating_value,
+                        'timestamp': datetime.utcnow()
+                    }
                     
                     # Add to batch
                     ratings.append(rating)
                     count += 1
                     
-                    # Commit in batches
+                    # Insert in batches
                     if len(ratings) >= batch_size:
-                        db.session.add_all(ratings)
-                        db.session.flush()
+                        _insert_rows(db, Rating, ratings)
                         logger.info(f"Loaded {count} ratings")
                         ratings = []
                         
@@ -358,8 +374,7 @@ def load_ratings(db):
             
             # Add remaining ratings
             if ratings:
-                db.session.add_all(ratings)
-                db.session.flush()
+                _insert_rows(db, Rating, ratings)
             
             # Log progress
             logger.info(f"Loaded {count} ratings in total")
@@ -404,22 +419,92 @@ def _load_sample_ratings(db):
 def update_book_ratings(db):
     """Update average ratings for all books."""
     try:
-        # Get all books
-        books = db.session.query(Book).all()
+        # Aggregate all ratings once and write them back in a single UPDATE ... FROM
+        stats = db.session.query(
+            Rating.isbn.label('isbn'),
+            func.avg(Rating.rating).label('avg_rating'),
+            func.count(Rating.id).label('num_ratings')
+        ).group_by(Rating.isbn).subquery()
         
-        for book in books:
-            # Get all ratings for this book
-            ratings = db.session.query(Rating).filter(Rating.isbn == book.isbn).all()
-            
-            if ratings:
-                # Calculate average rating
-                avg_rating = sum(r.rating for r in ratings) / len(ratings)
-                book.avg_rating = avg_rating
-                book.num_ratings = len(ratings)
+        result = db.session.execute(
+            update(Book).where(
+                Book.isbn == stats.c.isbn
+            ).values(
+                avg_rating=stats.c.avg_rating,
+                num_ratings=stats.c.num_ratings
+            )
+        )
         
         db.session.commit()
-        logger.info(f"Updated average ratings for {len(books)} books")
+        logger.info(f"Updated average ratings for {result.rowcount} books")
         
     except Exception as e:
         logger.error(f"Error updating book ratings: {str(e)}")
         raise
+
+def _batch_size(db, default):
+    """Rows per insert batch; COPY on PostgreSQL handles much larger batches."""
+    if db.engine.dialect.name == 'postgresql':
+        return default * 20
+    return default
+
+def _insert_rows(db, model, rows):
+    """
+    Insert a batch of rows for a model.
+    
+    Uses COPY FROM STDIN on PostgreSQL and a single executemany INSERT
+    elsewhere, so no ORM objects are built during imports.
+    
+    Args:
+        db: SQLAlchemy database instance
+        model: Model class whose table receives the rows
+        rows: List of dicts with identical keys
+    """
+    if db.engine.dialect.name == 'postgresql':
+        _copy_rows(db, model.__table__, rows)
+    else:
+        db.session.execute(insert(model.__table__), rows)
+
+def _copy_rows(db, table, rows):
+    """Stream rows into a PostgreSQL table with COPY in text format."""
+    columns = list(rows[0].keys())
+    preparer = db.engine.dialect.identifier_preparer
+    
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(row[column]) for column in columns))
+        buffer.write('\n')
+    buffer.seek(0)
+    
+    statement = "COPY {} ({}) FROM STDIN".format(
+        preparer.quote(table.name),
+        ', '.join(preparer.quote(column) for column in columns)
+    )
+    
+    # Run on the session's connection so COPY joins the import transaction
+    connection = db.session.connection().connection.dbapi_connection
+    with connection.cursor() as cursor:
+        cursor.copy_expert(statement, buffer)
+
+def _copy_value(value):
+    """Format a value for COPY text format, escaping separators."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+def _sync_id_sequence(db, model):
+    """Advance a PostgreSQL serial sequence past explicitly inserted ids."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    
+    table = db.engine.dialect.identifier_preparer.quote(model.__table__.name)
+    db.session.execute(text(
+        "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+    ), {'table': table})
@@ -0,0 +1,322 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from sqlalchemy import text, update
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where reports are stored
+RESULTS_DIR = os.path.join('instance', 'evaluations')
+
+# Recommenders compared by the harness
+ENGINES = ('wide_deep', 'collaborative_filtering', 'popularity')
+
+SPLIT_METHODS = ('time', 'leave_one_out')
+
+def split_ratings(db, method='time', test_fraction=0.2, min_ratings=5, max_users=1000,
+                  relevant_rating=0, seed=42):
+    """
+    Choose held-out ratings and the users evaluated on them.
+
+    'time' holds out every rating after the (1 - test_fraction) timestamp
+    quantile, like deploying a model trained up to a date. 'leave_one_out'
+    holds out each user's latest rating.
+
+    Args:
+        db: SQLAlchemy database instance
+        method: 'time' or 'leave_one_out'
+        test_fraction: Share of ratings held out by the time split
+        min_ratings: Minimum ratings of an evaluated user (leave-one-out)
+        max_users: Evaluate a random sample of at most this many users
+        relevant_rating: Held-out ratings below this don't count as relevant
+        seed: Seed of the user sample
+
+    Returns:
+        Tuple (held-out rating IDs, dict of evaluated user ID -> relevant ISBNs)
+    """
+    import numpy as np
+    from models import Rating
+
+    rows = db.session.query(Rating.id, Rating.user_id, Rating.timestamp, Rating.rating, Rating.isbn).all()
+    if not rows:
+        return np.empty(0, dtype=np.int64), {}
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    users = np.array([row[1] for row in rows], dtype=np.int64)
+    times = np.array([row[2].timestamp() if row[2] else 0.0 for row in rows])
+    values = np.array([row[3] for row in rows], dtype=np.int64)
+
+    if method == 'time':
+        held_out = times > np.quantile(times, 1 - test_fraction)
+        # Only users with history before the cutoff can be recommended for
+        candidates = np.intersect1d(users[held_out], users[~held_out])
+    elif method == 'leave_one_out':
+        # Latest rating per user: sort by user, then time, then ID and take each user's last row
+        order = np.lexsort((ids, times, users))
+        last = np.r_[users[order][1:] != users[order][:-1], True]
+        user_ids, counts = np.unique(users, return_counts=True)
+        candidates = user_ids[counts >= min_ratings]
+        held_out = np.zeros(len(ids), dtype=bool)
+        held_out[order[last]] = True
+    else:
+        raise ValueError(f"Unknown split method {method!r}, expected one of {SPLIT_METHODS}")
+
+    rng = np.random.default_rng(seed)
+    if max_users and len(candidates) > max_users:
+        candidates = np.sort(rng.choice(candidates, size=max_users, replace=False))
+    if method == 'leave_one_out':
+        # Users outside the sample keep their whole history for training
+        held_out &= np.isin(users, candidates)
+
+    relevant = {int(user_id): set() for user_id in candidates}
+    for index in np.flatnonzero(held_out):
+        user_id = int(users[index])
+        if user_id in relevant and values[index] >= relevant_rating:
+            relevant[user_id].add(rows[index][4])
+
+    return ids[held_out], {user_id: items for user_id, items in relevant.items() if items}
+
+def build_evaluation_db(app, db, held_out_ids, path):
+    """
+    Copy users, books and the training ratings into a fresh SQLite database.
+
+    The engines read ratings and popularity from the database, so they are
+    evaluated against a copy without the held-out ratings; book rating
+    counts and facets are recomputed from the training ratings alone.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+        held_out_ids: IDs of the held-out ratings
+        path: SQLite file to create
+
+    Returns:
+        Database URL of the copy
+    """
+    from flask import Flask
+    from models import User, Book, Rating
+    from data_loader import update_book_ratings
+    from facets import refresh_facets
+    from migrations import run_migrations
+
+    url = f"sqlite:///{os.path.abspath(path)}"
+    held_out = set(int(rating_id) for rating_id in held_out_ids)
+    with app.app_context():
+        source = db.engine
+
+    eval_app = Flask('evaluation')
+    eval_app.config['SQLALCHEMY_DATABASE_URI'] = url
+    db.init_app(eval_app)
+    with eval_app.app_context():
+        db.create_all()
+        with source.connect() as source_conn, db.engine.begin() as target_conn:
+            for table in (User.__table__, Book.__table__, Rating.__table__):
+                result = source_conn.execution_options(yield_per=10000).execute(table.select())
+                for partition in result.partitions():
+                    rows = [row._asdict() for row in partition]
+                    if table is Rating.__table__:
+                        rows = [row for row in rows if row['id'] not in held_out]
+                    if rows:
+                        target_conn.execute(table.insert(), rows)
+
+        run_migrations(db)
+
+        # Popularity may only come from training ratings
+        db.session.execute(update(Book).values(avg_rating=0.0, num_ratings=0))
+        update_book_ratings(db)
+        refresh_facets(db)
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+        db.engine.dispose()
+
+    return url
+
+def _init_worker(database_url):
+    """
+    Boot the app in a worker process against the evaluation database.
+
+    This module imports the app (through models) only inside functions, so
+    a spawned worker unpickling its tasks can set the environment first.
+    """
+    os.environ.update({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'STARTUP_IN_BACKGROUND': '0',
+        'LOAD_DATASET': '0',
+        'MODEL_RELOAD_INTERVAL': '0',
+    })
+    import app  # noqa: F401 - builds and warms the engine synchronously
+    logging.getLogger().setLevel(logging.WARNING)
+
+def _recommend_chunk(engine_name, user_ids, k):
+    """
+    Recommend for a chunk of users in a worker; timed per user.
+
+    Returns:
+        Tuple (list of (user ID, ISBNs, milliseconds), whether the neural model was used)
+    """
+    import app as app_module
+    from models import Rating
+    from recommendation import get_popular_books
+
+    engine = app_module.recommendation_engine
+    if engine is None:
+        raise RuntimeError("recommendation engine failed to start in the evaluation worker")
+
+    results = []
+    with app_module.app.app_context():
+        for user_id in user_ids:
+            start = time.perf_counter()
+            if engine_name == 'wide_deep':
+                isbns = [isbn for isbn, _ in engine.get_scored_recommendations(
+                    [user_id], top_n=k, use_cache=False
+                ).get(user_id, [])]
+            elif engine_name == 'collaborative_filtering':
+                isbns = engine._get_recommendations_fallback(user_id, k)
+            else:
+                # Popularity baseline, without books the user already rated like the other engines
+                rated = {isbn for (isbn,) in app_module.db.session.query(Rating.isbn).filter(
+                    Rating.user_id == user_id
+                )}
+                isbns = [isbn for isbn in get_popular_books(k + len(rated)) if isbn not in rated][:k]
+            results.append((user_id, list(isbns)[:k], (time.perf_counter() - start) * 1000))
+        app_module.db.session.remove()
+
+    return results, engine.model is not None
+
+def ranking_metrics(recommended, relevant, k, catalog_size):
+    """
+    Precision@k, recall@k, NDCG@k and coverage, vectorized over users.
+
+    Args:
+        recommended: Dict of user ID -> ranked ISBNs
+        relevant: Dict of user ID -> set of held-out ISBNs
+        k: Cutoff
+        catalog_size: Number of books, for coverage
+
+    Returns:
+        Dict of metric name -> value
+    """
+    import numpy as np
+
+    user_ids = sorted(recommended)
+    items = {}
+    ranked = np.full((len(user_ids), k), -1, dtype=np.int64)
+    for row, user_id in enumerate(user_ids):
+        for col, isbn in enumerate(recommended[user_id][:k]):
+            ranked[row, col] = items.setdefault(isbn, len(items))
+
+    # Relevant (user row, item) pairs as codes; items never recommended can't be hits
+    item_count = max(len(items), 1)
+    relevant_codes = np.array([row * item_count + items[isbn]
+                               for row, user_id in enumerate(user_ids)
+                               for isbn in relevant[user_id] if isbn in items], dtype=np.int64)
+    hits = (ranked >= 0) & np.isin(np.arange(len(user_ids))[:, None] * item_count + ranked, relevant_codes)
+    relevant_counts = np.array([len(relevant[user_id]) for user_id in user_ids])
+
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = (hits * discounts).sum(axis=1)
+    ideal = np.cumsum(discounts)[np.minimum(relevant_counts, k) - 1]
+
+    return {
+        f'precision@{k}': float((hits.sum(axis=1) / k).mean()),
+        f'recall@{k}': float((hits.sum(axis=1) / relevant_counts).mean()),
+        f'ndcg@{k}': float((dcg / ideal).mean()),
+        f'hit_rate@{k}': float(hits.any(axis=1).mean()),
+        'coverage': len(items) / catalog_size if catalog_size else 0.0,
+    }
+
+def _latency_summary(latencies):
+    import numpy as np
+
+    values = np.array(latencies)
+    return {
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+    }
+
+def evaluate(app, db, engines=ENGINES, method='time', k=10, test_fraction=0.2, min_ratings=5,
+             max_users=1000, relevant_rating=0, workers=4, chunk_size=50, seed=42):
+    """
+    Compare the recommenders on held-out ratings.
+
+    Each engine runs over the evaluated users in a pool of worker processes,
+    each booting the app (and the neural model, if available) against a
+    copy of the database without the held-out ratings.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+        engines: Recommenders to evaluate, from ENGINES
+        method: Split method, 'time' or 'leave_one_out'
+        k: Recommendation list length and metric cutoff
+        test_fraction, min_ratings, max_users, relevant_rating, seed: See split_ratings
+        workers: Worker processes
+        chunk_size: Users per worker task
+
+    Returns:
+        Report dict with the split and the metrics and latencies per engine
+    """
+    from models import Book
+
+    with app.app_context():
+        held_out_ids, relevant = split_ratings(db, method=method, test_fraction=test_fraction,
+                                               min_ratings=min_ratings, max_users=max_users,
+                                               relevant_rating=relevant_rating, seed=seed)
+        catalog_size = db.session.query(Book.id).count()
+    if not relevant:
+        raise ValueError("No users with held-out ratings to evaluate")
+    logger.info(f"Evaluating {len(relevant)} users on {len(held_out_ids)} held-out ratings ({method} split)")
+
+    user_ids = sorted(relevant)
+    chunks = [user_ids[start:start + chunk_size] for start in range(0, len(user_ids), chunk_size)]
+    directory = tempfile.mkdtemp(prefix='evaluation-')
+    report = {
+        'created': datetime.utcnow().isoformat(),
+        'split': {
+            'method': method,
+            'users': len(relevant),
+            'held_out_ratings': len(held_out_ids),
+            'relevant_items': sum(len(items) for items in relevant.values()),
+            'test_fraction': test_fraction if method == 'time' else None,
+            'seed': seed,
+        },
+        'k': k,
+        'engines': {},
+    }
+
+    try:
+        database_url = build_evaluation_db(app, db, held_out_ids, os.path.join(directory, 'evaluation.db'))
+
+        # Spawned workers don't inherit this process's database connections or TensorFlow state
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_init_worker, initargs=(database_url,)) as executor:
+            for engine_name in engines:
+                start = time.perf_counter()
+                recommended, latencies, neural = {}, [], False
+                for results, used_model in executor.map(_recommend_chunk, [engine_name] * len(chunks),
+                                                        chunks, [k] * len(chunks)):
+                    neural = neural or used_model
+                    for user_id, isbns, milliseconds in results:
+                        recommended[user_id] = isbns
+                        latencies.append(milliseconds)
+
+                report['engines'][engine_name] = {
+                    'metrics': ranking_metrics(recommended, relevant, k, catalog_size),
+                    'latency': _latency_summary(latencies),
+                    'elapsed_s': round(time.perf_counter() - start, 3),
+                    # Without the model, 'wide_deep' scores with the collaborative filtering fallback
+                    'neural_model': neural if engine_name == 'wide_deep' else None,
+                }
+                logger.info(f"Evaluated {engine_name}: {report['engines'][engine_name]}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return report
@@ -0,0 +1,143 @@
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from models import User
+from recommendation import get_popular_books
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Users scored per engine call
+DEFAULT_CHUNK_SIZE = 100
+
+def iter_user_id_chunks(db, start_after=0, chunk_size=DEFAULT_CHUNK_SIZE, limit=None):
+    """
+    Yield user IDs in ascending chunks, seeking past the last ID of each chunk.
+
+    Args:
+        db: SQLAlchemy database instance
+        start_after: Only users with a greater ID are returned (for resuming)
+        chunk_size: Number of IDs per chunk
+        limit: Maximum number of users in total
+
+    Yields:
+        Lists of user IDs
+    """
+    last_id = start_after or 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(size)]
+        if not user_ids:
+            return
+
+        yield user_ids
+        last_id = user_ids[-1]
+        if remaining is not None:
+            remaining -= len(user_ids)
+
+def _score_chunk(app, engine, user_ids, top_n):
+    """
+    Recommend for one chunk of users in its own app context (runs in a worker thread).
+
+    Returns:
+        Tuple (version of the model that scored the chunk, dict of user ID -> (isbn, score) pairs)
+    """
+    with app.app_context():
+        if engine is None:
+            popular = [(isbn, None) for isbn in get_popular_books(top_n)]
+            return None, {user_id: popular for user_id in user_ids}
+
+        # Bulk exports would otherwise fill the per-user cache with every user
+        return engine.get_versioned_recommendations(user_ids, top_n, use_cache=False)
+
+def iter_recommendation_records(app, db, engine, start_after=0, top_n=24,
+                                chunk_size=DEFAULT_CHUNK_SIZE, workers=1, limit=None):
+    """
+    Lazily generate one recommendation record per user, in user ID order.
+
+    Chunks are scored by up to `workers` threads; at most `workers` chunks
+    are in flight, so memory stays bounded by the chunk size whatever the
+    number of users. Each record names the model version that scored its
+    chunk, which changes mid-export if a new version is loaded.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+        engine: RecommendationEngine, or None to export popular books
+        start_after: Resume after this user ID
+        top_n: Number of recommendations per user
+        chunk_size: Number of users per engine call
+        workers: Number of chunks scored in parallel
+        limit: Maximum number of users
+
+    Yields:
+        Dicts with user_id, model_version and items (isbn and score)
+    """
+    workers = max(1, workers)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export') as executor:
+        pending = deque()
+        chunks = iter_user_id_chunks(db, start_after, chunk_size, limit)
+
+        while True:
+            # Keep the pool busy without reading ahead more than `workers` chunks
+            while len(pending) < workers:
+                user_ids = next(chunks, None)
+                if user_ids is None:
+                    break
+                pending.append((user_ids, executor.submit(_score_chunk, app, engine, user_ids, top_n)))
+
+            if not pending:
+                return
+
+            user_ids, future = pending.popleft()
+            model_version, results = future.result()
+            for user_id in user_ids:
+                yield {
+                    'user_id': user_id,
+                    'model_version': model_version,
+                    'items': [
+                        {'isbn': isbn, 'score': round(float(score), 4) if score is not None else None}
+                        for isbn, score in results.get(user_id, [])
+                    ],
+                }
+
+def to_ndjson(record):
+    """Serialize a record as one NDJSON line."""
+    return json.dumps(record, separators=(',', ':')) + '\n'
+
+def prepare_resume(path):
+    """
+    Get an interrupted NDJSON export ready to be appended to.
+
+    Drops a trailing line cut off mid-write and finds the user ID of the
+    last complete record.
+
+    Returns:
+        User ID to resume after, or 0 if the file is missing or holds no complete record
+    """
+    try:
+        with open(path, 'rb+') as file:
+            file.seek(0, 2)
+            size = file.tell()
+            tail_start = max(0, size - 65536)
+            file.seek(tail_start)
+            tail = file.read()
+
+            # A line cut off by an interrupted export has no trailing newline
+            complete = tail.rfind(b'\n') + 1
+            if tail_start + complete < size and (complete or tail_start == 0):
+                file.truncate(tail_start + complete)
+    except FileNotFoundError:
+        return 0
+
+    for line in reversed(tail[:complete].split(b'\n')):
+        try:
+            return int(json.loads(line)['user_id'])
+        except (ValueError, KeyError, TypeError):
+            continue
+    return 0
@@ -0,0 +1,116 @@
+import logging
+from collections import namedtuple
+from sqlalchemy import func, insert, literal, select, union_all
+from models import Book, BookFacet
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Book columns backing each filter dropdown on /books
+FACET_COLUMNS = {
+    'author': Book.author,
+    'publisher': Book.publisher,
+    'year': Book.year_of_publication,
+}
+
+# Same shape as a BookFacet row, used for search-scoped counts
+FacetValue = namedtuple('FacetValue', ['value', 'book_count'])
+
+def refresh_facets(db):
+    """
+    Rebuild the materialized facet table from the book table.
+
+    Args:
+        db: SQLAlchemy database instance
+    """
+    try:
+        db.session.query(BookFacet).delete()
+
+        for facet, column in FACET_COLUMNS.items():
+            # One grouped INSERT ... SELECT per facet, no rows pass through Python
+            grouped = select(
+                literal(facet),
+                column,
+                func.count(Book.id)
+            ).where(
+                column.isnot(None),
+                column != ''
+            ).group_by(column)
+
+            db.session.execute(
+                insert(BookFacet).from_select(
+                    ['facet', 'value', 'book_count'], grouped
+                )
+            )
+
+        db.session.commit()
+        logger.info("Facet tables refreshed")
+
+    except Exception as e:
+        logger.error(f"Error refreshing facets: {str(e)}")
+        db.session.rollback()
+        raise
+
+def get_filter_facets(limit=100):
+    """
+    Get filter values for the whole catalog from the materialized facet table.
+
+    Args:
+        limit: Maximum number of authors and publishers to return
+
+    Returns:
+        Dict mapping facet name to a list of BookFacet rows
+    """
+    def _values(facet):
+        return BookFacet.query.filter_by(facet=facet)
+
+    return {
+        'author': _values('author').order_by(BookFacet.value).limit(limit).all(),
+        'publisher': _values('publisher').order_by(BookFacet.value).limit(limit).all(),
+        'year': _values('year').order_by(BookFacet.value.desc()).all(),
+    }
+
+def get_search_facets(db, query, limit=100):
+    """
+    Get filter values with counts scoped to a filtered book query.
+
+    A single statement: the matching books are read once into a CTE and
+    each facet is grouped, sorted and limited in the database, so even a
+    broad search returns at most `limit` rows per facet.
+
+    Args:
+        db: SQLAlchemy database instance
+        query: Book query with the current search applied
+        limit: Maximum number of authors and publishers to return
+
+    Returns:
+        Dict mapping facet name to a list of FacetValue tuples
+    """
+    matches = query.with_entities(*FACET_COLUMNS.values()).order_by(None).cte('matches')
+
+    def _grouped(facet, descending=False, limit=None):
+        column = matches.c[FACET_COLUMNS[facet].key]
+        grouped = select(
+            literal(facet).label('facet'),
+            column.label('value'),
+            func.count().label('book_count')
+        ).where(
+            column.isnot(None),
+            column != ''
+        ).group_by(column).order_by(column.desc() if descending else column).limit(limit)
+        return select(grouped.subquery())
+
+    rows = db.session.execute(union_all(
+        _grouped('author', limit=limit),
+        _grouped('publisher', limit=limit),
+        _grouped('year', descending=True)
+    ))
+
+    facets = {facet: [] for facet in FACET_COLUMNS}
+    for facet, value, book_count in rows:
+        facets[facet].append(FacetValue(value, book_count))
+    # UNION ALL keeps no order across the parts
+    facets['author'].sort()
+    facets['publisher'].sort()
+    facets['year'].sort(reverse=True)
+    return facets
@@ -0,0 +1,36 @@
+"""
+Gunicorn settings, read from the working directory by `gunicorn main:app`.
+
+With PRELOAD_APP=1 the master imports the app, loading the book catalog,
+candidate index and model once, and forks the workers from it: they share
+that memory copy-on-write instead of each building their own copy.
+"""
+import os
+
+# Import the app in the master and fork the workers from it
+preload_app = os.environ.get('PRELOAD_APP', '0') == '1'
+
+if preload_app:
+    # TensorFlow's thread pools don't survive fork; the numpy scorer needs only
+    # numpy, and its float32 mode gives the Keras scores
+    os.environ.setdefault('MODEL_QUANTIZATION', 'float32')
+
+def when_ready(server):
+    """Runs in the master once the app is loaded, before the workers are forked."""
+    if not server.cfg.preload_app:
+        return
+
+    import app
+    if not app.app.config['PRELOAD_APP']:
+        server.log.warning("--preload without PRELOAD_APP=1: background threads were started in the master")
+        return
+    app.prepare_for_fork()
+
+def post_fork(server, worker):
+    """Runs in each worker right after the fork."""
+    if not server.cfg.preload_app:
+        return
+
+    import app
+    if app.app.config['PRELOAD_APP']:
+        app.init_forked_worker()
@@ -0,0 +1,239 @@
+import http.cookiejar
+import logging
+import math
+import os
+import random
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import func
+from models import User, Book
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where results are stored; compare against baseline.json by default
+RESULTS_DIR = os.path.join('instance', 'loadtests')
+
+# Hidden CSRF field rendered by form.hidden_tag()
+CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+class TestClientTransport:
+    """Run sessions in-process against the Flask test client."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def new_session(self):
+        return _TestClientSession(self.app.test_client())
+
+class _TestClientSession:
+    def __init__(self, client):
+        self.client = client
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+class HttpTransport:
+    """Run sessions over HTTP against a running server, e.g. http://127.0.0.1:5000."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def new_session(self):
+        return _HttpSession(self.base_url, self.timeout)
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as responses, like the test client, so each request is timed alone."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class _HttpSession:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read().decode('utf-8', errors='replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', errors='replace')
+
+class SessionPlan:
+    """
+    Users, books and search terms the replayed sessions draw from.
+
+    Users are the synthetic users (flask generate-synthetic-data), who share
+    one known password. Books are drawn from the most rated ones, so the
+    sessions follow the catalog's popularity skew.
+    """
+
+    def __init__(self, db, password=None, book_sample=1000, user_sample=1000):
+        from synthetic_data import SYNTHETIC_PASSWORD, USERNAME_FORMAT
+
+        self.password = password or SYNTHETIC_PASSWORD
+        self.usernames = [username for (username,) in db.session.query(User.username).filter(
+            User.username.like(USERNAME_FORMAT.format('%'))
+        ).order_by(User.id).limit(user_sample)]
+        self.isbns = [isbn for (isbn,) in db.session.query(Book.isbn).order_by(
+            Book.num_ratings.desc()
+        ).limit(book_sample)]
+
+        # Search for words of popular titles, like users looking for a known book
+        titles = [title for (title,) in db.session.query(Book.title).filter(
+            Book.isbn.in_(self.isbns[:200])
+        )]
+        self.search_terms = sorted({word for title in titles for word in title.split() if len(word) > 3})
+
+    def choose_isbn(self, rng):
+        # Rank-skewed pick: earlier (more rated) books come up more often
+        return self.isbns[int(len(self.isbns) * rng.random() ** 2)]
+
+def replay_session(session, plan, rng):
+    """
+    Replay one user session: log in, browse, search, view and rate books.
+
+    Args:
+        session: Transport session with a request(method, path, data) method
+        plan: SessionPlan to draw users and books from
+        rng: random.Random for this session
+
+    Returns:
+        List of (route, status, seconds) samples
+    """
+    samples = []
+
+    def call(route, method, path, data=None):
+        start = time.perf_counter()
+        try:
+            status, body = session.request(method, path, data)
+        except Exception as e:
+            logger.warning(f"Load test request {method} {path} failed: {str(e)}")
+            status, body = 0, ''
+        samples.append((route, status, time.perf_counter() - start))
+        return body
+
+    def csrf_token(body):
+        match = CSRF_PATTERN.search(body)
+        return match.group(1) if match else ''
+
+    body = call('login_form', 'GET', '/login')
+    call('login', 'POST', '/login', {
+        'csrf_token': csrf_token(body),
+        'username': rng.choice(plan.usernames),
+        'password': plan.password,
+    })
+
+    call('index', 'GET', '/')
+    for section in ('recommended', 'popular', 'recent'):
+        call('section_fragment', 'GET', f'/fragments/{section}')
+
+    call('books', 'GET', '/books')
+    if plan.search_terms:
+        term = urllib.parse.quote(rng.choice(plan.search_terms))
+        call('books_search', 'GET', f'/books?search={term}')
+
+    for _ in range(rng.randint(1, 4)):
+        isbn = plan.choose_isbn(rng)
+        body = call('book_details', 'GET', f'/book/{isbn}')
+        if rng.random() < 0.3:
+            call('rate_book', 'POST', f'/book/{isbn}/rate', {
+                'csrf_token': csrf_token(body),
+                'rating': rng.randint(1, 10),
+            })
+
+    call('profile', 'GET', '/profile')
+    call('logout', 'GET', '/logout')
+    return samples
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of sorted values."""
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(0, min(len(values), rank) - 1)]
+
+def summarize_samples(samples, elapsed):
+    """Per-route request counts, errors, throughput and latency percentiles in milliseconds."""
+    by_route = {}
+    for route, status, seconds in samples:
+        by_route.setdefault(route, []).append((status, seconds))
+
+    results = {}
+    for route, route_samples in sorted(by_route.items()):
+        values = sorted(seconds * 1000 for _, seconds in route_samples)
+        results[route] = {
+            'requests': len(values),
+            'errors': sum(1 for status, _ in route_samples if status == 0 or status >= 400),
+            'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+            'p50_ms': round(_percentile(values, 50), 3),
+            'p95_ms': round(_percentile(values, 95), 3),
+            'p99_ms': round(_percentile(values, 99), 3),
+            'mean_ms': round(statistics.fmean(values), 3),
+        }
+    return results
+
+def run_load_test(transport, plan, sessions=100, concurrency=8, seed=42):
+    """
+    Replay `sessions` user sessions with `concurrency` sessions in flight.
+
+    Args:
+        transport: TestClientTransport or HttpTransport
+        plan: SessionPlan to draw users and books from
+        sessions: Number of sessions to replay
+        concurrency: Sessions running at the same time
+        seed: Seed of the per-session random choices
+
+    Returns:
+        Result dict with totals and per-route statistics
+    """
+    if not plan.usernames:
+        raise ValueError("No synthetic users found; run flask generate-synthetic-data first")
+    if not plan.isbns:
+        raise ValueError("No books found")
+
+    samples = []
+    lock = threading.Lock()
+
+    def worker(index):
+        session_samples = replay_session(transport.new_session(), plan, random.Random(seed * 1000003 + index))
+        with lock:
+            samples.extend(session_samples)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadtest') as executor:
+        for future in [executor.submit(worker, index) for index in range(sessions)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    errors = sum(1 for _, status, _ in samples if status == 0 or status >= 400)
+    logger.info(f"Load test: {len(samples)} requests in {elapsed:.1f}s, {errors} errors")
+    return {
+        'created': datetime.utcnow().isoformat(),
+        'environment': {
+            'target': getattr(transport, 'base_url', 'test client'),
+            'sessions': sessions,
+            'concurrency': concurrency,
+            'seed': seed,
+        },
+        'totals': {
+            'requests': len(samples),
+            'errors': errors,
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        },
+        'results': summarize_samples(samples, elapsed),
+    }
@@ -0,0 +1,181 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from cache hits to full catalog scoring
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class Registry:
+    """Collection of metrics rendered together by /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.exposed_name} {metric.help}")
+            lines.append(f"# TYPE {metric.exposed_name} {metric.type}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.exposed_name = name + '_total'  # Counter samples carry the _total suffix
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.exposed_name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets, optionally split by labels.
+
+    observe() costs one bisect and one lock acquisition; buckets are only
+    made cumulative when rendered.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.exposed_name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(name, '') for name in self.labelnames))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+# Request latency per Flask route (URL rule, not the concrete path, to bound cardinality)
+REQUEST_LATENCY = Histogram(
+    'booksite_request_duration_seconds', 'Time spent handling HTTP requests.',
+    labelnames=('route', 'method', 'status'),
+)
+
+# SQL statements per request, from the query_stats engine hooks
+REQUEST_QUERIES = Histogram(
+    'booksite_request_db_queries', 'SQL statements run per HTTP request.',
+    labelnames=('route',), buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+# Recommendation engine stages: candidate_fetch, candidate_index (rebuilding the
+# in-vocabulary candidates), feature_encoding, model_predict, sort, similarity
+# and db_hydrate (loading the recommended books for display)
+STAGE_LATENCY = Histogram(
+    'booksite_recommendation_stage_duration_seconds', 'Time spent in each recommendation stage.',
+    labelnames=('stage',),
+)
+
+FALLBACKS = Counter(
+    'booksite_recommendation_fallbacks', 'Recommendations served by a fallback path.',
+    labelnames=('path',),
+)
+
+# Budgeted recommendations answered by collaborative filtering or popular books
+# because the model (or collaborative filtering) missed the latency budget
+DEGRADED = Counter(
+    'booksite_recommendation_degraded', 'Recommendations degraded to a lower tier by their latency budget.',
+    labelnames=('tier',),
+)
+
+CACHE_LOOKUPS = Counter(
+    'booksite_recommendation_cache_lookups', 'Recommendation engine cache lookups.',
+    labelnames=('cache', 'result'),
+)
+
+def observe_stage(stage):
+    """Time a recommendation stage: `with observe_stage('model_predict'): ...`"""
+    return STAGE_LATENCY.time(stage=stage)
+
+def record_cache_lookup(cache, hit, count=1):
+    if count:
+        CACHE_LOOKUPS.inc(count, cache=cache, result='hit' if hit else 'miss')
+
+def record_fallback(path):
+    FALLBACKS.inc(path=path)
+
+def record_degraded(tier):
+    DEGRADED.inc(tier=tier)
@@ -0,0 +1,83 @@
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+from models import Book, BookFacet, Rating, UserLibrary, SchemaMigration
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Ordered list of (name, function) pairs, applied once per database
+MIGRATIONS = []
+
+def migration(name):
+    """Register a function as the schema migration with the given name."""
+    def decorator(func):
+        MIGRATIONS.append((name, func))
+        return func
+    return decorator
+
+@migration('0001_covering_indexes')
+def _add_covering_indexes(db):
+    """Add the composite and covering indexes for the hot read queries."""
+    # db.create_all() only creates indexes together with new tables
+    for model in (Book, Rating, UserLibrary):
+        for index in model.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+            logger.info(f"Ensured index {index.name}")
+
+@migration('0002_rating_timestamp_index')
+def _add_rating_timestamp_index(db):
+    """Index rating timestamps for the book catalog refresh."""
+    for index in Rating.__table__.indexes:
+        if index.name == 'ix_rating_timestamp':
+            index.create(bind=db.engine, checkfirst=True)
+            logger.info(f"Ensured index {index.name}")
+
+@migration('0003_drop_facet_rating_count')
+def _drop_facet_rating_count(db):
+    """Drop book_facet.rating_count, which nothing displays but every rating write kept current."""
+    table = BookFacet.__table__.name
+    if 'rating_count' in {column['name'] for column in inspect(db.engine).get_columns(table)}:
+        db.session.execute(text(f"ALTER TABLE {table} DROP COLUMN rating_count"))
+        logger.info(f"Dropped {table}.rating_count")
+
+@migration('0004_book_avg_rating_not_null')
+def _make_avg_rating_not_null(db):
+    """Backfill NULL book.avg_rating with 0, so rating-sorted keyset pages never skip a book."""
+    table = Book.__table__.name
+    result = db.session.execute(text(f"UPDATE {table} SET avg_rating = 0 WHERE avg_rating IS NULL"))
+    logger.info(f"Set avg_rating of {result.rowcount} books to 0")
+    # SQLite cannot alter a column's constraints; every writer sets avg_rating there
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text(f"ALTER TABLE {table} ALTER COLUMN avg_rating SET NOT NULL"))
+        logger.info(f"Made {table}.avg_rating NOT NULL")
+
+def run_migrations(db):
+    """
+    Apply all registered migrations that have not run on this database yet.
+
+    Args:
+        db: SQLAlchemy database instance
+
+    Returns:
+        List of names of the migrations applied
+    """
+    applied = {name for (name,) in db.session.query(SchemaMigration.name)}
+    newly_applied = []
+
+    for name, func in MIGRATIONS:
+        if name in applied:
+            continue
+
+        logger.info(f"Applying migration {name}...")
+        try:
+            func(db)
+            db.session.add(SchemaMigration(name=name, applied_on=datetime.utcnow()))
+            db.session.commit()
+            newly_applied.append(name)
+        except Exception as e:
+            logger.error(f"Error applying migration {name}: {str(e)}")
+            db.session.rollback()
+            raise
+
+    return newly_applied
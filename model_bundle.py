@@ -0,0 +1,427 @@
+import bisect
+import json
+import logging
+import mmap
+import os
+import pickle
+from datetime import datetime
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# File layout: MAGIC, uint64 header length, JSON header, then 64-byte aligned arrays
+BUNDLE_MAGIC = b'WDBUNDL1'
+BUNDLE_FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# Default location of the bundle read by RecommendationEngine
+DEFAULT_BUNDLE_PATH = 'models/wide_deep_top50k.bundle'
+
+# Versioned bundles live in <versions dir>/<version>/model.bundle
+DEFAULT_VERSIONS_DIR = 'models/versions'
+VERSION_BUNDLE_FILENAME = 'model.bundle'
+
+# Legacy artifacts packed into the bundle: vocabulary name -> encoder pickle
+ENCODER_FILES = {
+    'user_id': 'book_user_encoder_top50k.pkl',
+    'isbn': 'book_item_encoder_top50k.pkl',
+    'author': 'book_author_encoder_top50k.pkl',
+    'publisher': 'book_publisher_encoder_top50k.pkl',
+    'year': 'book_year_encoder_top50k.pkl',
+    'age_bin': 'book_age_bin_encoder_top50k.pkl',
+}
+SCALER_FILE = 'book_item_scaler_top50k.pkl'
+MODEL_PATHS = [
+    'attached_assets/wide_deep_book_model_top50k.keras',
+    'models/wide_deep_book_model_top50k.keras',
+]
+
+class Vocabulary:
+    """
+    Sorted vocabulary mapping a value to its LabelEncoder code.
+
+    Integer vocabularies are a sorted int64 array; string vocabularies are
+    the concatenated UTF-8 bytes of the sorted values plus an offsets array.
+    Both can be views into a memory-mapped bundle, so lookups are binary
+    searches that never copy the vocabulary into Python objects.
+    """
+
+    def __init__(self, values=None, data=None, offsets=None):
+        self.values = values  # int64 array for integer vocabularies
+        self.data = data  # uint8 array for string vocabularies
+        self.offsets = offsets  # int64 array of len(vocabulary) + 1
+        self.kind = 'int' if values is not None else 'str'
+        self._fixed = None  # Fixed-width copy of string values, built by encode_many()
+
+    @classmethod
+    def from_values(cls, values):
+        """Build a vocabulary from LabelEncoder.classes_ (already sorted)."""
+        values = np.asarray(values)
+        if values.dtype.kind in 'iu':
+            return cls(values=np.ascontiguousarray(values, dtype=np.int64))
+
+        encoded = [str(value).encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(data=data, offsets=offsets)
+
+    def __len__(self):
+        if self.kind == 'int':
+            return len(self.values)
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if self.kind == 'int':
+            return int(self.values[index])
+        return self._bytes_at(index).decode('utf-8')
+
+    def _bytes_at(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def encode(self, value, default=0):
+        """
+        Get the code of a value.
+
+        Args:
+            value: Value to look up
+            default: Code returned for values outside the vocabulary
+
+        Returns:
+            Index of the value in the sorted vocabulary
+        """
+        if value is None:
+            return default
+
+        if self.kind == 'int':
+            try:
+                key = int(value)
+            except (TypeError, ValueError):
+                return default
+            index = int(np.searchsorted(self.values, key))
+            if index < len(self.values) and self.values[index] == key:
+                return index
+            return default
+
+        key = str(value).encode('utf-8')
+        index = bisect.bisect_left(_ByteStrings(self), key)
+        if index < len(self) and self._bytes_at(index) == key:
+            return index
+        return default
+
+    def encode_many(self, values, default=0):
+        """
+        Get the codes of many values with one vectorized binary search.
+
+        String vocabularies build (once) a fixed-width bytes copy of their
+        values for numpy's searchsorted, about as compact as the mapped data
+        for fixed-length keys like ISBNs.
+
+        Args:
+            values: Iterable of values to look up
+            default: Code returned for values outside the vocabulary
+
+        Returns:
+            int64 array of codes
+        """
+        values = list(values)
+        if not len(self) or not values:
+            return np.full(len(values), default, dtype=np.int64)
+
+        if self.kind == 'int':
+            parsed = [_as_int(value) for value in values]
+            known = np.array([key is not None for key in parsed])
+            keys = np.array([key if key is not None else 0 for key in parsed], dtype=np.int64)
+            index = np.minimum(np.searchsorted(self.values, keys), len(self.values) - 1)
+            return np.where(known & (self.values[index] == keys), index, default).astype(np.int64)
+
+        if self._fixed is None:
+            self._fixed = np.array([self._bytes_at(index) for index in range(len(self))])
+        width = self._fixed.dtype.itemsize
+        encoded = [str(value).encode('utf-8') if value is not None else b'' for value in values]
+        keys = np.array(encoded, dtype=self._fixed.dtype)  # Longer keys are truncated, checked below
+        index = np.minimum(np.searchsorted(self._fixed, keys), len(self) - 1)
+        fits = np.array([value is not None and len(key) <= width for value, key in zip(values, encoded)])
+        return np.where(fits & (self._fixed[index] == keys), index, default).astype(np.int64)
+
+    def __contains__(self, value):
+        return self.encode(value, default=-1) != -1
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class _ByteStrings:
+    """Sequence view of a string vocabulary's entries as bytes, for bisect."""
+
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def __getitem__(self, index):
+        return self.vocabulary._bytes_at(index)
+
+class ModelBundle:
+    """
+    Read-only view of a model bundle file.
+
+    The file is memory-mapped, so opening it only parses the JSON header and
+    all worker processes share the same page-cache pages for its arrays.
+    """
+
+    def __init__(self, path, header, buffer, file=None):
+        self.path = path
+        self.header = header
+        self._buffer = buffer
+        self._file = file
+        self.vocabularies = {}
+        self.scaler = None
+        self.weights = []
+
+        for name, spec in header['vocabularies'].items():
+            if spec['kind'] == 'int':
+                self.vocabularies[name] = Vocabulary(values=self._array(spec['values']))
+            else:
+                self.vocabularies[name] = Vocabulary(
+                    data=self._array(spec['data']),
+                    offsets=self._array(spec['offsets'])
+                )
+
+        if header.get('scaler'):
+            self.scaler = {
+                'min': self._array(header['scaler']['min']),
+                'scale': self._array(header['scaler']['scale']),
+                'features': header['scaler']['features'],
+            }
+
+        self.weights = [self._array(name) for name in header.get('weights', [])]
+
+    @property
+    def version(self):
+        return self.header.get('model_version')
+
+    @property
+    def model_config(self):
+        """Keras model JSON, or None if the bundle has no network weights."""
+        return self.header.get('model_config')
+
+    @property
+    def metadata(self):
+        return self.header.get('metadata', {})
+
+    def _array(self, name):
+        spec = self.header['arrays'][name]
+        count = int(np.prod(spec['shape'])) if spec['shape'] else 1
+        array = np.frombuffer(self._buffer, dtype=np.dtype(spec['dtype']),
+                              count=count, offset=spec['offset'])
+        return array.reshape(spec['shape'])
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-map a bundle file.
+
+        Raises:
+            ValueError: If the file is not a bundle of a supported format version
+        """
+        file = open(path, 'rb')
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if buffer[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC:
+                raise ValueError(f"{path} is not a model bundle")
+
+            start = len(BUNDLE_MAGIC) + 8
+            header_length = int.from_bytes(buffer[len(BUNDLE_MAGIC):start], 'little')
+            header = json.loads(buffer[start:start + header_length].decode('utf-8'))
+            if header.get('format_version') != BUNDLE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported bundle format version {header.get('format_version')}")
+
+            return cls(path, header, buffer, file)
+        except Exception:
+            file.close()
+            raise
+
+def version_bundle_path(version, versions_dir=DEFAULT_VERSIONS_DIR):
+    """Path of the bundle for a model version."""
+    return os.path.join(versions_dir, version, VERSION_BUNDLE_FILENAME)
+
+def find_latest_version(versions_dir=DEFAULT_VERSIONS_DIR):
+    """
+    Find the newest published model version.
+
+    Versions are directory names that sort chronologically (the default
+    version strings are UTC timestamps). Bundles are written atomically,
+    so a version counts as published once its bundle file exists.
+
+    Returns:
+        (version, bundle path) tuple, or None if no version is published
+    """
+    if not os.path.isdir(versions_dir):
+        return None
+
+    for version in sorted(os.listdir(versions_dir), reverse=True):
+        path = version_bundle_path(version, versions_dir)
+        if os.path.isfile(path):
+            return version, path
+    return None
+
+def write_bundle(path, vocabularies, scaler=None, model_config=None, weights=None,
+                 model_version=None, metadata=None):
+    """
+    Write a model bundle.
+
+    Args:
+        path: Output file path
+        vocabularies: Dict of name -> Vocabulary
+        scaler: Optional dict with 'min', 'scale' arrays and 'features' names
+        model_config: Optional Keras model JSON string
+        weights: Optional list of weight arrays in model.get_weights() order
+        model_version: Version string stored in the header
+        metadata: Optional JSON-serializable dict of extra information
+    """
+    arrays = {}
+    header = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': model_version or datetime.utcnow().strftime('%Y%m%d%H%M%S'),
+        'created_at': datetime.utcnow().isoformat(),
+        'arrays': {},
+        'vocabularies': {},
+        'scaler': None,
+        'model_config': model_config,
+        'weights': [],
+        'metadata': metadata or {},
+    }
+
+    for name, vocabulary in vocabularies.items():
+        if vocabulary.kind == 'int':
+            arrays[f'vocab/{name}/values'] = vocabulary.values
+            header['vocabularies'][name] = {'kind': 'int', 'values': f'vocab/{name}/values'}
+        else:
+            arrays[f'vocab/{name}/data'] = vocabulary.data
+            arrays[f'vocab/{name}/offsets'] = vocabulary.offsets
+            header['vocabularies'][name] = {
+                'kind': 'str',
+                'data': f'vocab/{name}/data',
+                'offsets': f'vocab/{name}/offsets',
+            }
+
+    if scaler is not None:
+        arrays['scaler/min'] = np.asarray(scaler['min'], dtype=np.float64)
+        arrays['scaler/scale'] = np.asarray(scaler['scale'], dtype=np.float64)
+        header['scaler'] = {'min': 'scaler/min', 'scale': 'scaler/scale',
+                            'features': list(scaler['features'])}
+
+    for index, weight in enumerate(weights or []):
+        name = f'weights/{index}'
+        arrays[name] = np.asarray(weight)
+        header['weights'].append(name)
+
+    # Lay out the arrays after the header, each aligned for direct mmap views
+    layout = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        header['arrays'][name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset,  # Relative to the data section
+        }
+        layout.append((name, array))
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    # The header stores absolute offsets, so its own size shifts them; iterate until stable
+    data_start = 0
+    while True:
+        encoded = json.dumps(_with_absolute_offsets(header, data_start)).encode('utf-8')
+        needed = -(-(len(BUNDLE_MAGIC) + 8 + len(encoded)) // ALIGNMENT) * ALIGNMENT
+        if needed == data_start:
+            break
+        data_start = needed
+
+    tmp_path = f'{path}.tmp'
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(len(encoded).to_bytes(8, 'little'))
+        f.write(encoded)
+        f.write(b'\0' * (data_start - f.tell()))
+        for name, array in layout:
+            f.write(array.tobytes())
+            f.write(b'\0' * (-array.nbytes % ALIGNMENT))
+
+    # Atomic replace so running processes never map a half-written file
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote model bundle {path} ({data_start + offset} bytes)")
+
+def _with_absolute_offsets(header, data_start):
+    result = dict(header)
+    result['arrays'] = {
+        name: {'dtype': spec['dtype'], 'shape': spec['shape'], 'offset': data_start + spec['offset']}
+        for name, spec in header['arrays'].items()
+    }
+    return result
+
+def load_legacy_artifact(path):
+    """Load one of the joblib/pickle encoder or scaler files."""
+    try:
+        import joblib
+        return joblib.load(path)
+    except ImportError:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+def build_bundle_from_legacy(output_path=DEFAULT_BUNDLE_PATH, models_dir='models',
+                             model_path=None, model_version=None):
+    """
+    Pack the LabelEncoder/scaler pickles and the Keras model into one bundle.
+
+    Args:
+        output_path: Bundle file to write
+        models_dir: Directory containing the *_top50k.pkl files
+        model_path: Optional .keras file; the usual locations are searched otherwise
+        model_version: Version string stored in the bundle
+
+    Returns:
+        Path of the written bundle
+    """
+    vocabularies = {}
+    for name, filename in ENCODER_FILES.items():
+        encoder = load_legacy_artifact(os.path.join(models_dir, filename))
+        vocabularies[name] = Vocabulary.from_values(encoder.classes_)
+        logger.info(f"Packed vocabulary {name} ({len(vocabularies[name])} values)")
+
+    scaler = None
+    scaler_path = os.path.join(models_dir, SCALER_FILE)
+    if os.path.exists(scaler_path):
+        item_scaler = load_legacy_artifact(scaler_path)
+        scaler = {
+            'min': item_scaler.min_,
+            'scale': item_scaler.scale_,
+            'features': [str(name) for name in getattr(item_scaler, 'feature_names_in_',
+                                                       ['avg_rating', 'num_ratings'])],
+        }
+
+    model_config = None
+    weights = None
+    candidates = [model_path] if model_path else MODEL_PATHS
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            from tensorflow import keras
+            model = keras.models.load_model(candidate)
+            model_config = model.to_json()
+            weights = [np.asarray(weight, dtype=np.float32) for weight in model.get_weights()]
+            logger.info(f"Packed {len(weights)} weight arrays from {candidate}")
+            break
+    else:
+        logger.warning("No Keras model found, bundle will contain encoders and scaler only")
+
+    write_bundle(output_path, vocabularies, scaler=scaler, model_config=model_config,
+                 weights=weights, model_version=model_version,
+                 metadata={'source': 'legacy top50k artifacts'})
+    return output_path
@@ -30,13 +30,22 @@ class Book(db.Model):
     image_url_s = db.Column(db.String(255))  # Small image URL
     image_url_m = db.Column(db.String(255))  # Medium image URL
     image_url_l = db.Column(db.String(255))  # Large image URL
-    avg_rating = db.Column(db.Float, default=0.0)
+    avg_rating = db.Column(db.Float, nullable=False, default=0.0)  # Sort key of the keyset-paginated listing
     num_ratings = db.Column(db.Integer, default=0)
     
     # Relationships
     ratings = db.relationship('Rating', backref='book', lazy='dynamic', cascade='all, delete-orphan')
     library_entries = db.relationship('UserLibrary', backref='book', lazy='dynamic', cascade='all, delete-orphan')
     
+    # Indexes for the popular-books, top-rated listing and similar-books queries
+    __table_args__ = (
+        db.Index('ix_book_avg_rating_num_ratings', 'avg_rating', 'num_ratings', 'isbn'),
+        db.Index('ix_book_avg_rating_id', 'avg_rating', 'id'),
+        db.Index('ix_book_author_avg_rating', 'author', 'avg_rating'),
+        db.Index('ix_book_publisher_avg_rating', 'publisher', 'avg_rating'),
+        db.Index('ix_book_year_avg_rating', 'year_of_publication', 'avg_rating'),
+    )
+    
     def __repr__(self):
         return f'<Book {self.title} ({self.isbn})>'
 
@@ -48,8 +57,17 @@ class Rating(db.Model):
     rating = db.Column(db.Integer, nullable=False)  # Rating value
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Composite unique constraint to ensure a user can only rate a book once
-    __table_args__ = (db.UniqueConstraint('user_id', 'isbn', name='_user_book_rating_uc'),)
+    # Composite unique constraint to ensure a user can only rate a book once,
+    # plus indexes for the profile, book details, collaborative filtering and
+    # recent ratings (catalog refresh, model warm-up) queries
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'isbn', name='_user_book_rating_uc'),
+        db.Index('ix_rating_timestamp', 'timestamp'),
+        db.Index('ix_rating_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_rating_isbn_timestamp', 'isbn', 'timestamp'),
+        db.Index('ix_rating_isbn_rating_user', 'isbn', 'rating', 'user_id'),
+        db.Index('ix_rating_user_rating_isbn', 'user_id', 'rating', 'isbn'),
+    )
     
     def __repr__(self):
         return f'<Rating User:{self.user_id} Book:{self.isbn} Rating:{self.rating}>'
@@ -62,7 +80,32 @@ class UserLibrary(db.Model):
     added_on = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Composite unique constraint to ensure a book can only be in a user's library once
-    __table_args__ = (db.UniqueConstraint('user_id', 'isbn', name='_user_book_library_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'isbn', name='_user_book_library_uc'),
+        db.Index('ix_user_library_user_added_on', 'user_id', 'added_on'),
+    )
     
     def __repr__(self):
         return f'<UserLibrary User:{self.user_id} Book:{self.isbn}>'
+
+class BookFacet(db.Model):
+    """Precomputed filter values with per-value book counts for the browse page."""
+    id = db.Column(db.Integer, primary_key=True)
+    facet = db.Column(db.String(20), nullable=False)  # 'author', 'publisher' or 'year'
+    value = db.Column(db.String(255), nullable=False)
+    book_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Composite unique constraint so every facet value is stored once
+    __table_args__ = (db.UniqueConstraint('facet', 'value', name='_facet_value_uc'),)
+    
+    def __repr__(self):
+        return f'<BookFacet {self.facet}:{self.value} ({self.book_count})>'
+
+class SchemaMigration(db.Model):
+    """Record of a schema migration applied to this database."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    applied_on = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.name}>'
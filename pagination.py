@@ -0,0 +1,200 @@
+import base64
+import json
+import logging
+import math
+from sqlalchemy import func, text, tuple_
+from models import Book, BookFacet
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Sort orders available to keyset pagination: (column, descending) pairs ending
+# with a unique column so every row has a distinct cursor position
+SORT_ORDERS = {
+    'id': [(Book.id, False)],
+    'rating': [(Book.avg_rating, True), (Book.id, True)],
+}
+
+# Browse filters matched as case-insensitive substrings; the others match exactly.
+# Shared by the listing and its facet-based count so both select the same books
+SUBSTRING_FILTERS = {'author', 'publisher'}
+
+def filter_condition(column, facet, value):
+    """Condition matching a column against a browse filter value, the way the listing filters."""
+    if facet in SUBSTRING_FILTERS:
+        return column.ilike(f'%{value}%')
+    return column == value
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that keyset_paginate did not produce for the sort order."""
+
+class KeysetPage:
+    """One page of a keyset (seek) paginated query."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total  # Approximate, None when unknown
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def encode_cursor(values):
+    """Encode sort key values as an opaque URL-safe cursor."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Returns:
+        List of sort key values (numbers and strings), or None if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        return None
+    if not isinstance(values, list) or not all(_is_sort_key(value) for value in values):
+        return None
+    return values
+
+def _is_sort_key(value):
+    """Whether a decoded cursor element can be a sort key value (no nulls, bools or containers)."""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, (int, str))
+
+def _matches_column(value, column):
+    """Whether a sort key value has the Python type of the column it is compared with."""
+    python_type = column.type.python_type
+    if python_type is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, python_type)
+
+def keyset_paginate(query, sort='id', after=None, before=None, per_page=24):
+    """
+    Paginate a Book query by seeking past the last seen (sort_key, id) pair.
+
+    Unlike OFFSET pagination no rows are skipped and no COUNT(*) is issued,
+    so every page costs the same as the first one.
+
+    Args:
+        query: Book query with filters applied
+        sort: Key of SORT_ORDERS
+        after: Cursor of the last row of the previous page
+        before: Cursor of the first row of the next page (for "previous" links)
+        per_page: Number of books per page
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or belongs to another sort order
+    """
+    order = SORT_ORDERS.get(sort, SORT_ORDERS['id'])
+    columns = [column for column, _ in order]
+    descending = order[0][1]
+
+    cursor = None
+    if before or after:
+        cursor = decode_cursor(before or after)
+        if (cursor is None or len(cursor) != len(columns)
+                or not all(_matches_column(value, column) for value, column in zip(cursor, columns))):
+            raise InvalidCursor(f"Invalid cursor for sort order {sort!r}")
+    backwards = before is not None and cursor is not None
+
+    # All columns of a sort order share one direction, so a row-value
+    # comparison expresses "strictly after the cursor" and can use the index
+    if cursor is not None:
+        key = tuple_(*columns) if len(columns) > 1 else columns[0]
+        value = tuple_(*cursor) if len(columns) > 1 else cursor[0]
+        if descending != backwards:
+            query = query.filter(key < value)
+        else:
+            query = query.filter(key > value)
+
+    # Walk the index in reverse to collect the page before the cursor
+    if descending != backwards:
+        query = query.order_by(*[column.desc() for column in columns])
+    else:
+        query = query.order_by(*[column.asc() for column in columns])
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def _cursor_for(book):
+        return encode_cursor([getattr(book, column.key) for column in columns])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = _cursor_for(rows[-1])
+            prev_cursor = _cursor_for(rows[0]) if has_more else None
+        else:
+            next_cursor = _cursor_for(rows[-1]) if has_more else None
+            prev_cursor = _cursor_for(rows[0]) if cursor is not None else None
+
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+def approximate_book_count(db, author='', publisher='', year='', search=''):
+    """
+    Estimate the number of books matching the filters without a COUNT(*) scan.
+
+    Uses the materialized facet counts, or PostgreSQL's table statistics
+    for the unfiltered catalog.
+
+    Args:
+        db: SQLAlchemy database instance
+
+    Returns:
+        Approximate count, or None if no cheap estimate is available
+    """
+    try:
+        if search:
+            return None
+
+        filters = [(facet, value) for facet, value in
+                   (('author', author), ('publisher', publisher), ('year', year)) if value]
+        if len(filters) > 1:
+            return None
+        if filters:
+            # Every book has one value per facet, so the matching values' counts add up
+            facet, value = filters[0]
+            total = db.session.query(func.sum(BookFacet.book_count)).filter(
+                BookFacet.facet == facet,
+                filter_condition(BookFacet.value, facet, value)
+            ).scalar()
+            return int(total) if total is not None else None
+
+        # PostgreSQL keeps a row estimate for every table, refreshed by autovacuum
+        if db.engine.dialect.name == 'postgresql':
+            estimate = db.session.execute(
+                text("SELECT reltuples FROM pg_class WHERE relname = 'book'")
+            ).scalar()
+            if estimate and estimate > 0:
+                return int(estimate)
+
+        # Otherwise sum the year facet; only books without a year are missing from it
+        total = db.session.query(func.sum(BookFacet.book_count)).filter(
+            BookFacet.facet == 'year'
+        ).scalar()
+        return int(total) if total else None
+
+    except Exception as e:
+        logger.error(f"Error estimating book count: {str(e)}")
+        return None
@@ -0,0 +1,128 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where profiles are written, as collapsed stacks (flamegraph.pl, speedscope)
+PROFILES_DIR = os.path.join('instance', 'profiles')
+PROFILE_SUFFIX = '.collapsed'
+
+# Retention limits applied after every written profile
+DEFAULT_MAX_FILES = 100
+DEFAULT_MAX_AGE_DAYS = 7
+
+class SamplingProfiler:
+    """
+    Sample the call stack of one thread from a background thread.
+
+    Every `interval` seconds the sampler reads the target thread's current
+    frame and counts its stack, so the profiled code runs unmodified; the
+    overhead is one short stack walk per sample rather than a hook on every
+    function call like cProfile. Time spent in C code (numpy, TensorFlow,
+    the database driver) is attributed to the Python frame that called it.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = {}
+        self.samples = 0
+        self.started = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Stacks in the collapsed format: one 'root;...;leaf count' line per stack."""
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def write(self, name, directory=PROFILES_DIR, max_files=DEFAULT_MAX_FILES,
+              max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """
+        Write the profile to <directory>/<timestamp>-<name>.collapsed and apply retention.
+
+        Returns:
+            Path of the written file
+        """
+        os.makedirs(directory, exist_ok=True)
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '-', name).strip('-')[:80] or 'profile'
+        path = os.path.join(directory, f"{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}-{safe_name}{PROFILE_SUFFIX}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+
+        logger.info(f"Profile of {name} written to {path} "
+                    f"({self.samples} samples over {self.duration * 1000:.1f} ms)")
+        enforce_retention(directory, max_files=max_files, max_age_days=max_age_days)
+        return path
+
+@contextmanager
+def profiled(name, directory=PROFILES_DIR, interval=0.005, **retention):
+    """Profile the enclosed block on this thread and write it on exit: `with profiled('export'): ...`"""
+    profiler = SamplingProfiler(interval=interval).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        try:
+            profiler.write(name, directory=directory, **retention)
+        except Exception as e:
+            logger.error(f"Error writing profile {name}: {str(e)}")
+
+def enforce_retention(directory=PROFILES_DIR, max_files=DEFAULT_MAX_FILES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+    """
+    Delete profiles older than `max_age_days` and all but the newest `max_files`.
+
+    Returns:
+        Number of deleted files
+    """
+    try:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIX)]
+    except FileNotFoundError:
+        return 0
+
+    paths.sort(key=os.path.getmtime, reverse=True)
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    deleted = 0
+    for index, path in enumerate(paths):
+        if (max_files is not None and index >= max_files) or (cutoff is not None and os.path.getmtime(path) < cutoff):
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError as e:
+                logger.warning(f"Could not delete old profile {path}: {str(e)}")
+    return deleted
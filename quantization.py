@@ -0,0 +1,304 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where drift reports are stored
+RESULTS_DIR = os.path.join('instance', 'quantization')
+
+# Embedding table formats; 'float32' serves the unquantized weights through the same numpy scorer
+QUANTIZATION_MODES = ('float32', 'float16', 'int8')
+
+# Per-row int8 scales cost 4 bytes a row, so narrower tables (the wide part's
+# 1-dim weights) are stored as float16 instead
+MIN_INT8_WIDTH = 8
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh,
+}
+
+class QuantizedTable:
+    """
+    Embedding table stored as int8 with one float32 scale per row, or as float16.
+
+    int8 rows are symmetric: row = values * scale, with the scale chosen so
+    the row's largest magnitude maps to 127.
+    """
+
+    def __init__(self, values, scales=None):
+        self.values = values
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, table, mode):
+        table = np.asarray(table, dtype=np.float32)
+        if mode == 'float32':
+            # Serve the bundle's (memory-mapped) table as is
+            return cls(table)
+        if mode == 'int8' and table.shape[1] >= MIN_INT8_WIDTH:
+            scales = np.abs(table).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            values = np.round(table / scales[:, None]).astype(np.int8)
+            return cls(values, scales.astype(np.float32))
+        return cls(table.astype(np.float16))
+
+    def lookup(self, codes):
+        """float32 rows for an array of codes, shape codes.shape + (width,)."""
+        rows = self.values[codes].astype(np.float32)
+        if self.scales is not None:
+            rows *= self.scales[codes][..., None]
+        return rows
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+class NumpyModel:
+    """
+    Numpy forward pass of a functional Keras model from a bundle.
+
+    Covers the layers of the wide & deep model (Input, Embedding, Flatten,
+    Concatenate, Dense, Add, Activation, Dropout) and serves through the same
+    predict_on_batch() call as the Keras model, without loading TensorFlow.
+    Embedding tables are quantized; dense weights are used straight from the
+    memory-mapped bundle, so every worker shares them through the page cache.
+    """
+
+    def __init__(self, layers, inputs, output, mode):
+        self.layers = layers  # (name, class name, config, inbound layer names, weights) in graph order
+        self.inputs = inputs
+        self.output = output
+        self.mode = mode
+
+    @classmethod
+    def from_bundle(cls, bundle, mode='int8'):
+        """
+        Build the scorer from a bundle's model config and weights.
+
+        Raises:
+            ValueError: If the mode is unknown, the bundle has no network or
+                its weights don't match the shapes of the layer config
+            NotImplementedError: If the model uses an unsupported layer
+        """
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {QUANTIZATION_MODES}")
+        if not bundle.model_config:
+            raise ValueError("Model bundle has no network weights")
+
+        config = bundle.model_config
+        config = json.loads(config) if isinstance(config, str) else config
+        config = config['config']
+
+        # Weights are stored in model.get_weights() order: layer by layer, in config order;
+        # each is checked against its layer so a reordered bundle fails here, not at scoring
+        weights = list(bundle.weights)
+        layers = []
+        for layer in config['layers']:
+            class_name, layer_config = layer['class_name'], layer['config']
+            name = layer['name']
+            if class_name == 'Embedding':
+                table = _pop_weight(weights, name, 'embeddings',
+                                    (layer_config['input_dim'], layer_config['output_dim']))
+                layer_weights = [QuantizedTable.quantize(table, mode)]
+            elif class_name == 'Dense':
+                units = layer_config['units']
+                input_shape = (layer.get('build_config') or {}).get('input_shape')
+                layer_weights = [_pop_weight(weights, name, 'kernel', (input_shape[-1] if input_shape else None, units))]
+                if layer_config.get('use_bias', True):
+                    layer_weights.append(_pop_weight(weights, name, 'bias', (units,)))
+            elif class_name in ('InputLayer', 'Flatten', 'Concatenate', 'Add', 'Activation', 'Dropout'):
+                layer_weights = []
+            else:
+                raise NotImplementedError(f"Layer {class_name} is not supported by the numpy scorer")
+            if layer_config.get('activation', 'linear') not in ACTIVATIONS:
+                raise NotImplementedError(f"Activation {layer_config['activation']} is not supported")
+            layers.append((name, class_name, layer_config, _inbound_layers(layer), layer_weights))
+        if weights:
+            raise ValueError(f"{len(weights)} weight arrays left over after building the numpy scorer")
+
+        inputs = list(_layer_names(config['input_layers']))
+        output = _layer_names(config['output_layers'])[0]
+        return cls(layers, inputs, output, mode)
+
+    def predict_on_batch(self, inputs):
+        """Scores of a batch given as input name -> array, shape (batch, 1) like Keras."""
+        tensors = {}
+        for name, class_name, config, inbound, weights in self.layers:
+            args = [tensors[layer] for layer in inbound]
+            if class_name == 'InputLayer':
+                value = np.asarray(inputs[name])
+                tensors[name] = value.reshape(-1, 1) if value.ndim == 1 else value
+            elif class_name == 'Embedding':
+                tensors[name] = weights[0].lookup(args[0])
+            elif class_name == 'Flatten':
+                tensors[name] = args[0].reshape(len(args[0]), -1)
+            elif class_name == 'Concatenate':
+                tensors[name] = np.concatenate([arg.astype(np.float32) for arg in args],
+                                               axis=config.get('axis', -1))
+            elif class_name == 'Dense':
+                value = args[0].astype(np.float32) @ weights[0]
+                if len(weights) > 1:
+                    value += weights[1]
+                tensors[name] = ACTIVATIONS[config.get('activation', 'linear')](value)
+            elif class_name == 'Add':
+                tensors[name] = sum(args[1:], args[0])
+            elif class_name == 'Activation':
+                tensors[name] = ACTIVATIONS[config['activation']](args[0])
+            else:
+                # Dropout is the identity at inference
+                tensors[name] = args[0]
+        return tensors[self.output]
+
+    def embedding_bytes(self):
+        """Bytes held by the (quantized) embedding tables."""
+        return sum(weights[0].nbytes for _, class_name, _, _, weights in self.layers if class_name == 'Embedding')
+
+def _pop_weight(weights, layer_name, role, shape):
+    """
+    Take the next weight array of a layer, checking its shape.
+
+    Args:
+        weights: Remaining weight arrays, in model.get_weights() order
+        layer_name: Layer the array belongs to, for the error message
+        role: Name of the array in the layer (embeddings, kernel, bias)
+        shape: Shape implied by the layer config; None for a dimension it doesn't give
+
+    Raises:
+        ValueError: If the weights ran out or the array has another shape
+    """
+    if not weights:
+        raise ValueError(f"Bundle weights ran out at the {role} of layer {layer_name}")
+    array = weights.pop(0)
+    if len(array.shape) != len(shape) or any(expected is not None and size != expected
+                                             for size, expected in zip(array.shape, shape)):
+        raise ValueError(f"Bundle weight for the {role} of layer {layer_name} has shape "
+                         f"{tuple(array.shape)}, expected {shape}")
+    return array
+
+def _layer_names(references):
+    """Layer names of Keras input/output references: a dict, a list or a single [name, node, tensor]."""
+    if isinstance(references, dict):
+        references = references.values()
+    elif references and isinstance(references[0], str):
+        references = [references]
+    return [reference[0] for reference in references]
+
+def _inbound_layers(layer):
+    """Names of the layers feeding a layer, from its Keras 3 or Keras 2 inbound_nodes."""
+    nodes = layer.get('inbound_nodes') or []
+    if not nodes:
+        return []
+
+    node = nodes[0]
+    if isinstance(node, dict):
+        # Keras 3: {'args': [tensor or [tensors]], 'kwargs': {}}
+        names = []
+
+        def collect(value):
+            if isinstance(value, dict) and value.get('class_name') == '__keras_tensor__':
+                names.append(value['config']['keras_history'][0])
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    collect(item)
+        collect(node.get('args', []))
+        return names
+
+    # Keras 2: [[layer name, node index, tensor index, kwargs], ...]
+    return [entry[0] for entry in node]
+
+def drift_report(engine, bundle, modes=QUANTIZATION_MODES, users=200, k=10, seed=42):
+    """
+    Compare quantized scores with the full-precision model on real candidates.
+
+    Scores each sampled user's unrated candidate books with the reference
+    and with the numpy scorer in each mode. The reference is the live Keras
+    model, or the float32 numpy scorer when the engine already serves a
+    quantized one; the 'float32' mode measures the numpy scorer's own error.
+
+    Args:
+        engine: RecommendationEngine with a neural model and a candidate index
+        bundle: ModelBundle to quantize, normally the live version's
+        modes: Quantization modes to compare, from QUANTIZATION_MODES
+        users: Number of users to sample from those with ratings
+        k: Cutoff of the top-k agreement
+        seed: Seed of the user sample
+
+    Returns:
+        Report dict with score error, top-k overlap, embedding memory and
+        latency per mode
+    """
+    from app import db
+    from models import User, Rating
+
+    index = engine.get_candidate_index()
+    if engine.model is None or index is None:
+        raise ValueError("The live engine has no neural model or candidate index")
+
+    user_ids = [user_id for (user_id,) in db.session.query(Rating.user_id).distinct()]
+    rng = np.random.default_rng(seed)
+    if len(user_ids) > users:
+        user_ids = sorted(rng.choice(user_ids, size=users, replace=False).tolist())
+    ages = dict(db.session.query(User.id, User.age).filter(User.id.in_(user_ids)))
+    rated = {user_id: set() for user_id in user_ids}
+    for user_id, isbn in db.session.query(Rating.user_id, Rating.isbn).filter(Rating.user_id.in_(user_ids)):
+        rated[user_id].add(isbn)
+
+    # Batches of (user, candidate inputs) scored by every model alike
+    batches = []
+    for user_id in user_ids:
+        positions = index.unrated_positions(rated[user_id])
+        if not len(positions):
+            continue
+        columns = index.feature_columns([(positions, engine._encode_user_id(user_id),
+                                          engine._encode_age_bin(ages.get(user_id) or 0))])
+        batches.append(engine._build_inputs(columns, 0, len(positions), len(positions)))
+
+    def score_all(model):
+        start = time.perf_counter()
+        scores = [np.asarray(model.predict_on_batch(inputs)).reshape(-1) for inputs in batches]
+        return scores, time.perf_counter() - start
+
+    reference_model = engine.model
+    if isinstance(reference_model, NumpyModel):
+        reference_model = NumpyModel.from_bundle(bundle, 'float32')
+    reference, reference_seconds = score_all(reference_model)
+    pairs = sum(len(scores) for scores in reference)
+    report = {
+        'created': datetime.utcnow().isoformat(),
+        'model_version': bundle.version,
+        'users': len(batches),
+        'pairs': pairs,
+        'k': k,
+        'reference': {
+            'model': type(reference_model).__name__,
+            'ms_per_1000_pairs': round(reference_seconds * 1000 / pairs * 1000, 3) if pairs else None,
+        },
+        'modes': {},
+    }
+
+    for mode in modes:
+        model = NumpyModel.from_bundle(bundle, mode)
+        scores, seconds = score_all(model)
+        errors = np.concatenate([np.abs(a - b) for a, b in zip(reference, scores)]) if scores else np.zeros(1)
+        overlaps = []
+        for expected, actual in zip(reference, scores):
+            top = min(k, len(expected))
+            overlaps.append(len(set(np.argsort(-expected)[:top]) & set(np.argsort(-actual)[:top])) / top)
+        report['modes'][mode] = {
+            'mean_abs_error': float(errors.mean()),
+            'max_abs_error': float(errors.max()),
+            f'top{k}_overlap': float(np.mean(overlaps)) if overlaps else None,
+            'embedding_mb': round(model.embedding_bytes() / 2**20, 3),
+            'ms_per_1000_pairs': round(seconds * 1000 / pairs * 1000, 3) if pairs else None,
+        }
+        logger.info(f"Quantization {mode}: {report['modes'][mode]}")
+
+    return report
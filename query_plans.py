@@ -0,0 +1,198 @@
+import logging
+import re
+from sqlalchemy import event, func
+from models import User, Book, Rating
+from catalog import book_catalog
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# SQLite reports a table scan without an index as "SCAN <table>"
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+SQLITE_TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+# Leading-wildcard ILIKE searches can't use a b-tree index, so they are exempt
+EXEMPT_PATHS = ('/books?search=',)
+
+class QueryPlan:
+    """EXPLAIN result for one captured statement."""
+
+    def __init__(self, source, statement, plan, problems):
+        self.source = source
+        self.statement = statement
+        self.plan = plan
+        self.problems = problems
+
+    @property
+    def ok(self):
+        return not self.problems
+
+def capture_hot_queries(app, db, engine=None):
+    """
+    Run the hot read paths and record every SELECT they issue.
+
+    Exercises the routes in app.py through the test client and the
+    collaborative filtering / popularity / metadata paths of the
+    recommendation engine, so the checked queries are the ones the code
+    actually sends.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+        engine: Optional RecommendationEngine; its fallback paths are exercised
+
+    Returns:
+        List of (source, statement, parameters) tuples, one per distinct statement
+    """
+    captured = []
+    seen = set()
+    current = {'source': None}
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return
+        if statement in seen:
+            return
+        seen.add(statement)
+        captured.append((current['source'], statement, parameters))
+
+    with app.app_context():
+        book = db.session.query(Book).order_by(Book.num_ratings.desc()).first()
+        user_id = db.session.query(Rating.user_id).group_by(Rating.user_id).order_by(
+            func.count(Rating.id).desc()
+        ).limit(1).scalar()
+        if user_id is None:
+            user_id = db.session.query(User.id).limit(1).scalar()
+
+    event.listen(db.engine, 'before_cursor_execute', _record)
+    try:
+        client = app.test_client()
+        if user_id is not None:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+                sess['_fresh'] = True
+
+        paths = ['/fragments/popular', '/fragments/recent', '/fragments/recommended',
+                 '/books', '/books?sort=rating', '/books?search=a', '/profile']
+        if book is not None:
+            paths.append(f'/book/{book.isbn}')
+
+        for path in paths:
+            current['source'] = path
+            response = client.get(path)
+
+            # Follow the first "next" link and the infinite scroll fragment
+            # to capture the keyset seek queries
+            if path.startswith('/books') and 'search' not in path:
+                html = response.get_data(as_text=True)
+                for pattern in (r'href="(/books\?after=[^"]+)"', r'data-next-url="([^"]+)"'):
+                    match = re.search(pattern, html)
+                    if match:
+                        client.get(match.group(1).replace('&amp;', '&'))
+
+        if engine is not None and user_id is not None:
+            with app.app_context():
+                current['source'] = 'RecommendationEngine._get_recommendations_fallback'
+                engine._get_recommendations_fallback(user_id)
+                current['source'] = 'RecommendationEngine._get_popular_books'
+                engine._get_popular_books()
+                if book is not None:
+                    current['source'] = 'RecommendationEngine._get_similar_books_fallback'
+                    engine._get_similar_books_fallback(book)
+
+        if book_catalog.loaded:
+            with app.app_context():
+                current['source'] = 'BookCatalog.refresh'
+                book_catalog.refresh(db)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _record)
+
+    return captured
+
+def explain(db, statement, parameters):
+    """
+    Get the query plan of a statement as a list of text lines.
+
+    Args:
+        db: SQLAlchemy database instance
+        statement: SQL string as sent to the driver
+        parameters: Driver-level bind parameters for the statement
+
+    Returns:
+        List of plan lines
+    """
+    with db.engine.connect() as conn:
+        if conn.dialect.name == 'sqlite':
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            return [row[-1] for row in rows]
+
+        # Small tables make the planner prefer sequential scans; disable
+        # them so a Seq Scan in the plan means no usable index exists
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).fetchall()
+        conn.rollback()
+        return [row[0] for row in rows]
+
+def find_plan_problems(dialect, statement, plan):
+    """
+    Find full table scans and unindexed sorts in a query plan.
+
+    A SQLite scan in index or primary key order that is cut short by a
+    LIMIT (no temporary sort) is not reported, nor is sorting the output
+    of a GROUP BY, which is already reduced to one row per group.
+
+    Returns:
+        List of problem descriptions, empty if the plan is acceptable
+    """
+    problems = []
+
+    if dialect == 'sqlite':
+        grouped = any('FOR GROUP BY' in line for line in plan)
+        sorts = any(SQLITE_TEMP_SORT in line for line in plan) and not grouped
+        limited = ' LIMIT ' in statement.upper()
+        for line in plan:
+            match = SQLITE_FULL_SCAN.match(line.strip())
+            if match and (sorts or not limited):
+                problems.append(f"full scan of {match.group(1)}")
+        if sorts and limited:
+            problems.append("sort without index before LIMIT")
+    else:
+        for line in plan:
+            match = POSTGRES_FULL_SCAN.search(line)
+            if match:
+                problems.append(f"full scan of {match.group(1)}")
+
+    return problems
+
+def check_query_plans(app, db, engine=None):
+    """
+    EXPLAIN every hot query and report the ones that degrade to full scans.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+        engine: Optional RecommendationEngine to include its fallback queries
+
+    Returns:
+        List of QueryPlan results
+    """
+    results = []
+    captured = capture_hot_queries(app, db, engine)
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        for source, statement, parameters in captured:
+            try:
+                plan = explain(db, statement, parameters)
+            except Exception as e:
+                logger.error(f"Error explaining query from {source}: {str(e)}")
+                results.append(QueryPlan(source, statement, [], [f"EXPLAIN failed: {str(e)}"]))
+                continue
+
+            problems = []
+            if not (source or '').startswith(EXEMPT_PATHS):
+                problems = find_plan_problems(dialect, statement, plan)
+            results.append(QueryPlan(source, statement, plan, problems))
+
+    return results
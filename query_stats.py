@@ -0,0 +1,120 @@
+import logging
+import re
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged; set from SLOW_QUERY_MS by app.py
+slow_query_seconds = 0.1
+
+# Query statistics of the request running on each thread
+_local = threading.local()
+
+class QueryBudgetExceeded(RuntimeError):
+    """A request ran more SQL statements than its route's query budget."""
+
+class QueryStats:
+    """Number of statements and total database time of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def server_timing(self):
+        """Server-Timing entry for the database time, in milliseconds."""
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+def configure_slow_query_log(threshold_ms):
+    global slow_query_seconds
+    slow_query_seconds = threshold_ms / 1000 if threshold_ms else None
+
+def start_collecting():
+    """Count the statements run on this thread until stop_collecting()."""
+    _local.stats = QueryStats()
+    return _local.stats
+
+def stop_collecting():
+    stats = getattr(_local, 'stats', None)
+    _local.stats = None
+    return stats
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+def _type_runs(values):
+    """Collapse runs of equal types: (str, str, str, int) -> 'str x3, int'."""
+    runs = []
+    for value in values:
+        name = type(value).__name__
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return ', '.join(name if count == 1 else f"{name} x{count}" for name, count in runs)
+
+def parameter_shape(parameters, executemany=False):
+    """
+    Describe bind parameters by type and count, without their values.
+
+    Logs stay free of user data, and statements that only differ in the
+    size of an IN list are easy to spot.
+    """
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} rows of ({parameter_shape(rows[0])})" if rows else "0 rows"
+    if isinstance(parameters, dict):
+        return ', '.join(f"{key}: {type(value).__name__}" for key, value in parameters.items())
+    return _type_runs(parameters or ())
+
+def _one_line(statement, limit=500):
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+
+    if slow_query_seconds is not None and elapsed >= slow_query_seconds:
+        logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {_one_line(statement)} "
+                       f"[parameters: {parameter_shape(parameters, executemany)}]")
+
+def check_query_budget(endpoint, stats, budgets, default_budget=None, strict=False):
+    """
+    Compare a request's statement count with its route's budget.
+
+    Args:
+        endpoint: Flask endpoint name of the request
+        stats: QueryStats of the request
+        budgets: Dict of endpoint -> maximum number of statements
+        default_budget: Budget of endpoints missing from `budgets`, None for no limit
+        strict: Raise QueryBudgetExceeded instead of logging a warning (tests)
+
+    Returns:
+        True if the request stayed within its budget
+    """
+    budget = budgets.get(endpoint, default_budget)
+    if budget is None or stats.count <= budget:
+        return True
+
+    message = f"{endpoint} ran {stats.count} queries, over its budget of {budget}"
+    if strict:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+    return False
@@ -1,8 +1,15 @@
 import os
-import pickle
 import logging
+import functools
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 from sqlalchemy import func
+from sqlalchemy.orm import aliased
 from models import User, Book, Rating
+from metrics import observe_stage, record_cache_lookup, record_degraded, record_fallback
+from catalog import get_catalog
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -42,60 +49,233 @@ def _try_import_libraries():
         logger.error(f"Error importing libraries: {str(e)}")
         return False
 
+def _try_import_numpy():
+    """Import numpy alone, for serving a bundle through the numpy scorer without TensorFlow."""
+    global np
+    try:
+        import numpy
+        np = numpy
+        return True
+    except ImportError as e:
+        logger.warning(f"Could not import numpy: {str(e)}")
+        return False
+
+# Model input name -> feature name produced by the _encode_* / _get_book_features helpers
+MODEL_INPUTS = [
+    ('user_id_encoded', 'user_id'),
+    ('isbn_encoded', 'isbn'),
+    ('author_encoded', 'author'),
+    ('publisher_encoded', 'publisher'),
+    ('year_encoded', 'year'),
+    ('age_binned_encoded', 'age_bin'),
+    ('avg_rating_scaled', 'avg_rating_scaled'),
+    ('num_ratings_scaled', 'num_ratings_scaled'),
+]
+
+# Width of the (unused) title embedding input of the deep part
+TITLE_EMBEDDING_DIM = 50
+
+# Batch shapes the model is called with; batches are padded up to one of these
+# so serving only ever sees the shapes traced during warm-up
+DEFAULT_PREDICT_BATCH_SIZES = (1, 32, 256, 1024)
+
+# Share of a latency budget spent waiting for the model before trying collaborative filtering
+MODEL_BUDGET_SHARE = 0.7
+
+# Threads running the model and collaborative filtering for budgeted requests; a
+# model scoring that misses its deadline finishes here and fills the user cache
+COMPLETION_WORKERS = 4
+
+# Tasks queued or running in the completion pool; past this, budgeted requests
+# submit nothing more and answer from a cheaper tier at once
+COMPLETION_BACKLOG = 2 * COMPLETION_WORKERS
+
+def get_popular_books(limit=24):
+    """
+    Get popular books based on ratings.
+    
+    Needs only the database, so it also serves requests while the
+    recommendation engine is still loading.
+    
+    Args:
+        limit: Number of books to return
+        
+    Returns:
+        List of book ISBNs
+    """
+    from app import db
+    
+    try:
+        # Get books with highest average rating and at least 5 ratings
+        popular_books = db.session.query(Book.isbn).filter(
+            Book.num_ratings >= 5
+        ).order_by(
+            Book.avg_rating.desc()
+        ).limit(limit).all()
+        
+        return [book.isbn for book in popular_books]
+    
+    except Exception as e:
+        logger.error(f"Error getting popular books: {str(e)}")
+        # As a last resort, get random books
+        return [book.isbn for book in db.session.query(Book.isbn).limit(limit).all()]
+
+def _result_by(future, deadline, cancel=False):
+    """
+    Result of a future if it is ready by a time.perf_counter() deadline, else None.
+    
+    With cancel, a future that misses the deadline is cancelled, which drops
+    it if it is still queued; one already running finishes in the background.
+    Futures other requests may be waiting on must not be cancelled.
+    """
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=max(deadline - time.perf_counter(), 0))
+    except FutureTimeoutError:
+        if cancel:
+            future.cancel()
+        return None
+    except CancelledError:
+        return None
+    except Exception as e:
+        logger.error(f"Error in budgeted recommendation tier: {str(e)}")
+        return None
+
+class ModelState:
+    """
+    One loaded model version: network, vocabularies, scaler and the caches
+    computed with them. Swapped as a whole when a new version is loaded.
+    """
+    
+    def __init__(self, source=None):
+        self.source = source  # Bundle path or 'legacy'
+        self.version = None
+        self.model = None
+        self.quantization = None  # Embedding format of a numpy scorer, None for Keras
+        self.bundle = None
+        self.user_id_encoder = None
+        self.isbn_encoder = None
+        self.author_encoder = None
+        self.publisher_encoder = None
+        self.year_encoder = None
+        self.age_bin_encoder = None
+        self.item_scaler = None
+        
+        # Initialize cache for faster recommendations: user ID -> (top_n, scored pairs)
+        self.user_cache = {}
+        self.book_cache = {}
+        self.similar_books_cache = {}
+        
+        # (user ID, top_n) -> future of a model scoring in the completion pool,
+        # shared by requests for the same user while it runs
+        self.pending_recommendations = {}
+        self.pending_lock = threading.Lock()
+        
+        # In-vocabulary books, built on first use by RecommendationEngine.get_candidate_index()
+        self.candidate_index = None
+        self.candidate_lock = threading.Lock()
+        
+        # Load timings, exposed through RecommendationEngine.status()
+        self.loaded_at = None
+        self.load_ms = None
+        self.warm_ms = None
+        self.warmup = None  # Batch size -> milliseconds of the first predict call
+
+def _model_state_attribute(name):
+    """Engine property reading an attribute of the request's model state."""
+    def getter(self):
+        return getattr(self._active_state(), name)
+    return property(getter)
+
+def _uses_model_state(method):
+    """Pin the current model state for the duration of a public engine call."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(self._local, 'state', None) is not None:
+            # Nested call or warm-up: already pinned to a state
+            return method(self, *args, **kwargs)
+        
+        self._local.state = self._state
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._local.state = None
+    return wrapper
+
+def _parse_batch_sizes(value):
+    """Parse a comma-separated list of batch sizes, e.g. '1,32,256'."""
+    if not value:
+        return DEFAULT_PREDICT_BATCH_SIZES
+    try:
+        sizes = sorted({int(size) for size in value.split(',') if size.strip()})
+        return tuple(size for size in sizes if size > 0) or DEFAULT_PREDICT_BATCH_SIZES
+    except ValueError:
+        logger.error(f"Invalid batch sizes '{value}', using {DEFAULT_PREDICT_BATCH_SIZES}")
+        return DEFAULT_PREDICT_BATCH_SIZES
+
 class RecommendationEngine:
     """
     Handles book recommendations using the pre-trained wide & deep model.
-    Loads encoders from .pkl files and model from .keras file.
+    Loads encoders, scaler and weights from a memory-mapped model bundle,
+    falling back to the legacy .pkl files and .keras model.
+    
+    New versions published under the versions directory are loaded in the
+    background, warmed and swapped in atomically; calls already running
+    finish on the version they started with.
     """
     
-    def __init__(self):
-        """Initialize the recommendation engine by loading models and encoders."""
+    # Attributes of the active ModelState, read through the pinned state
+    model = _model_state_attribute('model')
+    bundle = _model_state_attribute('bundle')
+    user_id_encoder = _model_state_attribute('user_id_encoder')
+    isbn_encoder = _model_state_attribute('isbn_encoder')
+    author_encoder = _model_state_attribute('author_encoder')
+    publisher_encoder = _model_state_attribute('publisher_encoder')
+    year_encoder = _model_state_attribute('year_encoder')
+    age_bin_encoder = _model_state_attribute('age_bin_encoder')
+    item_scaler = _model_state_attribute('item_scaler')
+    user_cache = _model_state_attribute('user_cache')
+    book_cache = _model_state_attribute('book_cache')
+    similar_books_cache = _model_state_attribute('similar_books_cache')
+    
+    def __init__(self, bundle_path=None, versions_dir=None):
+        """
+        Initialize the recommendation engine by loading models and encoders.
+        
+        Args:
+            bundle_path: Model bundle to load; defaults to the latest version in
+                versions_dir, then MODEL_BUNDLE_PATH or models/wide_deep_top50k.bundle
+            versions_dir: Directory of versioned bundles to load and watch;
+                defaults to MODEL_VERSIONS_DIR or models/versions
+        """
+        from model_bundle import DEFAULT_BUNDLE_PATH, DEFAULT_VERSIONS_DIR, find_latest_version
+        
         try:
-            # Initialize default values for all attributes
-            self.model = None
-            self.user_id_encoder = None
-            self.isbn_encoder = None
-            self.author_encoder = None
-            self.publisher_encoder = None
-            self.year_encoder = None
-            self.age_bin_encoder = None
-            self.item_scaler = None
-            
-            # Initialize cache for faster recommendations
-            self.user_cache = {}
-            self.book_cache = {}
-            self.similar_books_cache = {}
-            
-            # Try to import TensorFlow and dependencies
-            if not _try_import_libraries():
-                logger.warning("Required libraries not available, using fallback recommendations only")
-                return
-            
-            # Create models directory if it doesn't exist
-            os.makedirs('models', exist_ok=True)
+            self._local = threading.local()
+            self._reload_lock = threading.Lock()
+            self._stop_watching = threading.Event()
+            self._watcher = None
+            self._failed_versions = set()
+            self.previous_version = None
+            self.last_reload_error = None
+            self.versions_dir = versions_dir or os.environ.get('MODEL_VERSIONS_DIR', DEFAULT_VERSIONS_DIR)
+            self.batch_sizes = _parse_batch_sizes(os.environ.get('PREDICT_BATCH_SIZES'))
+            # Serve bundles through the numpy scorer with int8 or float16 embedding tables
+            self.quantization = os.environ.get('MODEL_QUANTIZATION') or None
+            # Threads start on first use, so a preloaded master forks without any
+            self._completions = ThreadPoolExecutor(max_workers=COMPLETION_WORKERS,
+                                                   thread_name_prefix='recommendation-completion')
+            self._completion_slots = threading.BoundedSemaphore(COMPLETION_BACKLOG)
             
-            # Try to load the model from attached_assets
-            try:
-                model_path = 'attached_assets/wide_deep_book_model_top50k.keras'
-                if os.path.exists(model_path):
-                    self.model = keras.models.load_model(model_path)
-                    logger.info("Keras model loaded successfully from attached_assets")
+            if bundle_path is None:
+                latest = find_latest_version(self.versions_dir)
+                if latest is not None:
+                    bundle_path = latest[1]
                 else:
-                    logger.warning(f"Model file not found at {model_path}, checking alternative location")
-                    alt_path = 'models/wide_deep_book_model_top50k.keras'
-                    if os.path.exists(alt_path):
-                        self.model = keras.models.load_model(alt_path)
-                        logger.info("Keras model loaded successfully from models directory")
-                    else:
-                        logger.error("Model file not found in any location")
-            except Exception as e:
-                logger.error(f"Error loading Keras model: {str(e)}")
-                logger.warning("Operating in fallback mode without neural model")
+                    bundle_path = os.environ.get('MODEL_BUNDLE_PATH', DEFAULT_BUNDLE_PATH)
             
-            # Build cache for faster recommendations
-            self.user_cache = {}
-            self.book_cache = {}
-            self.similar_books_cache = {}
+            self._state = self._load_state(bundle_path)
             
             logger.info("Recommendation engine initialized successfully")
         
@@ -103,143 +283,707 @@ class RecommendationEngine:
             logger.error(f"Error initializing recommendation engine: {str(e)}")
             raise
     
+    def _active_state(self):
+        """Model state pinned by the current call, or the live one."""
+        state = getattr(self._local, 'state', None)
+        return state if state is not None else self._state
+    
+    @contextmanager
+    def _using_state(self, state):
+        """Run engine calls in this thread against a specific model state."""
+        previous = getattr(self._local, 'state', None)
+        self._local.state = state
+        try:
+            yield state
+        finally:
+            self._local.state = previous
+    
+    @property
+    def version(self):
+        return self._active_state().version
+    
+    def _load_state(self, bundle_path):
+        """Load a model version into a new ModelState without touching the live one."""
+        start = time.perf_counter()
+        state = ModelState(source=bundle_path)
+        
+        # Vocabularies and scaler only need numpy, so load them first
+        if os.path.exists(bundle_path):
+            self._load_bundle(state, bundle_path)
+        
+        # Quantized serving only needs numpy; TensorFlow is not imported at all
+        if state.bundle is not None and self.quantization and _try_import_numpy() and \
+                self._load_numpy_model(state):
+            pass
+        # Try to import TensorFlow and dependencies
+        elif not _try_import_libraries():
+            logger.warning("Required libraries not available, using fallback recommendations only")
+        else:
+            # Create models directory if it doesn't exist
+            os.makedirs('models', exist_ok=True)
+            
+            if state.bundle is not None:
+                self._load_bundle_model(state)
+            else:
+                logger.warning(f"Model bundle not found at {bundle_path}, loading legacy artifacts "
+                               "(run 'flask build-model-bundle' to speed up startup)")
+                state.source = 'legacy'
+                self._load_legacy_artifacts(state)
+        
+        state.loaded_at = time.time()
+        state.load_ms = round((time.perf_counter() - start) * 1000, 1)
+        return state
+    
+    def _load_bundle(self, state, path):
+        """Memory-map the model bundle and take vocabularies and scaler from it."""
+        from model_bundle import ModelBundle
+        
+        try:
+            state.bundle = ModelBundle.open(path)
+            state.version = state.bundle.version
+            vocabularies = state.bundle.vocabularies
+            state.user_id_encoder = vocabularies.get('user_id')
+            state.isbn_encoder = vocabularies.get('isbn')
+            state.author_encoder = vocabularies.get('author')
+            state.publisher_encoder = vocabularies.get('publisher')
+            state.year_encoder = vocabularies.get('year')
+            state.age_bin_encoder = vocabularies.get('age_bin')
+            state.item_scaler = state.bundle.scaler
+            logger.info(f"Model bundle {state.version} mapped from {path}")
+        except Exception as e:
+            logger.error(f"Error loading model bundle {path}: {str(e)}")
+            state.bundle = None
+    
+    def _load_bundle_model(self, state):
+        """Rebuild the Keras model from the bundle's config and weights."""
+        if not state.bundle.model_config:
+            logger.warning("Model bundle has no network weights, operating in fallback mode")
+            return
+        
+        try:
+            state.model = keras.models.model_from_json(state.bundle.model_config)
+            state.model.set_weights(state.bundle.weights)
+            logger.info("Keras model restored from model bundle")
+        except Exception as e:
+            logger.error(f"Error restoring Keras model from bundle: {str(e)}")
+            logger.warning("Operating in fallback mode without neural model")
+            state.model = None
+    
+    def _load_numpy_model(self, state):
+        """Build the numpy scorer with quantized embeddings; False to fall back to Keras."""
+        from quantization import NumpyModel
+        
+        if not state.bundle.model_config:
+            logger.warning("Model bundle has no network weights, operating in fallback mode")
+            return True
+        
+        try:
+            state.model = NumpyModel.from_bundle(state.bundle, self.quantization)
+            state.quantization = self.quantization
+            logger.info(f"Model served by the numpy scorer with {self.quantization} embeddings "
+                        f"({state.model.embedding_bytes() / 2**20:.1f} MB)")
+            return True
+        except Exception as e:
+            logger.error(f"Error building the {self.quantization} numpy scorer, using Keras: {str(e)}")
+            return False
+    
+    def _load_legacy_artifacts(self, state):
+        """Load the separate encoder/scaler pickles and the .keras model."""
+        from model_bundle import ENCODER_FILES, SCALER_FILE, MODEL_PATHS, Vocabulary
+        
+        encoders = {}
+        for name, filename in ENCODER_FILES.items():
+            encoder = self._load_encoder(os.path.join('models', filename))
+            encoders[name] = Vocabulary.from_values(encoder.classes_) if encoder is not None else None
+        state.user_id_encoder = encoders['user_id']
+        state.isbn_encoder = encoders['isbn']
+        state.author_encoder = encoders['author']
+        state.publisher_encoder = encoders['publisher']
+        state.year_encoder = encoders['year']
+        state.age_bin_encoder = encoders['age_bin']
+        
+        scaler = self._load_encoder(os.path.join('models', SCALER_FILE))
+        if scaler is not None:
+            state.item_scaler = {'min': scaler.min_, 'scale': scaler.scale_}
+        
+        # Try to load the model from attached_assets, then the models directory
+        try:
+            for model_path in MODEL_PATHS:
+                if os.path.exists(model_path):
+                    state.model = keras.models.load_model(model_path)
+                    state.version = 'legacy'
+                    logger.info(f"Keras model loaded successfully from {model_path}")
+                    break
+                logger.warning(f"Model file not found at {model_path}, checking alternative location")
+            else:
+                logger.error("Model file not found in any location")
+        except Exception as e:
+            logger.error(f"Error loading Keras model: {str(e)}")
+            logger.warning("Operating in fallback mode without neural model")
+    
     def _load_encoder(self, path):
         """Load an encoder from pickle file."""
+        from model_bundle import load_legacy_artifact
+        
         try:
-            with open(path, 'rb') as f:
-                return pickle.load(f)
+            return load_legacy_artifact(path)
         except Exception as e:
             logger.error(f"Error loading encoder {path}: {str(e)}")
             # Return empty encoder as fallback
             return None
     
-    def get_recommendations_for_user(self, user_id, top_n=24):
+    def reload(self, bundle_path, app=None):
+        """
+        Load a model version in this thread, warm it and swap it in.
+        
+        Args:
+            bundle_path: Bundle of the version to load
+            app: Flask app, needed to warm the new version with recent users
+            
+        Returns:
+            True if the new version is now live
+        """
+        with self._reload_lock:
+            try:
+                state = self._load_state(bundle_path)
+                if state.bundle is None:
+                    raise ValueError(f"could not open {bundle_path}")
+                
+                if app is not None:
+                    with app.app_context():
+                        self._warm_state(state)
+                
+                # Single reference assignment: new calls see the new version,
+                # calls in flight keep the state they pinned
+                self.previous_version = self._state.version
+                self._state = state
+                self.last_reload_error = None
+                logger.info(f"Model version {state.version} is live "
+                            f"(loaded in {state.load_ms} ms, warmed in {state.warm_ms} ms)")
+                return True
+            
+            except Exception as e:
+                self.last_reload_error = str(e)
+                logger.error(f"Error reloading model from {bundle_path}: {str(e)}")
+                return False
+    
+    def _warm_state(self, state, user_count=None):
+        """Fill a new version's caches with recommendations for recently active users."""
+        from app import db
+        
+        start = time.perf_counter()
+        self.warm_up(state=state)
+        if state.model is not None:
+            user_count = user_count or int(os.environ.get('MODEL_WARM_USERS', 10))
+            recent = db.session.query(Rating.user_id).order_by(
+                Rating.timestamp.desc()
+            ).limit(user_count * 10).all()
+            user_ids = list(dict.fromkeys(user_id for (user_id,) in recent))[:user_count]
+            
+            with self._using_state(state):
+                for user_id in user_ids:
+                    self.get_recommendations_for_user(user_id)
+        
+        state.warm_ms = round((time.perf_counter() - start) * 1000, 1)
+    
+    def reload_if_changed(self, app=None):
+        """Load the latest published version if it differs from the live one."""
+        from model_bundle import find_latest_version
+        
+        latest = find_latest_version(self.versions_dir)
+        if latest is None:
+            return False
+        
+        version, bundle_path = latest
+        if bundle_path == self._state.source or version in self._failed_versions:
+            return False
+        
+        logger.info(f"New model version {version} found, loading in the background")
+        if not self.reload(bundle_path, app):
+            # Don't retry a broken version on every poll
+            self._failed_versions.add(version)
+            return False
+        return True
+    
+    def start_watching(self, app, interval=30):
+        """Poll the versions directory and hot-reload new versions in a daemon thread."""
+        if self._watcher is not None or interval <= 0:
+            return
+        
+        def _watch():
+            while not self._stop_watching.wait(interval):
+                try:
+                    self.reload_if_changed(app)
+                except Exception as e:
+                    logger.error(f"Error checking for new model versions: {str(e)}")
+        
+        self._watcher = threading.Thread(target=_watch, name='model-watcher', daemon=True)
+        self._watcher.start()
+        logger.info(f"Watching {self.versions_dir} for new model versions every {interval}s")
+    
+    def stop_watching(self):
+        self._stop_watching.set()
+    
+    def status(self):
+        """Version and load timings of the live model, for the health endpoints."""
+        state = self._state
+        return {
+            'version': state.version,
+            'source': state.source,
+            'neural_model': state.model is not None,
+            'quantization': state.quantization,
+            'loaded_at': state.loaded_at,
+            'load_ms': state.load_ms,
+            'warm_ms': state.warm_ms,
+            'warmup_ms': state.warmup,
+            'candidates': len(state.candidate_index) if state.candidate_index is not None else None,
+            'previous_version': self.previous_version,
+            'last_reload_error': self.last_reload_error,
+        }
+    
+    @_uses_model_state
+    def get_recommendations_for_user(self, user_id, top_n=24, profile=False, budget_ms=None):
         """
         Get book recommendations for a user.
         
         Args:
             user_id: User ID
             top_n: Number of recommendations to return
+            profile: Write a sampling profile of this call to instance/profiles
+            budget_ms: Latency budget in milliseconds (see recommend_within_budget);
+                None waits for the model however long it takes
             
         Returns:
             List of recommended book ISBNs
         """
+        if profile:
+            from profiler import profiled
+            with profiled(f"recommendations-user-{user_id}"):
+                return self.get_recommendations_for_user(user_id, top_n, budget_ms=budget_ms)
+        
+        if budget_ms is not None:
+            return self.recommend_within_budget(user_id, budget_ms, top_n)[0]
+        
+        # Cached recommendations are served by get_scored_recommendations
+        scored = self.get_scored_recommendations([user_id], top_n)
+        return [isbn for isbn, _ in scored[user_id]]
+    
+    @_uses_model_state
+    def recommend_within_budget(self, user_id, budget_ms, top_n=24):
+        """
+        Best recommendations available for a user within a latency budget.
+        
+        Tries the tiers in order: the user cache, the model, collaborative
+        filtering, then popular books. The model gets MODEL_BUDGET_SHARE of
+        the budget and collaborative filtering the rest, both in the
+        completion pool; popular books answer once the budget is spent. A
+        model scoring that misses the deadline is shared with concurrent
+        requests for the same user, so it is never cancelled: it finishes in
+        the pool and fills the user cache for the user's next request. A
+        collaborative filtering call still queued at the deadline is
+        cancelled. With COMPLETION_BACKLOG tasks queued or running, a tier is
+        skipped rather than submitted.
+        Must be called in an app context.
+        
+        Args:
+            user_id: User ID
+            budget_ms: Milliseconds to wait for the model and collaborative filtering
+            top_n: Number of recommendations to return
+            
+        Returns:
+            Tuple (list of ISBNs, tier that answered: 'cache', 'model',
+            'collaborative_filtering' or 'popular', whether a lower tier
+            answered because the budget ran out)
+        """
+        from flask import current_app
+        
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000
+        
+        cached = self._cached_recommendations(user_id, top_n)
+        if cached is not None:
+            return [isbn for isbn, _ in cached], 'cache', False
+        
+        app = current_app._get_current_object()
+        # Without a model, collaborative filtering is the best tier and not a degradation
+        degraded = self.model is not None
+        if degraded:
+            future = self._model_recommendations_future(app, user_id, top_n)
+            recommendations = _result_by(future, start + budget_ms * MODEL_BUDGET_SHARE / 1000)
+            if recommendations is not None:
+                return recommendations, 'model', False
+        
+        future = self._submit_completion(app, self._active_state(), self._get_recommendations_fallback,
+                                         user_id, top_n)
+        recommendations = _result_by(future, deadline, cancel=True)
+        if recommendations is not None:
+            if degraded:
+                record_degraded('collaborative_filtering')
+            return recommendations, 'collaborative_filtering', degraded
+        
+        record_degraded('popular')
+        return self._get_popular_books(top_n), 'popular', True
+    
+    def _model_recommendations_future(self, app, user_id, top_n):
+        """
+        Model scoring of one user in the completion pool, shared with requests already waiting for it.
+        
+        Returns:
+            Future of the ISBNs, or None if the completion pool is backed up
+        """
+        state = self._active_state()
+        key = (user_id, top_n)
+        with state.pending_lock:
+            future = state.pending_recommendations.get(key)
+            if future is None:
+                future = self._submit_completion(app, state, self._score_user_for_cache, user_id, top_n)
+                if future is not None:
+                    state.pending_recommendations[key] = future
+                    future.add_done_callback(lambda _: state.pending_recommendations.pop(key, None))
+        return future
+    
+    def _submit_completion(self, app, state, function, *args):
+        """Submit an engine call to the completion pool, or return None if COMPLETION_BACKLOG tasks are pending."""
+        if not self._completion_slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._completions.submit(self._in_app_context, app, state, function, *args)
+        except Exception:
+            self._completion_slots.release()
+            raise
+        # Also called for cancelled futures, so a dropped task frees its slot
+        future.add_done_callback(lambda _: self._completion_slots.release())
+        return future
+    
+    @_uses_model_state
+    def get_versioned_recommendations(self, user_ids, top_n=24, use_cache=True):
+        """
+        get_scored_recommendations() and the version of the model that scored them.
+        
+        Both come from the same pinned model state, so a version swapped in
+        during the call is never reported for the older version's results.
+        
+        Returns:
+            Tuple (model version, dict of user ID -> list of (isbn, score) pairs)
+        """
+        return self.version, self.get_scored_recommendations(user_ids, top_n, use_cache)
+    
+    def _score_user_for_cache(self, user_id, top_n):
+        """Model recommendations of a user, stored in the user cache of the pinned state."""
+        scored = self.get_scored_recommendations([user_id], top_n)
+        return [isbn for isbn, _ in scored[user_id]]
+    
+    def _cached_recommendations(self, user_id, top_n):
+        """A user's cached (isbn, score) pairs cut to top_n, or None if the cache holds fewer than top_n."""
+        entry = self.user_cache.get(user_id)
+        hit = entry is not None and entry[0] >= top_n
+        record_cache_lookup('user', hit)
+        return entry[1][:top_n] if hit else None
+    
+    def _in_app_context(self, app, state, function, *args):
+        """Run an engine call in a completion thread, in an app context and against a model state."""
+        with app.app_context(), self._using_state(state):
+            return function(*args)
+    
+    @_uses_model_state
+    def get_scored_recommendations(self, user_ids, top_n=24, use_cache=True):
+        """
+        Get scored book recommendations for several users in one engine pass.
+        
+        Users and their ratings are loaded with one query each, candidates come
+        from the model's candidate index, and every user-book pair goes through
+        the batched scorer together.
+        
+        Args:
+            user_ids: List of user IDs
+            top_n: Number of recommendations per user
+            use_cache: Serve users from the per-user cache and store the
+                results there (off for bulk exports)
+            
+        Returns:
+            Dict of user ID -> list of (isbn, score) pairs; score is None for
+            recommendations from the fallback paths
+        """
         from app import db
         
+        user_ids = list(dict.fromkeys(user_ids))
+        results = {}
+        
         # Check cache first
-        if user_id in self.user_cache:
-            return self.user_cache[user_id]
+        if use_cache:
+            for user_id in user_ids:
+                cached = self._cached_recommendations(user_id, top_n)
+                if cached is not None:
+                    results[user_id] = cached
+        missing = [user_id for user_id in user_ids if user_id not in results]
+        if not missing:
+            return results
         
         try:
             # If model is not available, use collaborative filtering fallback
             if self.model is None:
-                return self._get_recommendations_fallback(user_id, top_n)
-            
-            # Get user data
-            user = db.session.get(User, user_id)
-            if not user:
-                logger.warning(f"User {user_id} not found")
-                return self._get_popular_books(top_n)
-            
-            # Get user's rated books
-            user_ratings = db.session.query(Rating).filter(Rating.user_id == user_id).all()
-            rated_isbns = {rating.isbn for rating in user_ratings}
+                for user_id in missing:
+                    results[user_id] = [(isbn, None) for isbn in self._get_recommendations_fallback(user_id, top_n)]
+                return results
             
-            if not rated_isbns:
-                # If user hasn't rated any books, return popular books
-                return self._get_popular_books(top_n)
+            with observe_stage('candidate_fetch'):
+                # Get user data
+                users = {user.id: user for user in db.session.query(User).filter(User.id.in_(missing))}
+                
+                # Get the users' rated books
+                rated_isbns = {user_id: set() for user_id in missing}
+                for user_id, isbn in db.session.query(Rating.user_id, Rating.isbn).filter(Rating.user_id.in_(missing)):
+                    rated_isbns[user_id].add(isbn)
+                
+                # In-vocabulary candidates, or every book if the model has no ISBN vocabulary
+                books = self.get_candidate_index()
+                if books is None:
+                    books = self._all_books()
             
-            # Get all books
-            books = db.session.query(Book).all()
+            results.update(self.score_loaded_users(missing, users, rated_isbns, books, top_n, use_cache))
             
-            # Filter out books the user has already rated
-            candidate_books = [book for book in books if book.isbn not in rated_isbns]
+            # Users without ratings or candidates get popular books
+            for user_id in missing:
+                if user_id not in results:
+                    record_fallback('popular')
+                    results[user_id] = [(isbn, None) for isbn in self._get_popular_books(top_n)]
             
-            # If no candidates, return popular books
-            if not candidate_books:
-                return self._get_popular_books(top_n)
+            return results
+        
+        except Exception as e:
+            logger.error(f"Error getting recommendations for users {user_ids}: {str(e)}")
+            record_fallback('error')
+            popular = [(isbn, None) for isbn in self._get_popular_books(top_n)]
+            return {user_id: results.get(user_id, popular) for user_id in user_ids}
+    
+    @_uses_model_state
+    def score_loaded_users(self, user_ids, users, rated_isbns, books=None, top_n=24, use_cache=True):
+        """
+        Score candidate books for users whose data is already loaded.
+        
+        CPU-bound and free of database access once the book catalog is
+        loaded, so async callers can load the data themselves and run this in
+        an executor (inside an app context, for the database fallback).
+        
+        Args:
+            user_ids: List of user IDs, in result order
+            users: Dict of user ID -> User
+            rated_isbns: Dict of user ID -> set of ISBNs the user rated
+            books: CandidateIndex or list of candidate Books (or catalog records);
+                defaults to the candidate index, or every book if the model has
+                no ISBN vocabulary
+            top_n: Number of recommendations per user
+            use_cache: Store the results in the per-user cache
             
-            # Prepare user features
-            user_features = {
-                'user_id': self._encode_user_id(user_id),
-                'age_bin': self._encode_age_bin(user.age if user.age else 0)
-            }
+        Returns:
+            Dict of user ID -> list of (isbn, score) pairs; users that are
+            unknown, have no ratings or no unrated books are left out
+        """
+        from candidate_index import CandidateIndex
+        
+        if books is None:
+            books = self.get_candidate_index()
+            if books is None:
+                books = self._all_books()
+        if isinstance(books, CandidateIndex):
+            return self._score_candidate_index(books, user_ids, users, rated_isbns, top_n, use_cache)
+        
+        with observe_stage('feature_encoding'):
+            # Counted in bulk; a counter update per book would cost more than the lookup
+            misses = sum(1 for book in books if book.isbn not in self.book_cache)
+            record_cache_lookup('book', True, len(books) - misses)
+            record_cache_lookup('book', False, misses)
+            book_features = [(book.isbn, self._get_book_features(book)) for book in books]
             
-            # Predict scores for all candidate books
-            scores = []
-            for book in candidate_books:
-                # Get book features
-                book_features = self._get_book_features(book)
+            feature_rows = []
+            spans = {}
+            for user_id in user_ids:
+                user = users.get(user_id)
+                if not user:
+                    logger.warning(f"User {user_id} not found")
+                    continue
                 
-                # Combine features
-                features = {**user_features, **book_features}
+                # If user hasn't rated any books, or rated all of them, popular books are used
+                rated = rated_isbns.get(user_id) or set()
+                candidates = [(isbn, features) for isbn, features in book_features if isbn not in rated]
+                if not rated or not candidates:
+                    continue
                 
-                # Predict score
-                score = self._predict_score(features)
-                scores.append((book.isbn, score))
-            
-            # Sort by score in descending order
-            scores.sort(key=lambda x: x[1], reverse=True)
-            
-            # Get top_n recommendations
-            recommendations = [isbn for isbn, _ in scores[:top_n]]
+                # Prepare user features
+                user_features = {
+                    'user_id': self._encode_user_id(user_id),
+                    'age_bin': self._encode_age_bin(user.age if user.age else 0)
+                }
+                
+                start = len(feature_rows)
+                feature_rows.extend({**user_features, **features} for _, features in candidates)
+                spans[user_id] = (start, [isbn for isbn, _ in candidates])
+        
+        # Predict scores for all users' candidate books in batched model calls
+        with observe_stage('model_predict'):
+            predictions = self._predict_scores(feature_rows)
+        
+        results = {}
+        with observe_stage('sort'):
+            for user_id, (start, isbns) in spans.items():
+                scores = list(zip(isbns, predictions[start:start + len(isbns)]))
+                
+                # Sort by score in descending order
+                scores.sort(key=lambda x: x[1], reverse=True)
+                results[user_id] = scores[:top_n]
+                
+                # Cache results
+                if use_cache:
+                    self.user_cache[user_id] = (top_n, results[user_id])
+        
+        return results
+    
+    def _score_candidate_index(self, index, user_ids, users, rated_isbns, top_n, use_cache):
+        """score_loaded_users() over the candidate index, with array features and a partial sort."""
+        with observe_stage('feature_encoding'):
+            user_candidates = []
+            spans = {}
+            total = 0
+            for user_id in user_ids:
+                user = users.get(user_id)
+                if not user:
+                    logger.warning(f"User {user_id} not found")
+                    continue
+                
+                # If user hasn't rated any books, or rated all of them, popular books are used
+                rated = rated_isbns.get(user_id) or set()
+                positions = index.unrated_positions(rated) if rated else None
+                if positions is None or not len(positions):
+                    continue
+                
+                user_candidates.append((positions, self._encode_user_id(user_id), self._encode_age_bin(user.age if user.age else 0)))
+                spans[user_id] = (total, positions)
+                total += len(positions)
             
-            # Cache results
-            self.user_cache[user_id] = recommendations
+            columns = index.feature_columns(user_candidates)
+        
+        # Predict scores for all users' candidate books in batched model calls
+        with observe_stage('model_predict'):
+            try:
+                predictions = self._predict_arrays(columns, total)
+            except Exception as e:
+                logger.error(f"Error predicting scores: {str(e)}")
+                record_fallback('predict_error')
+                return {}
+        
+        results = {}
+        with observe_stage('sort'):
+            for user_id, (start, positions) in spans.items():
+                scores = predictions[start:start + len(positions)]
+                
+                # Only the top_n need ordering: partition them out, then sort by score descending
+                count = min(top_n, len(positions))
+                top = np.argpartition(-scores, count - 1)[:count]
+                top = top[np.argsort(-scores[top], kind='stable')]
+                results[user_id] = [(index.isbns[positions[i]], float(scores[i])) for i in top]
+                
+                # Cache results
+                if use_cache:
+                    self.user_cache[user_id] = (top_n, results[user_id])
+        
+        return results
+    
+    @_uses_model_state
+    def get_candidate_index(self):
+        """
+        The model version's candidate index of in-vocabulary books.
+        
+        Built from the book catalog on first use and kept in step with its
+        refreshes: new rating counts are patched in, new books trigger a
+        rebuild. A failed rebuild keeps serving the previous index.
+        
+        Returns:
+            CandidateIndex, or None without an ISBN vocabulary, numpy or a
+            loaded catalog
+        """
+        from candidate_index import CandidateIndex
+        
+        state = self._active_state()
+        catalog = get_catalog()
+        if state.isbn_encoder is None or np is None or catalog is None:
+            return None
+        
+        index = state.candidate_index
+        if index is not None and index.catalog_version == catalog.version:
+            return index
+        
+        with state.candidate_lock:
+            # Another thread may have updated it while this one waited
+            if state.candidate_index is not index:
+                return state.candidate_index
             
-            return recommendations
+            try:
+                with observe_stage('candidate_index'):
+                    changes = catalog.changes_since(index.catalog_version) if index is not None else None
+                    if changes is not None and not changes[0]:
+                        state.candidate_index = index.with_updated_rows(catalog, changes[1])
+                    else:
+                        state.candidate_index = CandidateIndex.build(catalog, {
+                            'isbn': state.isbn_encoder,
+                            'author': state.author_encoder,
+                            'publisher': state.publisher_encoder,
+                            'year': state.year_encoder,
+                        }, state.item_scaler)
+            except Exception as e:
+                logger.error(f"Error building candidate index: {str(e)}")
         
-        except Exception as e:
-            logger.error(f"Error getting recommendations for user {user_id}: {str(e)}")
-            return self._get_popular_books(top_n)
+        return state.candidate_index
+    
+    def _all_books(self):
+        """Every book: the catalog's records, or ORM objects while it is loading."""
+        from app import db
+        
+        catalog = get_catalog()
+        if catalog is not None:
+            return catalog.records
+        return db.session.query(Book).all()
     
     def _get_recommendations_fallback(self, user_id, top_n=24):
         """Fallback recommendation method using collaborative filtering."""
         from app import db
         
+        record_fallback('collaborative_filtering')
         try:
             # Get user's rated books
-            user_ratings = db.session.query(Rating).filter(Rating.user_id == user_id).all()
-            if not user_ratings:
-                return self._get_popular_books(top_n)
-            
-            # Find users with similar taste
-            similar_users = set()
-            for rating in user_ratings:
-                # Find other users who rated this book similarly
-                similar_ratings = db.session.query(Rating).filter(
-                    Rating.isbn == rating.isbn,
-                    Rating.user_id != user_id,
-                    Rating.rating >= rating.rating - 1,  # Similar rating threshold
-                    Rating.rating <= rating.rating + 1
-                ).all()
-                
-                similar_users.update([r.user_id for r in similar_ratings])
+            rated_isbns = db.session.query(Rating.isbn).filter(Rating.user_id == user_id)
             
-            if not similar_users:
-                return self._get_popular_books(top_n)
-            
-            # Get books rated highly by similar users but not rated by current user
-            rated_isbns = {r.isbn for r in user_ratings}
+            # Find users who rated one of these books similarly (within one point),
+            # as a single self-join served by the covering (isbn, rating, user_id) index
+            own = aliased(Rating)
+            other = aliased(Rating)
+            similar_users = db.session.query(other.user_id).join(
+                own, own.isbn == other.isbn
+            ).filter(
+                own.user_id == user_id,
+                other.user_id != user_id,
+                other.rating >= own.rating - 1,  # Similar rating threshold
+                other.rating <= own.rating + 1
+            )
             
-            # Get all ratings from similar users for books the current user hasn't rated
-            similar_ratings = db.session.query(Rating).filter(
+            # Count how often similar users rated each unseen book highly,
+            # served by the covering (user_id, rating, isbn) index
+            book_counts = db.session.query(
+                Rating.isbn,
+                func.count(Rating.id).label('count')
+            ).filter(
                 Rating.user_id.in_(similar_users),
                 ~Rating.isbn.in_(rated_isbns),
                 Rating.rating >= 7  # Only consider highly rated books
-            ).all()
+            ).group_by(
+                Rating.isbn
+            ).order_by(
+                func.count(Rating.id).desc()
+            ).limit(top_n).all()
             
-            # Count frequency of each book
-            book_counts = {}
-            for rating in similar_ratings:
-                if rating.isbn in book_counts:
-                    book_counts[rating.isbn] += 1
-                else:
-                    book_counts[rating.isbn] = 1
+            if not book_counts:
+                return self._get_popular_books(top_n)
             
-            # Sort by frequency
-            sorted_books = sorted(book_counts.items(), key=lambda x: x[1], reverse=True)
-            recommendations = [isbn for isbn, _ in sorted_books[:top_n]]
+            recommendations = [isbn for isbn, _ in book_counts]
             
             # If not enough recommendations, add popular books
             if len(recommendations) < top_n:
@@ -254,43 +998,40 @@ class RecommendationEngine:
     
     def _get_popular_books(self, limit=24):
         """Get popular books based on ratings."""
-        from app import db
-        
-        try:
-            # Get books with highest average rating and at least 5 ratings
-            popular_books = db.session.query(Book.isbn).filter(
-                Book.num_ratings >= 5
-            ).order_by(
-                Book.avg_rating.desc()
-            ).limit(limit).all()
-            
-            return [book.isbn for book in popular_books]
-        
-        except Exception as e:
-            logger.error(f"Error getting popular books: {str(e)}")
-            # As a last resort, get random books
-            return db.session.query(Book.isbn).limit(limit).all()
+        return get_popular_books(limit)
     
-    def get_similar_books(self, isbn, top_n=6):
+    @_uses_model_state
+    def get_similar_books(self, isbn, top_n=6, profile=False):
         """
         Get books similar to a given book.
         
         Args:
             isbn: Book ISBN
             top_n: Number of similar books to return
+            profile: Write a sampling profile of this call to instance/profiles
             
         Returns:
             List of similar book ISBNs
         """
         from app import db
         
+        if profile:
+            from profiler import profiled
+            with profiled(f"similar-books-{isbn}"):
+                return self.get_similar_books(isbn, top_n)
+        
         # Check cache first
-        if isbn in self.similar_books_cache:
+        cached = isbn in self.similar_books_cache
+        record_cache_lookup('similar_books', cached)
+        if cached:
             return self.similar_books_cache[isbn]
         
         try:
             # Get book
-            book = db.session.query(Book).filter(Book.isbn == isbn).first()
+            catalog = get_catalog()
+            book = catalog.get(isbn) if catalog is not None else None
+            if book is None:
+                book = db.session.query(Book).filter(Book.isbn == isbn).first()
             if not book:
                 logger.warning(f"Book {isbn} not found")
                 return []
@@ -300,8 +1041,37 @@ class RecommendationEngine:
                 return self._get_similar_books_fallback(book, top_n)
             
             # Get all books
-            books = db.session.query(Book).filter(Book.isbn != isbn).all()
+            with observe_stage('candidate_fetch'):
+                books = [other for other in self._all_books() if other.isbn != isbn]
             
+            return self.rank_similar_books(book, books, top_n)
+        
+        except Exception as e:
+            logger.error(f"Error getting similar books for {isbn}: {str(e)}")
+            # Get book again in case 'book' is unbound in the exception context
+            from app import db
+            book_obj = db.session.query(Book).filter(Book.isbn == isbn).first()
+            if book_obj:
+                return self._get_similar_books_fallback(book_obj, top_n)
+            else:
+                return []  # No similar books if we can't find the book
+    
+    @_uses_model_state
+    def rank_similar_books(self, book, books, top_n=6):
+        """
+        Rank already loaded books by feature similarity to a book.
+        
+        CPU-bound and free of database access, like score_loaded_users.
+        
+        Args:
+            book: Target Book
+            books: Candidate Books (without the target)
+            top_n: Number of similar books to return
+            
+        Returns:
+            List of similar book ISBNs
+        """
+        with observe_stage('similarity'):
             # Get book features for the target book
             target_features = self._get_book_features(book)
             
@@ -314,32 +1084,24 @@ class RecommendationEngine:
                 # Compute similarity (simple feature overlap for now)
                 similarity = self._compute_similarity(target_features, other_features)
                 scores.append((other_book.isbn, similarity))
-            
-            # Sort by similarity in descending order
+        
+        # Sort by similarity in descending order
+        with observe_stage('sort'):
             scores.sort(key=lambda x: x[1], reverse=True)
-            
-            # Get top_n similar books
-            similar_books = [isbn for isbn, _ in scores[:top_n]]
-            
-            # Cache results
-            self.similar_books_cache[isbn] = similar_books
-            
-            return similar_books
         
-        except Exception as e:
-            logger.error(f"Error getting similar books for {isbn}: {str(e)}")
-            # Get book again in case 'book' is unbound in the exception context
-            from app import db
-            book_obj = db.session.query(Book).filter(Book.isbn == isbn).first()
-            if book_obj:
-                return self._get_similar_books_fallback(book_obj, top_n)
-            else:
-                return []  # No similar books if we can't find the book
+        # Get top_n similar books
+        similar_books = [isbn for isbn, _ in scores[:top_n]]
+        
+        # Cache results
+        self.similar_books_cache[book.isbn] = similar_books
+        
+        return similar_books
     
     def _get_similar_books_fallback(self, book, top_n=6):
         """Fallback method for finding similar books based on metadata."""
         from app import db
         
+        record_fallback('similar_metadata')
         try:
             # Find books with same author
             same_author = db.session.query(Book).filter(
@@ -397,77 +1159,33 @@ class RecommendationEngine:
     
     def _encode_user_id(self, user_id):
         """Encode user ID using the pre-trained encoder."""
-        if self.user_id_encoder is None:
-            return 0
-        
-        try:
-            # Check if user_id is in the encoder's vocabulary
-            if user_id in self.user_id_encoder.classes_:
-                return self.user_id_encoder.transform([user_id])[0]
-            else:
-                return 0  # Default encoding for unknown users
-        except Exception as e:
-            logger.error(f"Error encoding user ID: {str(e)}")
-            return 0
+        return self._encode_value(self.user_id_encoder, user_id, 'user ID')
     
     def _encode_isbn(self, isbn):
         """Encode ISBN using the pre-trained encoder."""
-        if self.isbn_encoder is None:
-            return 0
-        
-        try:
-            # Check if isbn is in the encoder's vocabulary
-            if isbn in self.isbn_encoder.classes_:
-                return self.isbn_encoder.transform([isbn])[0]
-            else:
-                return 0  # Default encoding for unknown books
-        except Exception as e:
-            logger.error(f"Error encoding ISBN: {str(e)}")
-            return 0
+        return self._encode_value(self.isbn_encoder, isbn, 'ISBN')
     
     def _encode_author(self, author):
         """Encode author using the pre-trained encoder."""
-        if self.author_encoder is None:
-            return 0
-        
-        try:
-            # Check if author is in the encoder's vocabulary
-            if author in self.author_encoder.classes_:
-                return self.author_encoder.transform([author])[0]
-            else:
-                return 0  # Default encoding for unknown authors
-        except Exception as e:
-            logger.error(f"Error encoding author: {str(e)}")
-            return 0
+        return self._encode_value(self.author_encoder, author, 'author')
     
     def _encode_publisher(self, publisher):
         """Encode publisher using the pre-trained encoder."""
-        if self.publisher_encoder is None:
-            return 0
-        
-        try:
-            # Check if publisher is in the encoder's vocabulary
-            if publisher in self.publisher_encoder.classes_:
-                return self.publisher_encoder.transform([publisher])[0]
-            else:
-                return 0  # Default encoding for unknown publishers
-        except Exception as e:
-            logger.error(f"Error encoding publisher: {str(e)}")
-            return 0
+        return self._encode_value(self.publisher_encoder, publisher, 'publisher')
     
     def _encode_year(self, year):
         """Encode year using the pre-trained encoder."""
-        if self.year_encoder is None:
+        return self._encode_value(self.year_encoder, year, 'year')
+    
+    def _encode_value(self, vocabulary, value, label):
+        """Look a value up in a vocabulary; 0 for unknown values or missing encoders."""
+        if vocabulary is None:
             return 0
         
         try:
-            # Check if year is in the encoder's vocabulary
-            if year in self.year_encoder.classes_:
-                return self.year_encoder.transform([year])[0]
-            else:
-                return 0  # Default encoding for unknown years
+            return vocabulary.encode(value, default=0)
         except Exception as e:
-            logger.error(f"Error encoding year: {str(e)}")
+            logger.error(f"Error encoding {label}: {str(e)}")
             return 0
     
     def _encode_age_bin(self, age):
@@ -494,11 +1212,8 @@ class RecommendationEngine:
             else:
                 age_bin = '65+'
             
-            # Check if age_bin is in the encoder's vocabulary
-            if age_bin in self.age_bin_encoder.classes_:
-                return self.age_bin_encoder.transform([age_bin])[0]
-            else:
-                return 0  # Default encoding for unknown age bins
+            # Unknown age bins get the default encoding
+            return self.age_bin_encoder.encode(age_bin, default=0)
         except Exception as e:
             logger.error(f"Error encoding age bin: {str(e)}")
             return 0
@@ -525,14 +1240,11 @@ class RecommendationEngine:
                     'num_ratings': book.num_ratings
                 }
                 
-                # Scale features
-                scaled = self.item_scaler.transform([[
-                    to_scale['avg_rating'], 
-                    to_scale['num_ratings']
-                ]])
-                
-                features['avg_rating_scaled'] = scaled[0][0]
-                features['num_ratings_scaled'] = scaled[0][1]
+                # Scale features (min-max: x * scale + min)
+                scale = self.item_scaler['scale']
+                offset = self.item_scaler['min']
+                features['avg_rating_scaled'] = float((to_scale['avg_rating'] or 0.0) * scale[0] + offset[0])
+                features['num_ratings_scaled'] = float((to_scale['num_ratings'] or 0) * scale[1] + offset[1])
             else:
                 # Simple normalization as fallback
                 features['avg_rating_scaled'] = book.avg_rating / 10
@@ -560,59 +1272,127 @@ class RecommendationEngine:
     
     def _predict_score(self, features):
         """Predict score for a user-book pair."""
+        return self._predict_scores([features])[0]
+    
+    def _fallback_score(self, features):
+        """Deterministic but varied score used when the model is unavailable."""
+        # Use book features to generate a deterministic but varied score
+        # This helps ensure recommendations aren't all the same
+        import random
+        book_isbn = features.get('isbn', 0)
+        user_id = features.get('user_id', 0)
+        book_author = features.get('author', 0)
+        publisher = features.get('publisher', 0)
+        # Use a hash of the features to seed the random generator
+        seed_value = hash(f"{user_id}_{book_isbn}_{book_author}_{publisher}")
+        random.seed(seed_value)
+        return random.uniform(0.3, 0.8)  # Semi-random score between 0.3 and 0.8
+    
+    def _padded_batch_size(self, count):
+        """Smallest configured batch size holding count rows, else the largest."""
+        for size in self.batch_sizes:
+            if size >= count:
+                return size
+        return self.batch_sizes[-1]
+    
+    def _build_inputs(self, columns, start, stop, batch_size):
+        """Slice feature columns into model input arrays, zero-padded to batch_size rows."""
+        inputs = {}
+        for key, expected_feature in MODEL_INPUTS:
+            # Missing features default to 0
+            values = np.zeros(batch_size, dtype=np.float32 if expected_feature.endswith('_scaled') else np.int64)
+            if expected_feature in columns:
+                values[:stop - start] = columns[expected_feature][start:stop]
+            inputs[key] = values
+        
+        # For deep part, we need to add dummy title embedding
+        inputs['title_embedding_features'] = np.zeros((batch_size, TITLE_EMBEDDING_DIM), dtype=np.float32)
+        return inputs
+    
+    def _predict_arrays(self, columns, count):
+        """
+        Predict scores for `count` user-book pairs given as feature columns.
+        
+        Rows are scored in chunks of the largest configured batch size and the
+        last chunk is padded, so the model only sees warmed-up input shapes.
+        
+        Args:
+            columns: Dict of feature name -> array of `count` values
+            count: Number of pairs
+            
+        Returns:
+            float32 array of scores in the same order
+        """
+        scores = np.empty(count, dtype=np.float32)
+        max_batch = self.batch_sizes[-1]
+        for start in range(0, count, max_batch):
+            stop = min(start + max_batch, count)
+            inputs = self._build_inputs(columns, start, stop, self._padded_batch_size(stop - start))
+            prediction = self.model.predict_on_batch(inputs)
+            scores[start:stop] = np.asarray(prediction).reshape(-1)[:stop - start]
+        return scores
+    
+    def _predict_scores(self, feature_rows):
+        """
+        Predict scores for many user-book pairs.
+        
+        Args:
+            feature_rows: List of feature dicts (user and book features combined)
+            
+        Returns:
+            List of scores in the same order
+        """
+        if self.model is None or np is None:
+            if feature_rows:
+                record_fallback('random_score')
+            return [self._fallback_score(features) for features in feature_rows]
+        
         try:
-            # If model or numpy is not available, return varied default score
-            if self.model is None or np is None:
-                # Use book features to generate a deterministic but varied score
-                # This helps ensure recommendations aren't all the same
-                import random
-                book_isbn = features.get('isbn', 0)
-                user_id = features.get('user_id', 0)
-                book_author = features.get('author', 0)
-                publisher = features.get('publisher', 0)
-                # Use a hash of the features to seed the random generator
-                seed_value = hash(f"{user_id}_{book_isbn}_{book_author}_{publisher}")
-                random.seed(seed_value)
-                return random.uniform(0.3, 0.8)  # Semi-random score between 0.3 and 0.8
-            
-            # Try to import TensorFlow and dependencies if not already available
-            if not TF_AVAILABLE and not _try_import_libraries():
-                # Same fallback as above
-                import random
-                seed_value = hash(f"{features.get('user_id', 0)}_{features.get('isbn', 0)}")
-                random.seed(seed_value)
-                return random.uniform(0.3, 0.8)
-            
-            # Prepare input data for the model - handle missing features gracefully
-            inputs = {}
-            for key, expected_feature in [
-                ('user_id_encoded', 'user_id'),
-                ('isbn_encoded', 'isbn'),
-                ('author_encoded', 'author'),
-                ('publisher_encoded', 'publisher'),
-                ('year_encoded', 'year'),
-                ('age_binned_encoded', 'age_bin'),
-                ('avg_rating_scaled', 'avg_rating_scaled'),
-                ('num_ratings_scaled', 'num_ratings_scaled')
-            ]:
-                # Check if feature exists, use 0 as default
-                value = features.get(expected_feature, 0)
-                inputs[key] = np.array([value])
-            
-            # For deep part, we need to add dummy title embedding
-            inputs['title_embedding_features'] = np.zeros((1, 50))  # Assuming 50-dim embeddings
-            
-            # Make prediction
-            prediction = self.model.predict(inputs, verbose=0)
-            
-            return prediction[0][0]  # Return scalar value
+            columns = {feature: [row.get(feature, 0) for row in feature_rows] for _, feature in MODEL_INPUTS}
+            return [float(score) for score in self._predict_arrays(columns, len(feature_rows))]
         
         except Exception as e:
-            logger.error(f"Error predicting score: {str(e)}")
-            # Fallback to varied score on error
-            import random
-            random.seed(hash(str(features)))
-            return random.uniform(0.3, 0.7)
+            logger.error(f"Error predicting scores: {str(e)}")
+            record_fallback('predict_error')
+            # Fallback to varied scores
+            return [self._fallback_score(features) for features in feature_rows]
+    
+    def warm_up(self, batch_sizes=None, state=None):
+        """
+        Run every configured batch shape through the model once.
+        
+        The first call per input shape pays for graph tracing and buffer
+        allocation; doing it here keeps that cost out of the first requests.
+        
+        Args:
+            batch_sizes: Batch sizes to warm, defaults to the serving batch sizes
+            state: Model state to warm, defaults to the live one
+            
+        Returns:
+            Dict of batch size -> milliseconds taken by its first predict call
+        """
+        state = state or self._state
+        timings = {}
+        if state.model is None or np is None:
+            state.warmup = timings
+            return timings
+        
+        # Representative rows: one user against distinct in-vocabulary books
+        isbn_count = len(state.isbn_encoder) if state.isbn_encoder is not None else 1
+        for size in batch_sizes or self.batch_sizes:
+            rows = [{
+                'user_id': 0, 'age_bin': 0, 'isbn': i % isbn_count, 'author': 0, 'publisher': 0, 'year': 0,
+                'avg_rating_scaled': 0.5, 'num_ratings_scaled': 0.1,
+            } for i in range(size)]
+            
+            start = time.perf_counter()
+            with self._using_state(state):
+                self._predict_scores(rows)
+            timings[size] = round((time.perf_counter() - start) * 1000, 1)
+        
+        state.warmup = timings
+        logger.info(f"Model warm-up finished: {timings}")
+        return timings
     
     def _compute_similarity(self, features1, features2):
         """Compute similarity between two feature sets."""
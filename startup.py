@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class StartupPhase:
+    """Status and timing of one application startup phase."""
+
+    def __init__(self, name):
+        self.name = name
+        self.status = 'pending'  # pending, running, done, failed
+        self.started_at = None
+        self.duration_ms = None
+        self.error = None
+        self.details = {}
+
+    def to_dict(self):
+        data = {
+            'status': self.status,
+            'duration_ms': self.duration_ms,
+        }
+        if self.error:
+            data['error'] = self.error
+        if self.details:
+            data.update(self.details)
+        return data
+
+class StartupState:
+    """
+    Tracks the application's startup phases for the health endpoints.
+
+    Phases are declared up front so readiness can report the ones that
+    have not started yet.
+    """
+
+    def __init__(self, phase_names):
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self.phases = {name: StartupPhase(name) for name in phase_names}
+        self.started_at = time.time()
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase and record whether it succeeded; exceptions propagate."""
+        phase = self.phases[name]
+        with self._lock:
+            phase.status = 'running'
+            phase.started_at = time.time()
+
+        start = time.perf_counter()
+        try:
+            yield phase
+        except Exception as e:
+            with self._lock:
+                phase.status = 'failed'
+                phase.error = str(e)
+                phase.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            logger.error(f"Startup phase '{name}' failed after {phase.duration_ms} ms: {str(e)}")
+            raise
+        else:
+            with self._lock:
+                phase.status = 'done'
+                phase.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            logger.info(f"Startup phase '{name}' finished in {phase.duration_ms} ms")
+        finally:
+            self._check_finished()
+
+    def _check_finished(self):
+        if all(phase.status in ('done', 'failed') for phase in self.phases.values()):
+            self._finished.set()
+
+    @property
+    def ready(self):
+        """True once every phase has finished, successfully or not."""
+        return self._finished.is_set()
+
+    @property
+    def degraded(self):
+        """True if any phase failed and the app runs on its fallbacks."""
+        return any(phase.status == 'failed' for phase in self.phases.values())
+
+    def wait_until_ready(self, timeout=None):
+        """Block until all phases have finished; returns readiness."""
+        return self._finished.wait(timeout)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'degraded': self.degraded,
+                'uptime_s': round(time.time() - self.started_at, 1),
+                'phases': {name: phase.to_dict() for name, phase in self.phases.items()},
+            }
+
+def run_in_background(target, name):
+    """Run a startup function in a daemon thread so it doesn't block serving."""
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    return thread
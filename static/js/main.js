@@ -24,8 +24,102 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Filter form functionality
     initializeFilterForm();
+
+    // Home page sections fetched after first paint
+    loadFragments();
+
+    // Infinite scroll on the browse page
+    initializeInfiniteScroll();
 });
 
+/**
+ * Fetch an HTML fragment and append its book cards to a container
+ * Returns the URL of the next fragment (X-Next-Url header), or null
+ */
+function appendFragment(container, url) {
+    return fetch(url, { headers: { 'Accept': 'text/html' } })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Failed to load ${url}: ${response.status}`);
+            }
+            return response.text().then(html => {
+                container.insertAdjacentHTML('beforeend', html);
+                handleBookImageErrors();
+                return response.headers.get('X-Next-Url');
+            });
+        });
+}
+
+/**
+ * Load the sections marked with data-fragment-url
+ */
+function loadFragments() {
+    const containers = document.querySelectorAll('[data-fragment-url]');
+
+    containers.forEach(container => {
+        const placeholder = container.querySelector('.fragment-loading');
+
+        appendFragment(container, container.dataset.fragmentUrl)
+            .then(() => {
+                if (placeholder) placeholder.remove();
+
+                // Hide sections that came back empty
+                const section = container.closest('[data-fragment-section]');
+                if (section && !container.querySelector('.book-card')) {
+                    section.style.display = 'none';
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                if (placeholder) placeholder.textContent = 'Could not load books.';
+            });
+    });
+}
+
+/**
+ * Load the next page of books when the end of the grid scrolls into view
+ */
+function initializeInfiniteScroll() {
+    const grid = document.getElementById('book-grid');
+    if (!grid || !grid.dataset.nextUrl || !('IntersectionObserver' in window)) return;
+
+    // Infinite scroll takes over from the "Next" link
+    const nextLink = document.getElementById('keyset-next');
+    if (nextLink) nextLink.style.display = 'none';
+
+    const sentinel = document.createElement('div');
+    sentinel.className = 'text-center text-muted py-4';
+    grid.after(sentinel);
+
+    let nextUrl = grid.dataset.nextUrl;
+    let loading = false;
+
+    const observer = new IntersectionObserver(entries => {
+        if (!entries[0].isIntersecting || loading || !nextUrl) return;
+
+        loading = true;
+        sentinel.textContent = 'Loading more books...';
+        appendFragment(grid, nextUrl)
+            .then(url => {
+                nextUrl = url;
+                loading = false;
+                sentinel.textContent = '';
+                if (!nextUrl) observer.disconnect();
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                loading = false;
+                sentinel.textContent = 'Could not load more books.';
+
+                // Fall back to the "Next" link
+                observer.disconnect();
+                if (nextLink) nextLink.style.display = '';
+            });
+    }, { rootMargin: '400px' });
+
+    observer.observe(sentinel);
+}
+
 /**
  * Initialize interactive star rating functionality
  */
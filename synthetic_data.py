@@ -0,0 +1,182 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+from models import User, Book, Rating
+from data_loader import update_book_ratings, _batch_size, _insert_rows, _sync_id_sequence
+from facets import refresh_facets
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Password of every synthetic user, used by the load-testing harness to log in
+SYNTHETIC_PASSWORD = 'synthetic'
+
+# Synthetic ISBNs and usernames, recognisable next to the BookCrossing data
+ISBN_FORMAT = 'S{:09d}'
+USERNAME_FORMAT = 'synthetic_{}'
+
+def _zipf_weights(rng, size, exponent):
+    """Normalized power-law weights over `size` items, in shuffled rank order."""
+    import numpy as np
+
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+def generate_synthetic_data(db, books=10000, users=5000, ratings=100000, seed=42,
+                            popularity_exponent=1.1, activity_exponent=0.9):
+    """
+    Fill an empty database with a seeded, BookCrossing-shaped dataset.
+
+    Book popularity and user activity follow power laws, so a few books and
+    users account for most ratings, as in the real data. Authors and
+    publishers are also drawn from power laws to give realistic facet sizes.
+
+    Args:
+        db: SQLAlchemy database instance
+        books: Number of books (10k to 1M)
+        users: Number of users
+        ratings: Number of ratings (up to 10M), one per user-book pair
+        seed: Random seed; the same arguments always produce the same data
+        popularity_exponent: Power-law exponent of book popularity
+        activity_exponent: Power-law exponent of user activity
+
+    Returns:
+        Dict with the number of books, users and ratings stored
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    try:
+        _generate_books(db, rng, books)
+        _generate_users(db, rng, users)
+        stored_ratings = _generate_ratings(db, rng, books, users, ratings,
+                                           popularity_exponent, activity_exponent)
+
+        logger.info("Updating book ratings...")
+        update_book_ratings(db)
+        db.session.commit()
+
+        logger.info("Refreshing facet tables...")
+        refresh_facets(db)
+
+        # Refresh planner statistics, also used for approximate listing totals
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+        return {'books': books, 'users': users, 'ratings': stored_ratings}
+
+    except Exception as e:
+        logger.error(f"Error generating synthetic data: {str(e)}")
+        db.session.rollback()
+        raise
+
+def _generate_books(db, rng, count):
+    """Insert `count` books with power-law distributed authors and publishers."""
+    import numpy as np
+
+    author_count = max(count // 5, 1)
+    publisher_count = max(count // 50, 1)
+    authors = rng.choice(author_count, size=count, p=_zipf_weights(rng, author_count, 1.0))
+    publishers = rng.choice(publisher_count, size=count, p=_zipf_weights(rng, publisher_count, 1.2))
+    years = np.clip(rng.normal(1995, 8, size=count).astype(int), 1900, 2024)
+
+    batch_size = _batch_size(db, 5000)
+    for start in range(0, count, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, count)):
+            isbn = ISBN_FORMAT.format(i)
+            rows.append({
+                'isbn': isbn,
+                'title': f"Synthetic Book {i}",
+                'author': f"Author {authors[i]}",
+                'year_of_publication': str(years[i]),
+                'publisher': f"Publisher {publishers[i]}",
+                'image_url_s': f"https://example.com/covers/{isbn}-S.jpg",
+                'image_url_m': f"https://example.com/covers/{isbn}-M.jpg",
+                'image_url_l': f"https://example.com/covers/{isbn}-L.jpg",
+                'avg_rating': 0.0,
+                'num_ratings': 0,
+            })
+        _insert_rows(db, Book, rows)
+        logger.info(f"Generated {start + len(rows)} books")
+
+    db.session.commit()
+
+def _generate_users(db, rng, count):
+    """Insert `count` users sharing SYNTHETIC_PASSWORD; ages are missing for ~40%, as in BookCrossing."""
+    # Hashing once keeps generation fast; every user gets the same password
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+    ages = rng.integers(12, 80, size=count)
+    has_age = rng.random(count) > 0.4
+    registered = datetime(2004, 1, 1)
+
+    batch_size = _batch_size(db, 5000)
+    for start in range(0, count, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, count)):
+            user_id = i + 1
+            rows.append({
+                'id': user_id,
+                'username': USERNAME_FORMAT.format(user_id),
+                'email': f"{USERNAME_FORMAT.format(user_id)}@example.com",
+                'password_hash': password_hash,
+                'location': 'synthetic',
+                'age': int(ages[i]) if has_age[i] else None,
+                'registration_date': registered,
+            })
+        _insert_rows(db, User, rows)
+        logger.info(f"Generated {start + len(rows)} users")
+
+    # Explicit ids bypass the PostgreSQL sequence, move it past them
+    _sync_id_sequence(db, User)
+    db.session.commit()
+
+def _generate_ratings(db, rng, book_count, user_count, count, popularity_exponent, activity_exponent):
+    """
+    Insert `count` ratings with power-law book popularity and user activity.
+
+    Returns:
+        Number of ratings stored; fewer than `count` only if the power laws are
+        too steep to find enough distinct user-book pairs
+    """
+    import numpy as np
+
+    user_weights = _zipf_weights(rng, user_count, activity_exponent)
+    book_weights = _zipf_weights(rng, book_count, popularity_exponent)
+    count = min(count, user_count * book_count)
+
+    # One rating per user and book (unique constraint): popular pairs repeat,
+    # so keep drawing until enough distinct pairs exist
+    pairs = np.empty(0, dtype=np.int64)
+    for _ in range(10):
+        missing = count - len(pairs)
+        if missing <= 0:
+            break
+        user_ids = rng.choice(user_count, size=missing, p=user_weights).astype(np.int64) + 1
+        book_ids = rng.choice(book_count, size=missing, p=book_weights)
+        pairs = np.unique(np.concatenate([pairs, user_ids * book_count + book_ids]))
+    pairs = rng.permutation(pairs)[:count]
+    pairs.sort()
+    user_ids, book_ids = pairs // book_count, pairs % book_count
+
+    # Explicit ratings skew high, like BookCrossing's 1-10 scale
+    values = np.clip(np.rint(rng.normal(7.6, 1.8, size=len(pairs))), 1, 10).astype(int)
+    start_time = datetime(2004, 1, 1)
+    offsets = rng.integers(0, 365 * 24 * 3600, size=len(pairs))
+
+    batch_size = _batch_size(db, 10000)
+    for start in range(0, len(pairs), batch_size):
+        end = min(start + batch_size, len(pairs))
+        rows = [{
+            'user_id': int(user_ids[i]),
+            'isbn': ISBN_FORMAT.format(book_ids[i]),
+            'rating': int(values[i]),
+            'timestamp': start_time + timedelta(seconds=int(offsets[i])),
+        } for i in range(start, end)]
+        _insert_rows(db, Rating, rows)
+        db.session.commit()
+        logger.info(f"Generated {end} ratings")
+
+    return len(pairs)
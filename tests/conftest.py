@@ -0,0 +1,103 @@
+"""
+Shared fixtures.
+
+The app reads its configuration from the environment when it is imported,
+so the environment is set here, before any test module imports it: a
+throwaway SQLite database, synchronous startup, no dataset import, no
+model bundle and no background threads.
+"""
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix='booksite-tests-')
+
+os.environ.update({
+    'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}",
+    'STARTUP_IN_BACKGROUND': '0',
+    'LOAD_DATASET': '0',
+    'MODEL_RELOAD_INTERVAL': '0',
+    'CATALOG_REFRESH_INTERVAL': '0',
+    'MODEL_VERSIONS_DIR': os.path.join(TEST_DIR, 'versions'),
+    'MODEL_BUNDLE_PATH': os.path.join(TEST_DIR, 'missing.bundle'),
+    'RECOMMENDATION_BUDGET_MS': '0',
+})
+
+# Imported before any test module: models and the modules built on them need the app first
+import app as _app_module  # noqa: E402
+
+@pytest.fixture(scope='session')
+def app_module():
+    _app_module.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return _app_module
+
+@pytest.fixture
+def app(app_module):
+    return app_module.app
+
+@pytest.fixture
+def db(app_module):
+    """The database in an app context, emptied after the test (the migration log is kept)."""
+    from models import SchemaMigration
+
+    with app_module.app.app_context():
+        yield app_module.db
+        app_module.db.session.rollback()
+        for table in reversed(app_module.db.metadata.sorted_tables):
+            if table is not SchemaMigration.__table__:
+                app_module.db.session.execute(table.delete())
+        app_module.db.session.commit()
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+@pytest.fixture
+def make_book(db):
+    """Add a book: make_book('isbn', avg_rating=7.5, ...)."""
+    from models import Book
+
+    def _make_book(isbn, **fields):
+        values = dict(title=f"Title {isbn}", author='Author', year_of_publication='2000',
+                      publisher='Publisher', avg_rating=0.0, num_ratings=0)
+        values.update(fields)
+        book = Book(isbn=isbn, **values)
+        db.session.add(book)
+        db.session.commit()
+        return book
+    return _make_book
+
+@pytest.fixture
+def make_user(db):
+    """Add a user with the password 'password': make_user('name')."""
+    from werkzeug.security import generate_password_hash
+    from models import User
+
+    def _make_user(username, **fields):
+        user = User(username=username, email=f"{username}@example.com",
+                    password_hash=generate_password_hash('password'), **fields)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return _make_user
+
+@pytest.fixture
+def make_rating(db):
+    """Add a rating: make_rating(user, book, 8)."""
+    from models import Rating
+
+    def _make_rating(user, book, value):
+        rating = Rating(user_id=user.id, isbn=book.isbn, rating=value, timestamp=datetime.utcnow())
+        db.session.add(rating)
+        db.session.commit()
+        return rating
+    return _make_rating
+
+@pytest.fixture
+def login(client):
+    """Log the test client in as a user made by make_user: login('name')."""
+    def _login(username):
+        return client.post('/login', data={'username': username, 'password': 'password'})
+    return _login
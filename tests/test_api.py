@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+@pytest.fixture
+def engine(app_module, monkeypatch):
+    """The app's engine with a stand-in model and an empty user cache; scoring must not run."""
+    engine = app_module.recommendation_engine
+    state = engine._active_state()
+    monkeypatch.setattr(state, 'model', object())
+    monkeypatch.setattr(state, 'user_cache', {})
+    monkeypatch.setattr(engine, 'score_loaded_users',
+                        lambda *args, **kwargs: pytest.fail("cached users must not be scored"))
+    return engine
+
+@pytest.fixture
+def reader(make_user):
+    return make_user('reader')
+
+def _user_url(user):
+    return f"/api/v1/users/{user.id}/recommendations"
+
+def test_user_recommendations_need_authentication(client, reader):
+    response = client.get(_user_url(reader))
+    assert response.status_code == 401
+
+def test_user_recommendations_of_another_user_are_forbidden(client, login, reader, make_user):
+    make_user('other')
+    login('other')
+    assert client.get(_user_url(reader)).status_code == 403
+
+def test_user_reads_own_recommendations(client, login, reader):
+    login('reader')
+    response = client.get(_user_url(reader))
+    assert response.status_code == 200
+    assert response.get_json()['user_id'] == reader.id
+
+def test_admin_reads_any_user(app, client, login, reader, make_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMIN_USERNAMES', {'boss'})
+    make_user('boss')
+    login('boss')
+    assert client.get(_user_url(reader)).status_code == 200
+
+def test_api_token_reads_any_user(app, client, reader, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_TOKEN', 'secret-token')
+    assert client.get(_user_url(reader), headers={'Authorization': 'Bearer secret-token'}).status_code == 200
+    assert client.get(_user_url(reader), headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+def test_unknown_user_is_not_revealed_to_anonymous_callers(client):
+    assert client.get('/api/v1/users/999999/recommendations').status_code == 401
+
+def test_batch_limited_to_own_user(client, login, reader, make_user):
+    other = make_user('other')
+    assert client.post('/api/v1/recommendations/batch', json={'user_ids': [reader.id]}).status_code == 401
+
+    login('reader')
+    assert client.post('/api/v1/recommendations/batch', json={'user_ids': [reader.id]}).status_code == 200
+    response = client.post('/api/v1/recommendations/batch', json={'user_ids': [reader.id, other.id]})
+    assert response.status_code == 403
+
+def test_user_recommendations_served_from_cache(client, login, reader, engine):
+    engine.user_cache[reader.id] = (24, [('0001', 0.9), ('0002', 0.8), ('0003', 0.7)])
+    login('reader')
+
+    response = client.get(_user_url(reader) + '?top_n=2')
+
+    assert response.status_code == 200
+    assert [item['isbn'] for item in response.get_json()['items']] == ['0001', '0002']
+    assert [item['score'] for item in response.get_json()['items']] == [0.9, 0.8]
+
+def test_cache_entry_for_fewer_items_is_a_miss(app, db, reader, engine, monkeypatch):
+    scored = []
+    monkeypatch.setattr(engine, 'score_loaded_users',
+                        lambda user_ids, *args, **kwargs: scored.extend(user_ids) or {})
+    monkeypatch.setattr(engine, 'get_candidate_index', lambda: [])
+    engine.user_cache[reader.id] = (5, [('0001', 0.9)])
+
+    engine.get_scored_recommendations([reader.id], 10)
+
+    assert scored == [reader.id]
+
+def test_export_needs_authentication(client):
+    assert client.get('/api/v1/recommendations/export').status_code == 401
+
+def test_export_forbidden_to_regular_users(client, login, reader):
+    login('reader')
+    assert client.get('/api/v1/recommendations/export').status_code == 403
+
+def test_export_allowed_with_api_token(app, client, reader, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_TOKEN', 'secret-token')
+    response = client.get('/api/v1/recommendations/export', headers={'Authorization': 'Bearer secret-token'})
+    assert response.status_code == 200
+    assert [record['user_id'] for record in map(json.loads, response.get_data(as_text=True).splitlines())] == [reader.id]
@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('httpx')
+pytest.importorskip('aiosqlite')
+
+from starlette.testclient import TestClient  # noqa: E402
+
+import asgi  # noqa: E402
+from catalog import BookCatalog  # noqa: E402
+from recommendation import ModelState  # noqa: E402
+
+@pytest.fixture
+def client(db):
+    # Not used as a context manager: the lifespan would shut down the shared scoring pool
+    return TestClient(asgi.application)
+
+@pytest.fixture
+def token(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_TOKEN', 'secret-token')
+    return {'Authorization': 'Bearer secret-token'}
+
+@pytest.fixture
+def states(app_module, monkeypatch):
+    """A live 'v1' model state, and a 'v2' one that reload() swaps in as a hot reload would."""
+    engine = app_module.recommendation_engine
+    old, new = ModelState('v1'), ModelState('v2')
+    for state in (old, new):
+        state.version = state.source
+        state.model = object()
+    monkeypatch.setattr(engine, '_state', old)
+
+    def _reload():
+        engine._state = new
+    return engine, _reload
+
+@pytest.fixture
+def reader(make_user):
+    return make_user('reader')
+
+def _url(user):
+    return f"/api/v1/users/{user.id}/recommendations"
+
+def test_recommendations_need_authentication(client, reader):
+    assert client.get(_url(reader)).status_code == 401
+
+def test_session_login_reads_own_recommendations_only(client, reader, make_user):
+    other = make_user('other')
+    # Log in through the Flask app mounted under the ASGI app; its session cookie is reused
+    client.post('/login', data={'username': 'reader', 'password': 'password'})
+
+    response = client.get(_url(reader))
+    assert response.status_code == 200
+    assert response.json()['user_id'] == reader.id
+    assert client.get(_url(other)).status_code == 403
+
+def test_unknown_user_with_token(client, token):
+    assert client.get('/api/v1/users/999999/recommendations', headers=token).status_code == 404
+
+def test_recommendations_report_the_version_that_scored_them(client, token, reader, states, monkeypatch):
+    engine, reload = states
+
+    def _score(user_ids, users, rated_isbns, books, top_n):
+        reload()
+        return {user_id: [(f"{engine.version}-book", 0.5)] for user_id in user_ids}
+    monkeypatch.setattr(engine, 'score_loaded_users', _score)
+
+    response = client.get(_url(reader), headers=token)
+
+    assert response.status_code == 200
+    assert response.json()['model_version'] == 'v1'
+    assert [item['isbn'] for item in response.json()['items']] == ['v1-book']
+    assert engine.version == 'v2'
+
+def test_similar_books_scan_the_catalog_off_the_event_loop(client, db, make_book, states, monkeypatch):
+    engine, reload = states
+    for isbn in ('0001', '0002', '0003'):
+        make_book(isbn)
+    catalog = BookCatalog()
+    catalog.load(db)
+    monkeypatch.setattr(asgi, 'get_catalog', lambda: catalog)
+    calls = []
+
+    def _rank(book, books, top_n):
+        calls.append((threading.current_thread().name, [other.isbn for other in books]))
+        reload()
+        return [other.isbn for other in books][:top_n]
+    monkeypatch.setattr(engine, 'rank_similar_books', _rank)
+
+    response = client.get('/api/v1/books/0002/similar?top_n=5')
+
+    assert response.status_code == 200
+    assert [item['isbn'] for item in response.json()['items']] == ['0001', '0003']
+    assert response.json()['model_version'] == 'v1'
+    assert calls == [(calls[0][0], ['0001', '0003'])]
+    assert calls[0][0].startswith('scoring')
+
+def test_similar_books_of_an_unknown_book(client):
+    assert client.get('/api/v1/books/missing/similar').status_code == 404
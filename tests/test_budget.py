@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from recommendation import COMPLETION_BACKLOG, COMPLETION_WORKERS
+
+BUDGET_MS = 200
+
+class TrackingPool(ThreadPoolExecutor):
+    """Completion pool remembering every future it was given, tagged with the stubbed tier it runs."""
+
+    def __init__(self, workers):
+        super().__init__(max_workers=workers)
+        self.futures = []
+
+    def submit(self, *args, **kwargs):
+        future = super().submit(*args, **kwargs)
+        # Engine calls are submitted as (_in_app_context, app, state, function, *args)
+        future.tier = getattr(args[3], 'tier', None) if len(args) > 3 else None
+        self.futures.append(future)
+        return future
+
+    def outstanding(self):
+        return sum(not future.done() for future in self.futures)
+
+@pytest.fixture
+def release():
+    """Set at teardown, so stubs blocked on it return."""
+    return threading.Event()
+
+@pytest.fixture
+def engine(app_module, db, monkeypatch, release):
+    """The app's engine with a stand-in model, stubbed tiers and a fresh completion pool."""
+    engine = app_module.recommendation_engine
+    state = engine._active_state()
+    monkeypatch.setattr(state, 'model', object())
+    monkeypatch.setattr(state, 'user_cache', {})
+    monkeypatch.setattr(state, 'pending_recommendations', {})
+    monkeypatch.setattr(engine, '_get_popular_books', lambda top_n: ['popular'])
+    monkeypatch.setattr(engine, '_completion_slots', threading.BoundedSemaphore(COMPLETION_BACKLOG))
+    _use_pool(monkeypatch, engine, COMPLETION_WORKERS)
+    yield engine
+    release.set()
+    engine._completions.shutdown(wait=True)
+
+def _use_pool(monkeypatch, engine, workers):
+    monkeypatch.setattr(engine, '_completions', TrackingPool(workers))
+
+def _tier(monkeypatch, engine, method, result, release, seconds=None):
+    """Stub a tier taking `seconds` (None: until the test ends)."""
+    def _slow(user_id, top_n):
+        release.wait(seconds)
+        return [result]
+    _slow.tier = result
+    monkeypatch.setattr(engine, method, _slow)
+
+def _timed(engine, user_id=1, budget_ms=BUDGET_MS):
+    start = time.perf_counter()
+    result = engine.recommend_within_budget(user_id, budget_ms, top_n=5)
+    return result, (time.perf_counter() - start) * 1000
+
+def test_model_answers_within_its_share(engine, monkeypatch, release):
+    _tier(monkeypatch, engine, '_score_user_for_cache', 'model', release, 0.01)
+    _tier(monkeypatch, engine, '_get_recommendations_fallback', 'cf', release, 0)
+
+    (isbns, tier, degraded), elapsed = _timed(engine)
+
+    assert (isbns, tier, degraded) == (['model'], 'model', False)
+    assert elapsed < BUDGET_MS
+
+def test_collaborative_filtering_answers_when_the_model_is_slow(engine, monkeypatch, release):
+    _tier(monkeypatch, engine, '_score_user_for_cache', 'model', release, 5)
+    _tier(monkeypatch, engine, '_get_recommendations_fallback', 'cf', release, 0.01)
+
+    (isbns, tier, degraded), elapsed = _timed(engine)
+
+    assert (isbns, tier, degraded) == (['cf'], 'collaborative_filtering', True)
+    assert BUDGET_MS * 0.7 <= elapsed < BUDGET_MS + 100
+
+def test_popular_books_answer_when_the_budget_is_spent(engine, monkeypatch, release):
+    _tier(monkeypatch, engine, '_score_user_for_cache', 'model', release, 5)
+    _tier(monkeypatch, engine, '_get_recommendations_fallback', 'cf', release, 5)
+
+    (isbns, tier, degraded), elapsed = _timed(engine)
+
+    assert (isbns, tier, degraded) == (['popular'], 'popular', True)
+    assert BUDGET_MS <= elapsed < BUDGET_MS + 100
+
+def test_timed_out_work_stays_bounded(engine, monkeypatch, release):
+    _tier(monkeypatch, engine, '_score_user_for_cache', 'model', release)
+    _tier(monkeypatch, engine, '_get_recommendations_fallback', 'cf', release)
+
+    for user_id in range(4 * COMPLETION_BACKLOG):
+        assert _timed(engine, user_id, budget_ms=20)[0] == (['popular'], 'popular', True)
+        assert engine._completions.outstanding() <= COMPLETION_BACKLOG
+
+    # Queued collaborative filtering calls were dropped; model scorings are kept for the cache
+    cancelled = {future.tier for future in engine._completions.futures if future.cancelled()}
+    assert cancelled == {'cf'}
+
+def test_short_budget_does_not_cancel_a_shared_model_scoring(app, engine, monkeypatch, release):
+    _tier(monkeypatch, engine, '_score_user_for_cache', 'model', release, 0.1)
+    _tier(monkeypatch, engine, '_get_recommendations_fallback', 'cf', release)
+    # Busy workers, so the model scoring is still queued when the short budget runs out
+    for _ in range(COMPLETION_WORKERS):
+        engine._completions.submit(time.sleep, 0.2)
+
+    results = {}
+
+    def _long_request():
+        with app.app_context():
+            results['long'] = engine.recommend_within_budget(1, 2000, top_n=5)
+
+    thread = threading.Thread(target=_long_request)
+    thread.start()
+    time.sleep(0.02)
+    results['short'] = engine.recommend_within_budget(1, 50, top_n=5)
+    thread.join()
+
+    assert results['short'] == (['popular'], 'popular', True)
+    assert results['long'] == (['model'], 'model', False)
+
+def test_backed_up_pool_is_skipped(engine, monkeypatch, release):
+    # Enough workers that nothing queues, so timed-out tasks keep running and can't be cancelled
+    _use_pool(monkeypatch, engine, 2 * COMPLETION_BACKLOG)
+    _tier(monkeypatch, engine, '_score_user_for_cache', 'model', release)
+    _tier(monkeypatch, engine, '_get_recommendations_fallback', 'cf', release)
+
+    for user_id in range(COMPLETION_BACKLOG // 2):
+        _timed(engine, user_id, budget_ms=20)
+    assert engine._completions.outstanding() == COMPLETION_BACKLOG
+
+    # Nothing more is submitted and the cheapest tier answers without waiting
+    for user_id in range(COMPLETION_BACKLOG, 2 * COMPLETION_BACKLOG):
+        (isbns, tier, degraded), elapsed = _timed(engine, user_id)
+        assert (isbns, tier, degraded) == (['popular'], 'popular', True)
+        assert elapsed < BUDGET_MS / 4
+    assert len(engine._completions.futures) == COMPLETION_BACKLOG
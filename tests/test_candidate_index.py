@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from candidate_index import CandidateIndex
+from catalog import BookCatalog
+from model_bundle import Vocabulary
+
+# Catalog order differs from ISBN code order, and two books are outside the vocabulary
+CATALOG_ISBNS = ['0000000009', 'c', 'x-unknown', 'a', 'y-unknown', 'b', 'd']
+VOCABULARY = ['a', 'b', 'c', 'd', 'e']
+
+@pytest.fixture
+def index(db, make_book):
+    for isbn in CATALOG_ISBNS:
+        make_book(isbn, author=f"Author {isbn}")
+    catalog = BookCatalog()
+    catalog.load(db)
+    return CandidateIndex.build(catalog, {'isbn': Vocabulary.from_values(np.array(VOCABULARY))})
+
+def test_index_holds_in_vocabulary_books_in_code_order(index):
+    assert index.isbns.tolist() == ['a', 'b', 'c', 'd']
+    assert index.codes.tolist() == [0, 1, 2, 3]
+    # Catalog rows of those books
+    assert index.rows.tolist() == [3, 5, 1, 6]
+
+def test_unrated_positions_index_the_candidate_arrays(index):
+    positions = index.unrated_positions({'b', 'd'})
+
+    assert positions.tolist() == [0, 2]
+    assert index.isbns[positions].tolist() == ['a', 'c']
+    assert index.features['isbn'][positions].tolist() == [0, 2]
+
+def test_unrated_positions_ignore_unknown_and_out_of_index_isbns(index):
+    # 'e' is in the vocabulary but not the catalog; the others are in neither
+    assert index.unrated_positions({'e', 'x-unknown', 'zzz'}).tolist() == [0, 1, 2, 3]
+    assert index.unrated_positions(set()).tolist() == [0, 1, 2, 3]
+
+def test_all_rated_leaves_no_positions(index):
+    assert index.unrated_positions({'a', 'b', 'c', 'd'}).tolist() == []
+
+def test_feature_columns_follow_positions_per_user(index):
+    columns = index.feature_columns([(np.array([0, 3]), 7, 1), (np.array([2]), 9, 4)])
+
+    assert columns['isbn'].tolist() == [0, 3, 2]
+    assert columns['user_id'].tolist() == [7, 7, 9]
+    assert columns['age_bin'].tolist() == [1, 1, 4]
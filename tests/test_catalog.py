@@ -0,0 +1,62 @@
+import pytest
+
+import catalog as catalog_module
+from catalog import BookCatalog
+
+@pytest.fixture
+def books(make_book):
+    return [make_book(isbn) for isbn in ('0001', '0002', '0003')]
+
+@pytest.fixture
+def catalog(db, books):
+    catalog = BookCatalog()
+    catalog.load(db)
+    return catalog
+
+def _rate(db, catalog, book, avg_rating):
+    book.avg_rating = avg_rating
+    db.session.commit()
+    catalog.update_book(book)
+
+def test_nothing_changed_since_the_current_version(catalog):
+    assert catalog.changes_since(catalog.version) == (False, set())
+
+def test_updates_and_appends_are_merged_in_order(db, catalog, books, make_book):
+    loaded = catalog.version
+
+    _rate(db, catalog, books[1], 8.0)
+    after_update = catalog.version
+    make_book('0004')
+    catalog.refresh(db)
+    _rate(db, catalog, books[2], 6.0)
+
+    assert catalog.version == loaded + 3
+    assert catalog.changes_since(loaded) == (True, {1, 2})
+    assert catalog.changes_since(after_update) == (True, {2})
+    assert catalog.changes_since(after_update + 1) == (False, {2})
+    assert catalog.changes_since(catalog.version) == (False, set())
+
+def test_refresh_without_changes_keeps_the_version(db, catalog):
+    version = catalog.version
+    assert catalog.refresh(db) == (0, 0)
+    assert catalog.version == version
+
+def test_versions_before_a_full_load_are_a_gap(db, catalog, books):
+    before = catalog.version
+    _rate(db, catalog, books[0], 9.0)
+    catalog.load(db)
+
+    assert catalog.changes_since(before) is None
+    assert catalog.changes_since(catalog.version) == (False, set())
+
+def test_versions_trimmed_from_the_log_are_a_gap(db, catalog, books, monkeypatch):
+    monkeypatch.setattr(catalog_module, 'MAX_CHANGES', 3)
+    loaded = catalog.version
+    for value in range(5):
+        _rate(db, catalog, books[value % 3], float(value))
+
+    # Only the last three changes are kept: the two before them are gone
+    assert catalog.changes_since(loaded) is None
+    assert catalog.changes_since(loaded + 1) is None
+    assert catalog.changes_since(loaded + 2) == (False, {0, 1, 2})
+    assert catalog.changes_since(loaded + 4) == (False, {1})
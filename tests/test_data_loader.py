@@ -0,0 +1,111 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import data_loader
+from models import Book, Rating, User
+
+BOOKS_CSV = '''"ISBN";"Book-Title";"Book-Author";"Year-Of-Publication";"Publisher";"Image-URL-S";"Image-URL-M";"Image-URL-L"
+"0001";"Pride; and Prejudice";"Jane Austen";"1813";"Penguin";"s";"m";"l"
+"0002";"Anna Karenina";"Leo Tolstoy";"1878";"Vintage";"s";"m";"l"
+"";"No ISBN";"Nobody";"2000";"None";"s";"m";"l"
+'''
+
+USERS_CSV = '''"User-ID";"Location";"Age"
+"7";"york, england";"34"
+"9";"moscow, russia";"NULL"
+"11";"paris, france";"130"
+'''
+
+RATINGS_CSV = '''"User-ID";"ISBN";"Book-Rating"
+"7";"0001";"8"
+"7";"0001";"3"
+"9";"0001";"6"
+"9";"0002";"0"
+"9";"9999";"5"
+"42";"0002";"7"
+"7";"0002";"ten"
+'''
+
+class FakeCursor:
+    """DB-API cursor recording COPY calls."""
+
+    def __init__(self, copies):
+        self.copies = copies
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def copy_expert(self, statement, buffer):
+        self.copies.append((statement, buffer.read()))
+
+def _postgresql_db(copies):
+    """Just enough of a Flask-SQLAlchemy db on PostgreSQL for the bulk-load helpers."""
+    connection = SimpleNamespace(cursor=lambda: FakeCursor(copies))
+    return SimpleNamespace(
+        engine=SimpleNamespace(dialect=postgresql.dialect()),
+        session=SimpleNamespace(connection=lambda: SimpleNamespace(
+            connection=SimpleNamespace(dbapi_connection=connection))),
+    )
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    """A working directory with a small dataset/ of BX CSV files."""
+    (tmp_path / 'dataset').mkdir()
+    for name, content in (('BX_Books.csv', BOOKS_CSV), ('BX-Users.csv', USERS_CSV),
+                          ('BX-Book-Ratings.csv', RATINGS_CSV)):
+        (tmp_path / 'dataset' / name).write_text(content, encoding='ISO-8859-1')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.mark.parametrize('value, expected', [
+    (None, '\\N'),
+    (7, '7'),
+    ('tab\there', 'tab\\there'),
+    ('two\nlines\r', 'two\\nlines\\r'),
+    ('C:\\books', 'C:\\\\books'),
+    (datetime(2024, 5, 1, 12, 30), '2024-05-01T12:30:00'),
+])
+def test_copy_value_escapes_text_format(value, expected):
+    assert data_loader._copy_value(value) == expected
+
+def test_postgresql_rows_are_copied_in_one_statement():
+    copies = []
+    rows = [{'isbn': '0001', 'title': 'A\tB', 'author': None},
+            {'isbn': '0002', 'title': 'C', 'author': 'D'}]
+
+    data_loader._insert_rows(_postgresql_db(copies), Book, rows)
+
+    assert copies == [('COPY book (isbn, title, author) FROM STDIN',
+                       '0001\tA\\tB\t\\N\n0002\tC\tD\n')]
+
+def test_postgresql_batches_are_larger():
+    assert data_loader._batch_size(_postgresql_db([]), 1000) == 20000
+
+def test_csv_import(app, db, dataset, monkeypatch):
+    # Small batches, so the batched and the remainder inserts both run
+    monkeypatch.setattr(data_loader, '_batch_size', lambda db, default: 1)
+
+    data_loader.load_books(db)
+    data_loader.load_users(db)
+    data_loader.load_ratings(db)
+    data_loader.update_book_ratings(db)
+    db.session.commit()
+
+    books = {book.isbn: book for book in Book.query}
+    assert set(books) == {'0001', '0002'}
+    assert books['0001'].title == 'Pride; and Prejudice'
+
+    ages = {user.id: user.age for user in User.query}
+    assert ages == {7: 34, 9: None, 11: None}
+
+    # Zero ratings, unknown users or books, duplicates and unparsable values are skipped
+    ratings = {(rating.user_id, rating.isbn): rating.rating for rating in Rating.query}
+    assert ratings == {(7, '0001'): 8, (9, '0001'): 6}
+    assert (books['0001'].avg_rating, books['0001'].num_ratings) == (7.0, 2)
+    assert (books['0002'].avg_rating, books['0002'].num_ratings) == (0.0, 0)
@@ -0,0 +1,67 @@
+import math
+
+import pytest
+
+from evaluation import ranking_metrics
+
+def _reference_metrics(recommended, relevant, k, catalog_size):
+    """The metrics computed one user at a time, as in their definitions."""
+    precision, recall, ndcg, hit_rate = [], [], [], []
+    for user_id, ranked in recommended.items():
+        ranked = ranked[:k]
+        gains = [1.0 if isbn in relevant[user_id] else 0.0 for isbn in ranked]
+        hits = sum(gains)
+        dcg = sum(gain / math.log2(rank + 2) for rank, gain in enumerate(gains))
+        idcg = sum(1.0 / math.log2(rank + 2) for rank in range(min(len(relevant[user_id]), k)))
+        precision.append(hits / k)
+        recall.append(hits / len(relevant[user_id]))
+        ndcg.append(dcg / idcg)
+        hit_rate.append(1.0 if hits else 0.0)
+
+    distinct = {isbn for ranked in recommended.values() for isbn in ranked[:k]}
+    return {
+        f'precision@{k}': sum(precision) / len(precision),
+        f'recall@{k}': sum(recall) / len(recall),
+        f'ndcg@{k}': sum(ndcg) / len(ndcg),
+        f'hit_rate@{k}': sum(hit_rate) / len(hit_rate),
+        'coverage': len(distinct) / catalog_size,
+    }
+
+def test_hand_computed_example():
+    recommended = {1: ['a', 'b', 'c'], 2: ['c', 'd', 'e']}
+    relevant = {1: {'a', 'c'}, 2: {'x'}}
+
+    metrics = ranking_metrics(recommended, relevant, k=3, catalog_size=10)
+
+    assert metrics['precision@3'] == pytest.approx((2 / 3 + 0) / 2)
+    assert metrics['recall@3'] == pytest.approx((1.0 + 0) / 2)
+    ndcg_user_1 = (1 + 1 / math.log2(4)) / (1 + 1 / math.log2(3))
+    assert metrics['ndcg@3'] == pytest.approx(ndcg_user_1 / 2)
+    assert metrics['hit_rate@3'] == pytest.approx(0.5)
+    assert metrics['coverage'] == pytest.approx(5 / 10)
+
+def test_matches_per_user_reference():
+    recommended = {
+        1: ['a', 'b', 'c', 'd', 'e'],
+        2: ['e', 'f'],
+        3: ['g', 'a', 'h', 'i', 'b', 'j'],
+        4: [],
+    }
+    relevant = {1: {'e', 'b'}, 2: {'f', 'z', 'y'}, 3: {'a', 'b', 'j'}, 4: {'a'}}
+
+    for k in (1, 3, 5):
+        metrics = ranking_metrics(recommended, relevant, k=k, catalog_size=20)
+        expected = _reference_metrics(recommended, relevant, k, 20)
+        assert metrics == pytest.approx(expected)
+
+def test_items_shared_across_users_count_per_user():
+    # The same ISBN is a hit only for the users it is relevant to
+    recommended = {1: ['a', 'b'], 2: ['a', 'b']}
+    relevant = {1: {'a'}, 2: {'b'}}
+
+    metrics = ranking_metrics(recommended, relevant, k=2, catalog_size=2)
+
+    assert metrics['precision@2'] == pytest.approx(0.5)
+    assert metrics['recall@2'] == pytest.approx(1.0)
+    assert metrics['ndcg@2'] == pytest.approx((1.0 + 1 / math.log2(3)) / 2)
+    assert metrics['coverage'] == pytest.approx(1.0)
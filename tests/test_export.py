@@ -0,0 +1,33 @@
+import itertools
+
+from export import iter_recommendation_records
+from recommendation import ModelState
+
+class SwappingEngine:
+    """Engine stand-in whose model version changes after every chunk."""
+
+    def __init__(self):
+        self.versions = itertools.count(1)
+
+    def get_versioned_recommendations(self, user_ids, top_n=24, use_cache=True):
+        version = f"v{next(self.versions)}"
+        return version, {user_id: [(f"{version}-{user_id}", 0.5)] for user_id in user_ids}
+
+def test_records_carry_the_version_that_scored_their_chunk(app, db, make_user):
+    users = [make_user(f"reader{i}") for i in range(5)]
+
+    records = list(iter_recommendation_records(app, db, SwappingEngine(), chunk_size=2))
+
+    assert [record['user_id'] for record in records] == [user.id for user in users]
+    assert [record['model_version'] for record in records] == ['v1', 'v1', 'v2', 'v2', 'v3']
+    for record in records:
+        assert record['items'][0]['isbn'] == f"{record['model_version']}-{record['user_id']}"
+
+def test_engine_version_follows_the_pinned_state(app_module):
+    engine = app_module.recommendation_engine
+    state = ModelState(source='pinned')
+    state.version = 'pinned-version'
+
+    with engine._using_state(state):
+        assert engine.version == 'pinned-version'
+    assert engine.version == engine._state.version
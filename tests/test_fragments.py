@@ -0,0 +1,96 @@
+import re
+
+import pytest
+
+from catalog import BookCatalog
+
+@pytest.fixture
+def engine(app_module, monkeypatch):
+    """The app's engine with recommendations stubbed: engine.recommended[user_id] = [isbn, ...]."""
+    engine = app_module.recommendation_engine
+    engine.recommended = {}
+
+    def _recommendations(user_id, top_n=24, **kwargs):
+        return engine.recommended[user_id]
+
+    monkeypatch.setattr(engine, 'get_recommendations_for_user', _recommendations)
+    yield engine
+    del engine.recommended
+
+@pytest.fixture
+def shelf(app_module, db, make_book, monkeypatch):
+    """Twenty books, also in the catalog the recommendations are displayed from; later ones are newer and rated lower."""
+    books = [make_book(f"{index:04d}", avg_rating=float(20 - index)) for index in range(20)]
+    catalog = BookCatalog()
+    catalog.load(db)
+    monkeypatch.setattr(app_module, 'get_catalog', lambda: catalog)
+    return books
+
+def _titles(response):
+    return re.findall(r'<h5 class="card-title">(.*?)</h5>', response.get_data(as_text=True))
+
+def test_home_page_does_not_wait_for_the_engine(client, login, make_user, engine):
+    make_user('reader')
+    login('reader')
+
+    response = client.get('/')
+
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    for section in ('recommended', 'popular', 'recent'):
+        assert f'data-fragment-url="/fragments/{section}"' in html
+    assert 'book-card' not in html
+
+def test_popular_and_recent_sections(client, shelf):
+    popular = client.get('/fragments/popular')
+    recent = client.get('/fragments/recent')
+
+    assert _titles(popular) == [f"Title {index:04d}" for index in range(12)]
+    assert _titles(recent) == [f"Title {index:04d}" for index in range(19, 11, -1)]
+    for response in (popular, recent):
+        assert response.headers['Cache-Control'] == 'public, max-age=300'
+
+def test_unchanged_fragment_is_not_modified(client, shelf):
+    etag = client.get('/fragments/popular').headers['ETag']
+
+    response = client.get('/fragments/popular', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+def test_recommended_section_for_a_reader(client, login, make_user, shelf, engine):
+    user = make_user('reader')
+    login('reader')
+    engine.recommended[user.id] = ['0007', '0003', 'unknown', '0011']
+
+    response = client.get('/fragments/recommended')
+
+    assert _titles(response) == ['Title 0007', 'Title 0003', 'Title 0011']
+    assert response.headers['Cache-Control'] == 'private, max-age=60'
+    assert 'Cookie' in response.headers['Vary']
+
+def test_recommended_section_falls_back_to_top_rated(client, login, make_user, shelf, engine):
+    top_rated = [f"Title {index:04d}" for index in range(8)]
+
+    # Anonymous visitors, and readers the engine fails for
+    assert _titles(client.get('/fragments/recommended')) == top_rated
+    make_user('reader')
+    login('reader')
+    assert _titles(client.get('/fragments/recommended')) == top_rated
+
+def test_unknown_section_is_not_found(client):
+    assert client.get('/fragments/everything').status_code == 404
+
+def test_infinite_scroll_follows_next_urls_through_the_filtered_catalog(client, make_book):
+    for index in range(60):
+        make_book(f"{index:04d}", author='Jane Austen' if index % 2 else 'Leo Tolstoy')
+
+    titles, url = [], '/fragments/books?author=austen'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'public, max-age=60'
+        titles.extend(_titles(response))
+        url = response.headers.get('X-Next-Url')
+
+    assert titles == [f"Title {index:04d}" for index in range(1, 60, 2)]
@@ -0,0 +1,88 @@
+import json
+import random
+
+import pytest
+
+import loadtest
+import synthetic_data
+from loadtest import SessionPlan, _percentile, replay_session, summarize_samples
+from models import Rating
+
+@pytest.fixture
+def plan(app, db, monkeypatch, make_user, make_book):
+    """Synthetic users (with the test password) and a few books to replay sessions against."""
+    monkeypatch.setattr(synthetic_data, 'SYNTHETIC_PASSWORD', 'password')
+    for index in range(3):
+        make_user(synthetic_data.USERNAME_FORMAT.format(index))
+    make_user('someone_else')
+    for index in range(5):
+        make_book(f"{index:04d}", title=f"The Dune Messiah {index}", num_ratings=index)
+    return SessionPlan(db)
+
+def test_plan_draws_from_synthetic_users_and_rated_books(plan):
+    assert plan.usernames == [synthetic_data.USERNAME_FORMAT.format(index) for index in range(3)]
+    assert plan.isbns == ['0004', '0003', '0002', '0001', '0000']
+    assert plan.search_terms == ['Dune', 'Messiah']
+
+def test_session_logs_in_browses_and_rates(app, plan):
+    rng = random.Random(3)
+    session = loadtest.TestClientTransport(app).new_session()
+
+    samples = replay_session(session, plan, rng)
+
+    statuses = {}
+    for route, status, seconds in samples:
+        statuses.setdefault(route, set()).add(status)
+        assert seconds >= 0
+    # A failed login would render the form again with 200 instead of redirecting
+    assert statuses.pop('login') == {302}
+    assert statuses.pop('logout') == {302}
+    assert statuses.pop('rate_book', {302}) == {302}
+    assert set(statuses) == {'login_form', 'index', 'section_fragment', 'books', 'books_search',
+                             'book_details', 'profile'}
+    assert all(status == {200} for status in statuses.values())
+
+def test_sessions_are_reproducible_from_their_seed(app, plan, db):
+    routes = []
+    for _ in range(2):
+        samples = replay_session(loadtest.TestClientTransport(app).new_session(), plan, random.Random(7))
+        routes.append([route for route, _, _ in samples])
+        db.session.query(Rating).delete()
+        db.session.commit()
+    assert routes[0] == routes[1]
+
+def test_percentiles_and_summary():
+    values = [float(value) for value in range(1, 101)]
+    assert [_percentile(values, percent) for percent in (50, 95, 99, 100)] == [50.0, 95.0, 99.0, 100.0]
+    assert _percentile([7.0], 99) == 7.0
+
+    samples = [('books', 200, 0.010), ('books', 500, 0.030), ('books', 0, 0.020), ('index', 200, 0.005)]
+    summary = summarize_samples(samples, elapsed=2.0)
+
+    assert summary['books'] == {'requests': 3, 'errors': 2, 'throughput_rps': 1.5, 'p50_ms': 20.0,
+                                'p95_ms': 30.0, 'p99_ms': 30.0, 'mean_ms': 20.0}
+    assert summary['index']['errors'] == 0
+
+def test_load_test_command_saves_results_and_flags_regressions(app, plan, tmp_path):
+    runner = app.test_cli_runner()
+    output = tmp_path / 'run.json'
+
+    result = runner.invoke(args=['load-test', '--sessions', '4', '--concurrency', '2', '--output', str(output)])
+
+    assert result.exit_code == 0, result.output
+    saved = json.loads(output.read_text())
+    assert saved['totals']['requests'] == sum(route['requests'] for route in saved['results'].values())
+    assert saved['totals']['errors'] == 0
+    assert saved['environment']['sessions'] == 4
+    assert {'p50_ms', 'p95_ms', 'p99_ms'} <= set(saved['results']['book_details'])
+
+    # Against a baseline where every route was far faster, the run counts as a regression
+    for route in saved['results'].values():
+        route['p95_ms'] /= 1000
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps(saved))
+    result = runner.invoke(args=['load-test', '--sessions', '2', '--concurrency', '2',
+                                 '--output', str(tmp_path / 'again.json'), '--baseline', str(baseline)])
+
+    assert result.exit_code == 1
+    assert 'REGRESSION' in result.output
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from metrics import REQUEST_LATENCY, Counter, Histogram, Registry
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+def test_counter_samples_per_label_set(registry):
+    counter = Counter('things', 'Things seen.', labelnames=('kind',), registry=registry)
+    counter.inc(kind='b')
+    counter.inc(3, kind='a')
+    counter.inc(kind='b')
+
+    assert counter.value(kind='b') == 2
+    assert counter.value(kind='never') == 0
+    assert registry.render() == (
+        '# HELP things_total Things seen.\n'
+        '# TYPE things_total counter\n'
+        'things_total{kind="a"} 3\n'
+        'things_total{kind="b"} 2\n'
+    )
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = Histogram('latency', 'Latency.', buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.count() == 4
+    assert histogram.samples() == [
+        'latency_bucket{le="0.1"} 2',
+        'latency_bucket{le="1.0"} 3',
+        'latency_bucket{le="+Inf"} 4',
+        'latency_sum 3.65',
+        'latency_count 4',
+    ]
+
+def test_histogram_times_blocks_that_raise(registry):
+    histogram = Histogram('stage', 'Stage.', labelnames=('stage',), registry=registry)
+
+    with pytest.raises(ValueError):
+        with histogram.time(stage='predict'):
+            raise ValueError
+
+    assert histogram.count(stage='predict') == 1
+
+def test_label_values_are_escaped(registry):
+    counter = Counter('odd', 'Odd labels.', labelnames=('value',), registry=registry)
+    counter.inc(value='say "hi"\\\n')
+
+    assert counter.samples() == ['odd_total{value="say \\"hi\\"\\\\\\n"} 1']
+
+def test_concurrent_increments_are_not_lost(registry):
+    counter = Counter('hits', 'Hits.', registry=registry)
+    histogram = Histogram('waits', 'Waits.', registry=registry)
+
+    def _work():
+        for _ in range(1000):
+            counter.inc()
+            histogram.observe(0.01)
+
+    threads = [threading.Thread(target=_work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.value() == 8000
+    assert histogram.count() == 8000
+
+def test_requests_are_observed_per_route(client, make_book):
+    make_book('0001')
+    before = REQUEST_LATENCY.count(route='/book/<isbn>', method='GET', status=200)
+
+    client.get('/book/0001')
+    response = client.get('/metrics')
+
+    assert REQUEST_LATENCY.count(route='/book/<isbn>', method='GET', status=200) == before + 1
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    body = response.get_data(as_text=True)
+    assert '# TYPE booksite_request_duration_seconds histogram' in body
+    assert 'booksite_request_duration_seconds_count{route="/book/<isbn>",method="GET",status="200"}' in body
+    assert '/book/0001' not in body
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from model_bundle import Vocabulary
+
+ISBNS = ['0002005018', '0060973129', '0374157065', '0393045218', '080652121X']
+
+@pytest.fixture
+def strings():
+    return Vocabulary.from_values(np.array(ISBNS))
+
+@pytest.fixture
+def integers():
+    return Vocabulary.from_values(np.array([3, 8, 15, 42, 1000]))
+
+def test_string_codes_of_known_values(strings):
+    assert strings.encode_many(ISBNS).tolist() == list(range(len(ISBNS)))
+    assert strings.encode_many(reversed(ISBNS)).tolist() == list(reversed(range(len(ISBNS))))
+
+def test_string_unknown_values_get_the_default(strings):
+    unknown = [
+        '0000000000',  # Before the first value
+        '9999999999',  # After the last value
+        '0060973130',  # Between two values
+        '006097312',  # Prefix of a value
+        '0060973129X',  # Value plus a suffix, longer than any value
+        '',
+        None,
+        12345,
+    ]
+    assert strings.encode_many(unknown, default=-1).tolist() == [-1] * len(unknown)
+    assert strings.encode_many(unknown).tolist() == [0] * len(unknown)
+
+def test_string_codes_match_encode(strings):
+    values = ISBNS + ['0060973130', '0060973129X', '', None, 'ünïcode']
+    assert strings.encode_many(values, default=-1).tolist() == [strings.encode(value, default=-1) for value in values]
+
+def test_integer_codes_and_unknown_values(integers):
+    values = [3, '42', 1000, 0, 9, 1001, -5, None, 'abc', 15.0]
+    assert integers.encode_many(values, default=-1).tolist() == [0, 3, 4, -1, -1, -1, -1, -1, -1, 2]
+    assert integers.encode_many(values, default=-1).tolist() == [integers.encode(value, default=-1) for value in values]
+
+def test_empty_inputs(strings):
+    assert strings.encode_many([]).dtype == np.int64
+    assert strings.encode_many([]).tolist() == []
+    assert Vocabulary.from_values(np.array([], dtype=np.int64)).encode_many([1, 2], default=7).tolist() == [7, 7]
+
+def test_vocabulary_containing_the_empty_string():
+    vocabulary = Vocabulary.from_values(np.array(['', 'Penguin', 'Vintage']))
+    values = ['', 'Penguin', 'Vintage', 'Zebra', None]
+    assert vocabulary.encode_many(values, default=-1).tolist() == [vocabulary.encode(value, default=-1)
+                                                                   for value in values]
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pytest
+
+from model_bundle import Vocabulary, version_bundle_path, write_bundle
+from recommendation import ModelState
+
+@pytest.fixture
+def engine(app_module, db, monkeypatch, tmp_path):
+    """The app's engine serving version 'v1' (a stand-in model), watching an empty versions directory."""
+    engine = app_module.recommendation_engine
+    old = ModelState(source='v1.bundle')
+    old.version = 'v1'
+    old.model = object()
+    monkeypatch.setattr(engine, '_state', old)
+    monkeypatch.setattr(engine, 'versions_dir', str(tmp_path))
+    monkeypatch.setattr(engine, 'previous_version', None)
+    monkeypatch.setattr(engine, 'last_reload_error', None)
+    monkeypatch.setattr(engine, '_failed_versions', set())
+    monkeypatch.setattr(engine, 'get_candidate_index', lambda: [])
+    return engine
+
+def _publish(versions_dir, version):
+    path = version_bundle_path(version, versions_dir)
+    write_bundle(path, {'isbn': Vocabulary.from_values(np.arange(3))}, model_version=version)
+    return path
+
+def test_call_in_flight_finishes_on_the_old_version(app, engine, monkeypatch, make_user):
+    user = make_user('reader')
+    old = engine._state
+    seen = []
+
+    def _score(user_ids, users, rated_isbns, books, top_n, use_cache):
+        # A new version is published and swapped in while this call is scoring
+        seen.append(engine._active_state())
+        _publish(engine.versions_dir, 'v2')
+        assert engine.reload_if_changed()
+        seen.append(engine._active_state())
+        return {user_id: [(engine.version, 0.5)] for user_id in user_ids}
+
+    monkeypatch.setattr(engine, 'score_loaded_users', _score)
+
+    version, results = engine.get_versioned_recommendations([user.id], top_n=5)
+
+    assert seen == [old, old]
+    assert (version, results) == ('v1', {user.id: [('v1', 0.5)]})
+    # Later calls are served by the new version
+    assert engine._state is not old
+    assert engine.version == 'v2'
+    assert engine.status()['previous_version'] == 'v1'
+
+def test_broken_version_keeps_the_live_one(engine):
+    path = version_bundle_path('v2', engine.versions_dir)
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as bundle:
+        bundle.write(b'not a bundle')
+    live = engine._state
+
+    assert not engine.reload_if_changed()
+    assert engine._state is live
+    assert engine.status()['last_reload_error']
+    # Not retried on the next poll
+    assert not engine.reload_if_changed()
@@ -0,0 +1,111 @@
+import pytest
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_paginate
+
+# avg_rating with ties, so the id tie-breaker decides the order within them
+RATINGS = [7.5, 9.0, 7.5, 7.5, 3.0, 9.0, 0.0, 7.5, 5.25, 0.0, 7.5]
+
+@pytest.fixture
+def books(make_book):
+    return [make_book(f"isbn-{index:02d}", avg_rating=rating) for index, rating in enumerate(RATINGS)]
+
+def _book_query():
+    from models import Book
+    return Book.query
+
+def _walk_forward(sort, per_page):
+    pages, after = [], None
+    while True:
+        page = keyset_paginate(_book_query(), sort=sort, after=after, per_page=per_page)
+        pages.append([book.id for book in page.items])
+        if not page.has_next:
+            return pages
+        after = page.next_cursor
+
+@pytest.mark.parametrize('values', [[1], [7.5, 42], [0.0, 1], ['a b/c', 3]])
+def test_cursor_round_trip(values):
+    cursor = encode_cursor(values)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == values
+
+@pytest.mark.parametrize('cursor', ['', 'not-base64!', encode_cursor({'id': 1}), 'e30',
+                                    encode_cursor([None]), encode_cursor([True]), encode_cursor([[1], 2]),
+                                    encode_cursor([{'id': 1}]), encode_cursor([float('nan')])])
+def test_malformed_cursor_decodes_to_none(cursor):
+    assert decode_cursor(cursor) is None
+
+@pytest.mark.parametrize('sort', ['id', 'rating'])
+@pytest.mark.parametrize('per_page', [1, 3, 4, 11, 20])
+def test_forward_pages_cover_every_book_once_in_order(books, sort, per_page):
+    if sort == 'rating':
+        expected = [book.id for book in sorted(books, key=lambda book: (book.avg_rating, book.id), reverse=True)]
+    else:
+        expected = sorted(book.id for book in books)
+
+    pages = _walk_forward(sort, per_page)
+
+    assert [book_id for page in pages for book_id in page] == expected
+    assert all(len(page) == per_page for page in pages[:-1])
+
+@pytest.mark.parametrize('per_page', [2, 3, 5])
+def test_backward_pages_retrace_forward_pages_across_rating_ties(books, per_page):
+    forward = _walk_forward('rating', per_page)
+
+    # Walk back from the last page with each page's "previous" cursor
+    page = keyset_paginate(_book_query(), sort='rating', after=None, per_page=per_page)
+    while page.has_next:
+        page = keyset_paginate(_book_query(), sort='rating', after=page.next_cursor, per_page=per_page)
+    backward = [[book.id for book in page.items]]
+    while page.has_prev:
+        page = keyset_paginate(_book_query(), sort='rating', before=page.prev_cursor, per_page=per_page)
+        backward.append([book.id for book in page.items])
+
+    assert backward[::-1] == forward
+
+def test_first_page_has_no_previous_and_last_page_has_no_next(books):
+    first = keyset_paginate(_book_query(), sort='rating', per_page=len(RATINGS))
+    assert not first.has_prev
+    assert not first.has_next
+
+@pytest.mark.parametrize('sort, cursor', [
+    ('rating', encode_cursor([1])),          # a cursor of the 'id' order
+    ('id', encode_cursor([7.5, 1])),         # a cursor of the 'rating' order
+    ('id', encode_cursor(['1'])),            # a string compared with an integer column
+    ('rating', encode_cursor([7.5, 1.5])),   # a float compared with the id
+    ('id', 'not-base64!'),
+])
+def test_cursor_not_made_for_the_sort_order_is_rejected(books, sort, cursor):
+    with pytest.raises(InvalidCursor):
+        keyset_paginate(_book_query(), sort=sort, after=cursor, per_page=3)
+    with pytest.raises(InvalidCursor):
+        keyset_paginate(_book_query(), sort=sort, before=cursor, per_page=3)
+
+@pytest.mark.parametrize('path', ['/books?after=bm9wZQ', '/books?sort=rating&before=WzFd',
+                                  '/fragments/books?after=W251bGxd'])
+def test_bad_cursor_is_a_bad_request(client, books, path):
+    assert client.get(path).status_code == 400
+
+def test_books_cannot_have_a_null_rating_to_sort_on(db):
+    from sqlalchemy import text
+    from sqlalchemy.exc import IntegrityError
+
+    # A NULL sort key compares as neither before nor after a cursor, so its book would never be listed
+    with pytest.raises(IntegrityError):
+        db.session.execute(text("INSERT INTO book (isbn, title, avg_rating) VALUES ('unrated', 'Unrated', NULL)"))
+    db.session.rollback()
+
+@pytest.mark.parametrize('filters', [{'author': 'austen'}, {'publisher': 'Penguin'}, {'year': '1813'},
+                                     {'year': '181'}, {'author': 'nobody'}])
+def test_approximate_count_matches_the_listing(app_module, db, make_book, filters):
+    from facets import refresh_facets
+    from pagination import approximate_book_count
+
+    for isbn, author, publisher, year in [('1', 'Jane Austen', 'Penguin Classics', '1813'),
+                                          ('2', 'Austen Jones', 'Penguin', '1815'),
+                                          ('3', 'Leo Tolstoy', 'Vintage', '1813')]:
+        make_book(isbn, author=author, publisher=publisher, year_of_publication=year)
+    refresh_facets(db)
+
+    listed = app_module._filtered_books(**filters)[0].count()
+
+    assert approximate_book_count(db, **filters) == (listed or None)
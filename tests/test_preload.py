@@ -0,0 +1,91 @@
+import gc
+import logging
+import os
+import runpy
+from types import SimpleNamespace
+
+import pytest
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+@pytest.fixture
+def calls(app_module, monkeypatch):
+    """Record the fork hooks of the app instead of running them."""
+    calls = []
+    monkeypatch.setattr(app_module, 'prepare_for_fork', lambda: calls.append('prepare_for_fork'))
+    monkeypatch.setattr(app_module, 'init_forked_worker', lambda: calls.append('init_forked_worker'))
+    return calls
+
+def _config(monkeypatch, preload):
+    monkeypatch.setenv('PRELOAD_APP', '1' if preload else '0')
+    # Set, then removed, so the default the config file writes is undone at teardown
+    monkeypatch.setenv('MODEL_QUANTIZATION', 'unset')
+    monkeypatch.delenv('MODEL_QUANTIZATION')
+    return runpy.run_path(CONFIG_PATH)
+
+def _server(preload_app):
+    return SimpleNamespace(cfg=SimpleNamespace(preload_app=preload_app), log=logging.getLogger('gunicorn.test'))
+
+def test_preloading_serves_the_numpy_scorer(monkeypatch):
+    config = _config(monkeypatch, preload=True)
+    assert config['preload_app'] is True
+    assert os.environ['MODEL_QUANTIZATION'] == 'float32'
+
+def test_without_preloading_nothing_changes(monkeypatch):
+    config = _config(monkeypatch, preload=False)
+    assert config['preload_app'] is False
+    assert 'MODEL_QUANTIZATION' not in os.environ
+
+def test_hooks_prepare_the_master_and_start_each_worker(app, calls, monkeypatch):
+    config = _config(monkeypatch, preload=True)
+    monkeypatch.setitem(app.config, 'PRELOAD_APP', True)
+
+    config['when_ready'](_server(preload_app=True))
+    config['post_fork'](_server(preload_app=True), worker=None)
+
+    assert calls == ['prepare_for_fork', 'init_forked_worker']
+
+def test_hooks_do_nothing_without_preload(app, calls, monkeypatch):
+    config = _config(monkeypatch, preload=False)
+
+    config['when_ready'](_server(preload_app=False))
+    config['post_fork'](_server(preload_app=False), worker=None)
+
+    assert calls == []
+
+def test_preload_flag_without_preload_app_only_warns(app, calls, monkeypatch, caplog):
+    # gunicorn --preload with an app that already started its threads in the master
+    config = _config(monkeypatch, preload=True)
+    monkeypatch.setitem(app.config, 'PRELOAD_APP', False)
+
+    with caplog.at_level(logging.WARNING, logger='gunicorn.test'):
+        config['when_ready'](_server(preload_app=True))
+        config['post_fork'](_server(preload_app=True), worker=None)
+
+    assert calls == []
+    assert 'PRELOAD_APP=1' in caplog.text
+
+def test_prepare_for_fork_closes_connections_and_freezes_objects(app_module, db):
+    db.session.execute(db.text('SELECT 1'))
+    db.session.commit()
+    assert db.engine.pool.checkedin() > 0
+
+    try:
+        app_module.prepare_for_fork()
+        assert gc.get_freeze_count() > 0
+        assert db.engine.pool.checkedin() == 0
+    finally:
+        gc.unfreeze()
+
+def test_forked_worker_starts_its_own_background_work(app, app_module, monkeypatch):
+    started = []
+    monkeypatch.setattr(app_module.book_catalog, 'start_refreshing',
+                        lambda app, db, interval: started.append(('catalog', interval)))
+    monkeypatch.setattr(app_module.recommendation_engine, 'start_watching',
+                        lambda app, interval: started.append(('model', interval)))
+    monkeypatch.setitem(app.config, 'CATALOG_REFRESH_INTERVAL', 60)
+    monkeypatch.setitem(app.config, 'MODEL_RELOAD_INTERVAL', 30)
+
+    app_module.init_forked_worker()
+
+    assert started == [('catalog', 60), ('model', 30)]
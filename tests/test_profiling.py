@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+from profiler import PROFILE_SUFFIX, SamplingProfiler, enforce_retention, profiled
+
+@pytest.fixture(autouse=True)
+def no_engine(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'recommendation_engine', None)
+
+def test_no_admins_unless_configured(app, client, login, make_user):
+    assert app.config['ADMIN_USERNAMES'] == set()
+
+    make_user('admin')
+    login('admin')
+    response = client.get('/?profile=1')
+
+    assert response.status_code == 200
+    assert 'X-Profile-File' not in response.headers
+
+def test_admin_request_is_profiled(app, client, login, make_user, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'ADMIN_USERNAMES', {'boss'})
+    written = []
+    monkeypatch.setattr(SamplingProfiler, 'write', lambda self, name, **kwargs: written.append(name) or str(tmp_path / 'profile.txt'))
+    make_user('boss')
+    login('boss')
+
+    response = client.get('/', headers={'X-Profile': '1'})
+
+    assert response.headers['X-Profile-File'] == 'profile.txt'
+    assert written == ['index-/']
+
+def test_failed_profile_write_does_not_fail_the_request(app, client, login, make_user, monkeypatch):
+    def _fail(self, name, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setitem(app.config, 'ADMIN_USERNAMES', {'boss'})
+    monkeypatch.setattr(SamplingProfiler, 'write', _fail)
+    make_user('boss')
+    login('boss')
+
+    response = client.get('/?profile=1')
+
+    assert response.status_code == 200
+    assert 'X-Profile-File' not in response.headers
+
+def _busy_leaf(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def test_sampler_counts_the_stacks_of_the_profiled_thread():
+    profiler = SamplingProfiler(interval=0.001).start()
+    _busy_leaf(0.1)
+    profiler.stop()
+
+    assert profiler.samples > 10
+    assert sum(profiler.stacks.values()) == profiler.samples
+    busy = sum(count for stack, count in profiler.stacks.items()
+               if stack.split(';')[-1].startswith('_busy_leaf (test_profiling.py:'))
+    assert busy > profiler.samples / 2
+    for line in profiler.collapsed().splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert profiler.stacks[stack] == int(count)
+
+def test_profiled_block_is_written_under_a_safe_name(tmp_path):
+    with profiled('GET /book/<isbn>', directory=str(tmp_path), interval=0.001):
+        _busy_leaf(0.02)
+
+    (name,) = os.listdir(tmp_path)
+    assert name.endswith(f"-GET-book-isbn{PROFILE_SUFFIX}")
+    assert '_busy_leaf' in (tmp_path / name).read_text()
+
+def test_retention_keeps_the_newest_profiles(tmp_path):
+    now = time.time()
+    ages_in_days = [0, 1, 2, 3, 10]
+    for index, age in enumerate(ages_in_days):
+        path = tmp_path / f"{index}{PROFILE_SUFFIX}"
+        path.write_text('')
+        os.utime(path, (now - age * 86400, now - age * 86400))
+    (tmp_path / 'notes.txt').write_text('')
+
+    # The 10 day old profile is past the age limit, the 3 day old one over the count
+    assert enforce_retention(str(tmp_path), max_files=3, max_age_days=7) == 2
+    assert sorted(os.listdir(tmp_path)) == [f"{index}{PROFILE_SUFFIX}" for index in range(3)] + ['notes.txt']
+    assert enforce_retention(str(tmp_path / 'missing')) == 0
@@ -0,0 +1,122 @@
+import json
+
+import numpy as np
+import pytest
+
+from model_bundle import ModelBundle, Vocabulary, write_bundle
+from quantization import NumpyModel
+
+USERS, BOOKS, WIDTH, HIDDEN = 10, 12, 8, 4
+
+def _layer(name, class_name, inbound=(), **config):
+    layer = {'name': name, 'class_name': class_name, 'config': dict(name=name, **config),
+             'inbound_nodes': [[[source, 0, 0, {}] for source in inbound]] if inbound else []}
+    if class_name == 'Dense':
+        layer['build_config'] = {'input_shape': [None, config.pop('input_width')]}
+        layer['config'].pop('input_width')
+    return layer
+
+def _wide_and_deep_config():
+    """A tiny wide & deep network in the Keras 2 functional config format."""
+    layers = [
+        _layer('user_id', 'InputLayer'),
+        _layer('isbn', 'InputLayer'),
+        _layer('user_embedding', 'Embedding', ['user_id'], input_dim=USERS, output_dim=WIDTH),
+        _layer('isbn_embedding', 'Embedding', ['isbn'], input_dim=BOOKS, output_dim=WIDTH),
+        _layer('isbn_wide', 'Embedding', ['isbn'], input_dim=BOOKS, output_dim=1),
+        _layer('user_flat', 'Flatten', ['user_embedding']),
+        _layer('isbn_flat', 'Flatten', ['isbn_embedding']),
+        _layer('wide_flat', 'Flatten', ['isbn_wide']),
+        _layer('deep_input', 'Concatenate', ['user_flat', 'isbn_flat'], axis=-1),
+        _layer('hidden', 'Dense', ['deep_input'], units=HIDDEN, activation='relu', input_width=2 * WIDTH),
+        _layer('dropout', 'Dropout', ['hidden'], rate=0.2),
+        _layer('deep_logit', 'Dense', ['dropout'], units=1, activation='linear', input_width=HIDDEN),
+        _layer('logit', 'Add', ['deep_logit', 'wide_flat']),
+        _layer('score', 'Activation', ['logit'], activation='sigmoid'),
+    ]
+    return {'class_name': 'Functional', 'config': {
+        'layers': layers,
+        'input_layers': [['user_id', 0, 0], ['isbn', 0, 0]],
+        'output_layers': [['score', 0, 0]],
+    }}
+
+def _weights(seed=0):
+    rng = np.random.default_rng(seed)
+    shapes = [(USERS, WIDTH), (BOOKS, WIDTH), (BOOKS, 1), (2 * WIDTH, HIDDEN), (HIDDEN,), (HIDDEN, 1), (1,)]
+    return [rng.normal(0, 0.5, shape).astype(np.float32) for shape in shapes]
+
+def _reference_scores(weights, user_ids, isbns):
+    """The network's forward pass written out by hand."""
+    users, books, wide, hidden_kernel, hidden_bias, logit_kernel, logit_bias = weights
+    deep = np.concatenate([users[user_ids], books[isbns]], axis=1)
+    hidden = np.maximum(deep @ hidden_kernel + hidden_bias, 0)
+    logit = hidden @ logit_kernel + logit_bias + wide[isbns]
+    return 1 / (1 + np.exp(-logit))
+
+def _bundle(tmp_path, config, weights):
+    path = str(tmp_path / 'model.bundle')
+    write_bundle(path, {'isbn': Vocabulary.from_values(np.arange(BOOKS))},
+                 model_config=json.dumps(config), weights=weights, model_version='test')
+    return ModelBundle.open(path)
+
+@pytest.fixture
+def batch():
+    rng = np.random.default_rng(1)
+    return rng.integers(0, USERS, 64), rng.integers(0, BOOKS, 64)
+
+@pytest.mark.parametrize('mode, tolerance', [('float32', 1e-6), ('float16', 2e-3), ('int8', 2e-2)])
+def test_predict_on_batch_matches_reference(tmp_path, batch, mode, tolerance):
+    weights = _weights()
+    model = NumpyModel.from_bundle(_bundle(tmp_path, _wide_and_deep_config(), weights), mode)
+    user_ids, isbns = batch
+
+    scores = model.predict_on_batch({'user_id': user_ids, 'isbn': isbns})
+
+    assert scores.shape == (len(user_ids), 1)
+    np.testing.assert_allclose(scores, _reference_scores(weights, user_ids, isbns), atol=tolerance)
+
+def test_int8_embeddings_are_smaller(tmp_path):
+    bundle = _bundle(tmp_path, _wide_and_deep_config(), _weights())
+    assert NumpyModel.from_bundle(bundle, 'int8').embedding_bytes() < NumpyModel.from_bundle(bundle, 'float32').embedding_bytes()
+
+def test_embedding_shape_mismatch_is_rejected(tmp_path):
+    weights = _weights()
+    # Two tables swapped, as a bundle written in another layer order would have them
+    weights[0], weights[1] = weights[1], weights[0]
+    with pytest.raises(ValueError, match='user_embedding'):
+        NumpyModel.from_bundle(_bundle(tmp_path, _wide_and_deep_config(), weights))
+
+def test_dense_shape_mismatch_is_rejected(tmp_path):
+    config = _wide_and_deep_config()
+    hidden = next(layer for layer in config['config']['layers'] if layer['name'] == 'hidden')
+    hidden['config']['units'] = HIDDEN + 1
+    with pytest.raises(ValueError, match='kernel of layer hidden'):
+        NumpyModel.from_bundle(_bundle(tmp_path, config, _weights()))
+
+def test_missing_weights_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match='ran out'):
+        NumpyModel.from_bundle(_bundle(tmp_path, _wide_and_deep_config(), _weights()[:-1]))
+
+def test_matches_keras_on_a_tiny_model(tmp_path, batch):
+    keras = pytest.importorskip('tensorflow').keras
+
+    user_input = keras.Input(shape=(1,), name='user_id', dtype='int64')
+    isbn_input = keras.Input(shape=(1,), name='isbn', dtype='int64')
+    deep = keras.layers.Concatenate()([
+        keras.layers.Flatten()(keras.layers.Embedding(USERS, WIDTH)(user_input)),
+        keras.layers.Flatten()(keras.layers.Embedding(BOOKS, WIDTH)(isbn_input)),
+    ])
+    deep = keras.layers.Dropout(0.2)(keras.layers.Dense(HIDDEN, activation='relu')(deep))
+    wide = keras.layers.Flatten()(keras.layers.Embedding(BOOKS, 1)(isbn_input))
+    logit = keras.layers.Add()([keras.layers.Dense(1)(deep), wide])
+    model = keras.Model([user_input, isbn_input], keras.layers.Activation('sigmoid')(logit))
+    weights = [np.asarray(weight, dtype=np.float32) for weight in model.get_weights()]
+
+    path = str(tmp_path / 'keras.bundle')
+    write_bundle(path, {}, model_config=model.to_json(), weights=weights, model_version='keras')
+    numpy_model = NumpyModel.from_bundle(ModelBundle.open(path), 'float32')
+
+    user_ids, isbns = batch
+    inputs = {'user_id': user_ids.reshape(-1, 1), 'isbn': isbns.reshape(-1, 1)}
+    np.testing.assert_allclose(numpy_model.predict_on_batch(inputs),
+                               np.asarray(model.predict_on_batch(inputs)), atol=1e-5)
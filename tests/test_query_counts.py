@@ -0,0 +1,71 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from models import Book
+
+# Existing ratings a page must not issue more statements for
+RATING_COUNTS = [0, 1, 25]
+
+@contextmanager
+def count_statements(db):
+    """Collect the SQL statements run inside the block."""
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _count)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _count)
+
+@pytest.fixture(autouse=True)
+def no_engine(app_module, monkeypatch):
+    # Keep the recommendation engine's own queries out of the page counts
+    monkeypatch.setattr(app_module, 'recommendation_engine', None)
+
+def _logged_in_client(app, db, username):
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': 'password'})
+    # Requests share the test's session: start each measured one without cached objects
+    db.session.expunge_all()
+    return client
+
+def test_profile_statements_do_not_grow_with_ratings(app, db, make_user, make_book, make_rating):
+    counts = []
+    for count in RATING_COUNTS:
+        user = make_user(f"reader{count}")
+        for index in range(count):
+            make_rating(user, make_book(f"profile-{count}-{index}"), 1 + index % 10)
+        client = _logged_in_client(app, db, user.username)
+
+        with count_statements(db) as statements:
+            response = client.get('/profile')
+        assert response.status_code == 200
+        counts.append(len(statements))
+
+    assert counts == [counts[0]] * len(RATING_COUNTS)
+
+def test_rating_statements_do_not_grow_with_ratings(app, db, make_user, make_book, make_rating):
+    counts = []
+    for count in RATING_COUNTS:
+        book = make_book(f"rated-{count}")
+        isbn = book.isbn
+        values = [1 + index % 10 for index in range(count)]
+        for index, value in enumerate(values):
+            make_rating(make_user(f"rater{count}-{index}"), book, value)
+        client = _logged_in_client(app, db, make_user(f"new-rater{count}").username)
+
+        with count_statements(db) as statements:
+            response = client.post(f"/book/{isbn}/rate", data={'rating': 8})
+        assert response.status_code == 302
+        counts.append(len(statements))
+
+        book = Book.query.filter_by(isbn=isbn).one()
+        assert book.num_ratings == count + 1
+        assert book.avg_rating == pytest.approx((sum(values) + 8) / (count + 1))
+
+    assert counts == [counts[0]] * len(RATING_COUNTS)
@@ -0,0 +1,16 @@
+from query_plans import check_query_plans
+
+def test_hot_queries_use_indexes(app, app_module, db, make_user, make_book, make_rating):
+    books = [make_book(f"{i:010d}", author=f"Author {i % 3}", publisher=f"Publisher {i % 2}",
+                       avg_rating=float(i % 10), num_ratings=i) for i in range(30)]
+    users = [make_user(f"reader{i}") for i in range(5)]
+    for i, user in enumerate(users):
+        for book in books[i::3]:
+            make_rating(user, book, (i + len(book.isbn)) % 10 + 1)
+
+    results = check_query_plans(app, db, engine=app_module.recommendation_engine)
+
+    assert results
+    failures = [f"[{result.source}] {'; '.join(result.problems)}: {' '.join(result.statement.split())}"
+                for result in results if not result.ok]
+    assert failures == []
@@ -0,0 +1,108 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from recommendation import COMPLETION_BACKLOG, COMPLETION_WORKERS
+
+BUDGET_MS = 150
+
+@pytest.fixture
+def release():
+    """Set at teardown, so stubbed tiers still running return."""
+    return threading.Event()
+
+@pytest.fixture
+def engine(app, app_module, db, monkeypatch, release):
+    """The app's engine under a latency budget, with a stand-in model and stubbed tiers."""
+    engine = app_module.recommendation_engine
+    state = engine._active_state()
+    monkeypatch.setitem(app.config, 'RECOMMENDATION_BUDGET_MS', BUDGET_MS)
+    monkeypatch.setattr(state, 'model', object())
+    monkeypatch.setattr(state, 'user_cache', {})
+    monkeypatch.setattr(state, 'pending_recommendations', {})
+    monkeypatch.setattr(engine, '_get_popular_books', lambda top_n: ['popular'])
+    monkeypatch.setattr(engine, '_completion_slots', threading.BoundedSemaphore(COMPLETION_BACKLOG))
+    monkeypatch.setattr(engine, '_completions', ThreadPoolExecutor(max_workers=COMPLETION_WORKERS))
+    yield engine
+    release.set()
+    engine._completions.shutdown(wait=True)
+
+@pytest.fixture
+def tiers(engine, monkeypatch, release):
+    """Stub the model and collaborative filtering: tiers(model=seconds, cf=seconds)."""
+    def _tiers(model, cf):
+        for method, isbn, seconds in (('_score_user_for_cache', 'model', model),
+                                      ('_get_recommendations_fallback', 'cf', cf)):
+            def _slow(user_id, top_n, isbn=isbn, seconds=seconds):
+                release.wait(seconds)
+                return [isbn]
+            monkeypatch.setattr(engine, method, _slow)
+    return _tiers
+
+@pytest.fixture
+def reader(client, login, make_user, make_book):
+    for isbn in ('model', 'cf', 'popular', 'cached'):
+        make_book(isbn)
+    user = make_user('reader')
+    login('reader')
+    return user
+
+def _fragment(client):
+    response = client.get('/fragments/recommended')
+    assert response.status_code == 200
+    return response
+
+def test_model_serves_within_its_share(client, reader, tiers):
+    tiers(model=0.01, cf=0)
+
+    response = _fragment(client)
+
+    assert response.headers['X-Recommendation-Tier'] == 'model'
+    assert response.headers['Cache-Control'] == 'private, max-age=60'
+    assert 'Title model' in response.get_data(as_text=True)
+
+def test_collaborative_filtering_serves_when_the_model_runs_past_its_share(client, reader, tiers):
+    tiers(model=5, cf=0.01)
+
+    response = _fragment(client)
+
+    assert response.headers['X-Recommendation-Tier'] == 'collaborative_filtering'
+    # Degraded answers are revalidated, so the model's results show once cached
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Title cf' in response.get_data(as_text=True)
+
+def test_popular_books_serve_when_collaborative_filtering_runs_past_the_budget(client, reader, tiers):
+    tiers(model=5, cf=5)
+
+    response = _fragment(client)
+
+    assert response.headers['X-Recommendation-Tier'] == 'popular'
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Title popular' in response.get_data(as_text=True)
+
+def test_cached_recommendations_serve_first(client, reader, engine, tiers):
+    tiers(model=5, cf=5)
+    engine.user_cache[reader.id] = (24, [('cached', 0.9)])
+
+    response = _fragment(client)
+
+    assert response.headers['X-Recommendation-Tier'] == 'cache'
+    assert 'Title cached' in response.get_data(as_text=True)
+
+def test_collaborative_filtering_is_not_degraded_without_a_model(client, reader, engine, tiers, monkeypatch):
+    monkeypatch.setattr(engine._active_state(), 'model', None)
+    tiers(model=5, cf=0.01)
+
+    response = _fragment(client)
+
+    assert response.headers['X-Recommendation-Tier'] == 'collaborative_filtering'
+    assert response.headers['Cache-Control'] == 'private, max-age=60'
+
+def test_profile_reports_the_tier(client, reader, tiers):
+    tiers(model=5, cf=0.01)
+
+    response = client.get('/profile')
+
+    assert response.status_code == 200
+    assert response.headers['X-Recommendation-Tier'] == 'collaborative_filtering'
@@ -0,0 +1,101 @@
+import pytest
+
+from startup import StartupState, run_in_background
+
+PHASES = ['schema', 'data', 'engine', 'warmup']
+
+@pytest.fixture
+def state(app_module, monkeypatch):
+    """A fresh startup state in place of the one the test session's app finished."""
+    state = StartupState(PHASES)
+    monkeypatch.setattr(app_module, 'startup_state', state)
+    return state
+
+def _finish(state, *names):
+    for name in names:
+        with state.phase(name):
+            pass
+
+def test_phases_are_pending_until_run(state):
+    assert not state.ready
+    assert not state.wait_until_ready(timeout=0.01)
+    assert {phase['status'] for phase in state.to_dict()['phases'].values()} == {'pending'}
+
+def test_ready_once_every_phase_finished(state):
+    _finish(state, 'schema', 'data', 'engine')
+    assert not state.ready
+
+    with state.phase('warmup') as phase:
+        assert state.to_dict()['phases']['warmup']['status'] == 'running'
+        phase.details['batch_ms'] = {1: 2.5}
+
+    assert state.ready
+    assert not state.degraded
+    warmup = state.to_dict()['phases']['warmup']
+    assert warmup['status'] == 'done'
+    assert warmup['duration_ms'] >= 0
+    assert warmup['batch_ms'] == {1: 2.5}
+
+def test_failed_phase_counts_as_finished_but_degraded(state):
+    _finish(state, 'schema', 'engine', 'warmup')
+
+    with pytest.raises(RuntimeError):
+        with state.phase('data'):
+            raise RuntimeError('dataset missing')
+
+    assert state.ready
+    assert state.degraded
+    assert state.to_dict()['phases']['data'] == {'status': 'failed', 'duration_ms': pytest.approx(0, abs=50),
+                                                 'error': 'dataset missing'}
+
+def test_waiters_wake_when_the_last_phase_finishes(state):
+    _finish(state, 'schema', 'data', 'engine')
+    woke = []
+    waiter = run_in_background(lambda: woke.append(state.wait_until_ready(timeout=5)), name='waiter')
+
+    _finish(state, 'warmup')
+    waiter.join(timeout=5)
+
+    assert woke == [True]
+    assert waiter.daemon
+
+def test_readyz_is_unavailable_while_starting(client, state):
+    _finish(state, 'schema')
+
+    response = client.get('/readyz')
+
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'starting'
+    assert response.get_json()['phases']['engine']['status'] == 'pending'
+    # Liveness doesn't wait for startup
+    assert client.get('/healthz').status_code == 200
+
+def test_readyz_reports_ready_and_degraded(client, state):
+    _finish(state, 'schema', 'engine', 'warmup')
+    with pytest.raises(ValueError):
+        with state.phase('data'):
+            raise ValueError('no books')
+
+    response = client.get('/readyz')
+
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'ready'
+    assert response.get_json()['degraded'] is True
+
+def test_deferred_phases_continue_past_a_failure(app_module, state, monkeypatch):
+    ran = []
+
+    def _fail():
+        ran.append('data')
+        raise RuntimeError('database unavailable')
+
+    monkeypatch.setattr(app_module, '_initialize_data', _fail)
+    monkeypatch.setattr(app_module, '_initialize_engine', lambda: ran.append('engine'))
+    monkeypatch.setattr(app_module, '_warm_up_engine', lambda: ran.append('warmup'))
+    _finish(state, 'schema')
+
+    app_module._run_deferred_phases()
+
+    assert ran == ['data', 'engine', 'warmup']
+    assert state.ready
+    assert state.to_dict()['phases']['data']['error'] == 'database unavailable'
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from model_bundle import ModelBundle, Vocabulary, write_bundle
+from models import Rating
+from training import FeatureTables, _rating_ranges, _vocabulary_mapping, iter_examples, warm_start
+from wide_deep import build_scaler, build_vocabularies
+
+USERS, BOOKS = 12, 10
+
+@pytest.fixture
+def ratings(db, make_user, make_book):
+    """Every user rates every book; rating IDs are spread so both sides of the split have some."""
+    users = [make_user(f"reader{index}") for index in range(USERS)]
+    books = [make_book(f"{index:04d}") for index in range(BOOKS)]
+    ratings = {}
+    for index, (user, book) in enumerate((user, book) for user in users for book in books):
+        rating_id = 1 + index * 17
+        ratings[(user.id, book.isbn)] = (rating_id, index % 10 + 1)
+        db.session.add(Rating(id=rating_id, user_id=user.id, isbn=book.isbn, rating=index % 10 + 1,
+                              timestamp=datetime.utcnow()))
+    db.session.commit()
+    return ratings
+
+@pytest.fixture
+def vocabularies(db, ratings):
+    return build_vocabularies(db)
+
+def _examples(db, vocabularies, validation, epoch=0):
+    """The (user ID, ISBN) -> label pairs iter_examples yields, decoded."""
+    tables = FeatureTables(db, vocabularies, build_scaler(db))
+    seen = {}
+    for inputs, labels in iter_examples(db.engine, tables, _rating_ranges(db, 500), validation, epoch=epoch):
+        for user_code, isbn_code, label in zip(inputs['user_id_encoded'].ravel(),
+                                               inputs['isbn_encoded'].ravel(), labels):
+            key = (int(vocabularies['user_id'][user_code]), str(vocabularies['isbn'][isbn_code]))
+            assert key not in seen
+            seen[key] = float(label)
+    return seen
+
+def test_validation_split_is_stable_and_disjoint(db, ratings, vocabularies):
+    training = _examples(db, vocabularies, validation=False)
+    validation = _examples(db, vocabularies, validation=True)
+
+    expected_validation = {key for key, (rating_id, _) in ratings.items() if rating_id % 1000 < 100}
+    assert set(validation) == expected_validation
+    assert set(training) == set(ratings) - expected_validation
+    assert expected_validation and training
+    assert all(label == pytest.approx(ratings[key][1] / 10) for key, label in {**training, **validation}.items())
+
+    # Another epoch visits the chunks in another order, but never moves a rating across the split
+    assert set(_examples(db, vocabularies, validation=False, epoch=1)) == set(training)
+
+@pytest.mark.parametrize('old, new, pairs', [
+    ([10, 20, 30], [5, 10, 30, 40], [(0, 1), (2, 2)]),
+    (['a', 'b', 'c'], ['b', 'c', 'd'], [(1, 0), (2, 1)]),
+    ([1, 2], [3, 4], []),
+])
+def test_vocabulary_mapping_pairs_shared_values(old, new, pairs):
+    old_index, new_index = _vocabulary_mapping(Vocabulary.from_values(old), Vocabulary.from_values(new))
+    assert list(zip(old_index.tolist(), new_index.tolist())) == pairs
+
+def test_warm_start_carries_embeddings_over_to_the_new_codes(tmp_path):
+    pytest.importorskip('tensorflow')
+    from wide_deep import build_wide_deep_model
+
+    def _vocabularies(isbns):
+        return {'user_id': Vocabulary.from_values([1, 2]), 'isbn': Vocabulary.from_values(isbns),
+                'author': Vocabulary.from_values(['x']), 'publisher': Vocabulary.from_values(['y']),
+                'year': Vocabulary.from_values(['2000']), 'age_bin': Vocabulary.from_values(['Unknown'])}
+
+    def _model(vocabularies, seed):
+        sizes = {name: len(vocabulary) for name, vocabulary in vocabularies.items()}
+        return build_wide_deep_model(sizes, embedding_dim=4, hidden_units=(8,), seed=seed)
+
+    old_vocabularies = _vocabularies(['b', 'd', 'f'])
+    previous = _model(old_vocabularies, seed=1)
+    path = str(tmp_path / 'previous.bundle')
+    write_bundle(path, old_vocabularies, model_config=previous.to_json(),
+                 weights=[np.asarray(weight, dtype=np.float32) for weight in previous.get_weights()])
+
+    # 'b' and 'f' move to new codes, 'd' is gone and 'a', 'c' are new
+    new_vocabularies = _vocabularies(['a', 'b', 'c', 'f'])
+    model = _model(new_vocabularies, seed=2)
+    untouched = model.get_layer('isbn_encoded_deep').get_weights()[0].copy()
+
+    assert warm_start(model, ModelBundle.open(path), new_vocabularies) > 0
+
+    old_rows = previous.get_layer('isbn_encoded_deep').get_weights()[0]
+    new_rows = model.get_layer('isbn_encoded_deep').get_weights()[0]
+    np.testing.assert_allclose(new_rows[[1, 3]], old_rows[[0, 2]])
+    np.testing.assert_allclose(new_rows[[0, 2]], untouched[[0, 2]])
+    # Layers of unchanged shape are copied as they are
+    np.testing.assert_allclose(model.get_layer('user_id_encoded_deep').get_weights()[0],
+                               previous.get_layer('user_id_encoded_deep').get_weights()[0])
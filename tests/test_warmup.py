@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from recommendation import DEFAULT_PREDICT_BATCH_SIZES, ModelState, _parse_batch_sizes
+from startup import StartupState
+
+BATCH_SIZES = (1, 8, 32)
+
+class RecordingModel:
+    """Stand-in network remembering the batch size of every predict call."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict_on_batch(self, inputs):
+        size = len(inputs['user_id_encoded'])
+        assert all(len(values) == size for values in inputs.values())
+        self.batch_sizes.append(size)
+        return np.full((size, 1), 0.5, dtype=np.float32)
+
+@pytest.fixture
+def state():
+    state = ModelState(source='test')
+    state.model = RecordingModel()
+    return state
+
+@pytest.fixture
+def engine(app_module, monkeypatch):
+    engine = app_module.recommendation_engine
+    monkeypatch.setattr(engine, 'batch_sizes', BATCH_SIZES)
+    return engine
+
+@pytest.mark.parametrize('value, expected', [
+    ('256,1, 32', (1, 32, 256)),
+    ('8,8,0,-4', (8,)),
+    ('', DEFAULT_PREDICT_BATCH_SIZES),
+    ('1,many', DEFAULT_PREDICT_BATCH_SIZES),
+])
+def test_batch_sizes_are_parsed(value, expected):
+    assert _parse_batch_sizes(value) == expected
+
+def test_every_batch_size_is_traced_once(engine, state):
+    timings = engine.warm_up(state=state)
+
+    assert state.model.batch_sizes == list(BATCH_SIZES)
+    assert set(timings) == set(BATCH_SIZES)
+    assert all(milliseconds >= 0 for milliseconds in timings.values())
+    assert state.warmup == timings
+
+def test_requests_only_use_warmed_shapes(engine, state):
+    engine.warm_up(state=state)
+    warmed = set(state.model.batch_sizes)
+    state.model.batch_sizes.clear()
+
+    with engine._using_state(state):
+        for count in (1, 2, 9, 32, 45, 100):
+            scores = engine._predict_arrays({'user_id': np.zeros(count)}, count)
+            assert scores.shape == (count,)
+
+    assert set(state.model.batch_sizes) <= warmed
+
+def test_nothing_to_warm_without_a_model(engine):
+    state = ModelState(source='test')
+    assert engine.warm_up(state=state) == {}
+    assert state.warmup == {}
+
+def test_readiness_reports_the_warm_up(app_module, client, engine, state, monkeypatch):
+    startup_state = StartupState(['schema', 'data', 'engine', 'warmup'])
+    monkeypatch.setattr(app_module, 'startup_state', startup_state)
+    monkeypatch.setattr(engine, '_state', state)
+    monkeypatch.setattr(app_module, '_pending_engine', engine)
+    # Warming publishes the engine; restored with the rest at teardown
+    monkeypatch.setattr(app_module, 'recommendation_engine', None)
+    for name in ('schema', 'data', 'engine'):
+        with startup_state.phase(name):
+            pass
+    assert client.get('/readyz').status_code == 503
+
+    with startup_state.phase('warmup'):
+        app_module._warm_up_engine()
+
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    warmup = response.get_json()['phases']['warmup']
+    assert warmup['status'] == 'done'
+    assert set(warmup['batch_ms']) == {str(size) for size in BATCH_SIZES}
+    assert response.get_json()['model']['warmup_ms'] == warmup['batch_ms']
+    assert app_module.recommendation_engine is engine
@@ -0,0 +1,299 @@
+import logging
+import os
+import time
+from datetime import datetime
+from sqlalchemy import func, select
+from models import User, Book, Rating
+from wide_deep import AGE_BINS, CATEGORICAL_INPUTS, TITLE_EMBEDDING_DIM
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the age bins after 'Unknown', as in RecommendationEngine._encode_age_bin
+AGE_BIN_EDGES = [18, 25, 35, 45, 55, 65]
+
+def _age_bin_codes(ages, vocabulary):
+    """Vectorized RecommendationEngine._encode_age_bin: ages -> age bin codes."""
+    import numpy as np
+
+    ages = np.nan_to_num(np.asarray(ages, dtype=np.float64), nan=0.0)
+    bins = np.where(ages <= 0, 0, np.digitize(ages, AGE_BIN_EDGES) + 1)
+    codes = np.array([vocabulary.encode(name, default=0) for name in AGE_BINS], dtype=np.int64)
+    return codes[bins]
+
+class FeatureTables:
+    """
+    Encoded features of every book and user, built once per training run.
+
+    Ratings are then streamed in chunks and only need two lookups each, so
+    the tables (one row per book or user) are all that is held in memory.
+    """
+
+    def __init__(self, db, vocabularies, scaler):
+        import numpy as np
+
+        books = db.session.query(Book.isbn, Book.author, Book.publisher, Book.year_of_publication,
+                                 Book.avg_rating, Book.num_ratings).all()
+        self.book_rows = {row[0]: index for index, row in enumerate(books)}
+        columns = list(zip(*books)) if books else [[]] * 6
+        numeric = np.array([[value or 0.0 for value in columns[4]],
+                            [value or 0 for value in columns[5]]], dtype=np.float64).T.reshape(-1, 2)
+        scaled = numeric * scaler['scale'] + scaler['min']
+        self.book_features = {
+            'isbn_encoded': vocabularies['isbn'].encode_many(columns[0]),
+            'author_encoded': vocabularies['author'].encode_many(columns[1]),
+            'publisher_encoded': vocabularies['publisher'].encode_many(columns[2]),
+            'year_encoded': vocabularies['year'].encode_many(columns[3]),
+            'avg_rating_scaled': scaled[:, 0].astype(np.float32),
+            'num_ratings_scaled': scaled[:, 1].astype(np.float32),
+        }
+
+        users = db.session.query(User.id, User.age).all()
+        self.user_rows = {row[0]: index for index, row in enumerate(users)}
+        user_ids = [row[0] for row in users]
+        ages = [row[1] if row[1] is not None else 0 for row in users]
+        self.user_features = {
+            'user_id_encoded': vocabularies['user_id'].encode_many(user_ids),
+            'age_binned_encoded': _age_bin_codes(ages, vocabularies['age_bin']),
+        }
+
+def _rating_ranges(db, chunk_size):
+    """Split the rating ID space into ranges of `chunk_size` IDs."""
+    low, high = db.session.query(func.min(Rating.id), func.max(Rating.id)).one()
+    if low is None:
+        return []
+    return [(start, start + chunk_size) for start in range(low, high + 1, chunk_size)]
+
+def iter_examples(engine, tables, ranges, validation, validation_fraction=0.1, seed=42, epoch=0):
+    """
+    Stream encoded training examples, one chunk of ratings at a time.
+
+    Chunks are visited in a different random order every epoch and shuffled
+    internally. Ratings with ID % 1000 below validation_fraction * 1000 form
+    the validation set, so the split is stable across epochs and runs.
+
+    Args:
+        engine: SQLAlchemy engine (safe to use from tf.data's threads)
+        tables: FeatureTables
+        ranges: Rating ID ranges from _rating_ranges
+        validation: Yield the validation examples instead of the training ones
+
+    Yields:
+        (inputs dict, labels) with labels = rating / 10
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed + epoch)
+    order = rng.permutation(len(ranges)) if not validation else range(len(ranges))
+    threshold = int(validation_fraction * 1000)
+
+    with engine.connect() as conn:
+        for index in order:
+            low, high = ranges[index]
+            rows = conn.execute(
+                select(Rating.id, Rating.user_id, Rating.isbn, Rating.rating)
+                .where(Rating.id >= low, Rating.id < high)
+            ).all()
+            if not rows:
+                continue
+
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            user_rows = np.array([tables.user_rows.get(row[1], -1) for row in rows], dtype=np.int64)
+            book_rows = np.array([tables.book_rows.get(row[2], -1) for row in rows], dtype=np.int64)
+            labels = np.array([row[3] for row in rows], dtype=np.float32) / 10.0
+
+            keep = (user_rows >= 0) & (book_rows >= 0) & (((ids % 1000) < threshold) == validation)
+            keep = np.flatnonzero(keep)
+            if not len(keep):
+                continue
+            keep = rng.permutation(keep)
+
+            inputs = {name: values[user_rows[keep]].reshape(-1, 1) for name, values in tables.user_features.items()}
+            inputs.update({name: values[book_rows[keep]].reshape(-1, 1)
+                           for name, values in tables.book_features.items()})
+            yield inputs, labels[keep]
+
+def make_dataset(engine, tables, ranges, validation, batch_size=1024, validation_fraction=0.1, seed=42):
+    """tf.data pipeline over iter_examples, rebatched to `batch_size` and prefetched."""
+    import tensorflow as tf
+
+    epochs = {'count': 0}
+
+    def generator():
+        # from_generator calls this once per epoch; reshuffle the chunk order each time
+        epochs['count'] += 1
+        return iter_examples(engine, tables, ranges, validation, validation_fraction, seed, epochs['count'])
+
+    signature = {name: tf.TensorSpec(shape=(None, 1), dtype=tf.int64) for name in CATEGORICAL_INPUTS}
+    signature['avg_rating_scaled'] = tf.TensorSpec(shape=(None, 1), dtype=tf.float32)
+    signature['num_ratings_scaled'] = tf.TensorSpec(shape=(None, 1), dtype=tf.float32)
+
+    def add_title_embedding(inputs, labels):
+        # The title embedding input is unused (zeros), as at serving time
+        inputs['title_embedding_features'] = tf.zeros((tf.shape(labels)[0], TITLE_EMBEDDING_DIM))
+        return inputs, labels
+
+    dataset = tf.data.Dataset.from_generator(
+        generator, output_signature=(signature, tf.TensorSpec(shape=(None,), dtype=tf.float32))
+    )
+    return dataset.rebatch(batch_size).map(add_title_embedding).prefetch(tf.data.AUTOTUNE)
+
+def _vocabulary_mapping(old, new):
+    """Row indices (old, new) of the values present in both vocabularies."""
+    import numpy as np
+
+    if old.kind == 'int' and new.kind == 'int':
+        index = np.minimum(np.searchsorted(new.values, old.values), len(new) - 1)
+        found = new.values[index] == old.values
+        return np.flatnonzero(found), index[found]
+
+    new_codes = {new[index]: index for index in range(len(new))}
+    pairs = [(index, new_codes[str(old[index])]) for index in range(len(old)) if str(old[index]) in new_codes]
+    if not pairs:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    old_index, new_index = zip(*pairs)
+    return np.array(old_index), np.array(new_index)
+
+def warm_start(model, previous_bundle, vocabularies):
+    """
+    Initialize a new model from the previous version's weights.
+
+    Embedding rows are carried over for the values both versions know
+    (their codes change as the vocabularies grow); other layers are copied
+    when their shapes match. New values keep their random initialization.
+
+    Returns:
+        Number of layers initialized from the previous model
+    """
+    from tensorflow import keras
+
+    previous = keras.models.model_from_json(previous_bundle.model_config)
+    previous.set_weights(previous_bundle.weights)
+    previous_layers = {layer.name: layer for layer in previous.layers}
+    vocab_names = {f'{input_name}_{part}': vocab_name
+                   for input_name, vocab_name in CATEGORICAL_INPUTS.items() for part in ('wide', 'deep')}
+
+    copied = 0
+    for layer in model.layers:
+        old_layer = previous_layers.get(layer.name)
+        if old_layer is None or not layer.get_weights():
+            continue
+
+        old_weights, new_weights = old_layer.get_weights(), layer.get_weights()
+        if layer.name in vocab_names and len(old_weights) == 1 and old_weights[0].shape[1] == new_weights[0].shape[1]:
+            vocab_name = vocab_names[layer.name]
+            old_vocabulary = previous_bundle.vocabularies.get(vocab_name)
+            if old_vocabulary is None:
+                continue
+            old_index, new_index = _vocabulary_mapping(old_vocabulary, vocabularies[vocab_name])
+            new_weights[0][new_index] = old_weights[0][old_index]
+            layer.set_weights(new_weights)
+            copied += 1
+        elif [w.shape for w in old_weights] == [w.shape for w in new_weights]:
+            layer.set_weights(old_weights)
+            copied += 1
+        else:
+            logger.warning(f"Layer {layer.name} changed shape, not warm-started")
+
+    if not copied:
+        logger.warning("No layers matched the previous model; training from scratch")
+    return copied
+
+def train_model(db, output_path, model_version, warm_start_path=None, epochs=10, batch_size=1024,
+                chunk_size=50000, validation_fraction=0.1, patience=2, embedding_dim=16,
+                hidden_units=(128, 64), learning_rate=0.001, seed=42):
+    """
+    Retrain the wide & deep model on the current ratings and write a versioned bundle.
+
+    Vocabularies and the scaler are refit from the database, examples are
+    streamed from the rating table in chunks through tf.data, and training
+    stops early when the validation loss stops improving (the best weights
+    are kept). Runs on the CPU.
+
+    Args:
+        db: SQLAlchemy database instance (inside an app context)
+        output_path: Bundle file to write
+        model_version: Version string stored in the bundle
+        warm_start_path: Previous bundle to initialize from, or None to train from scratch
+        epochs: Maximum number of epochs
+        batch_size: Examples per training step
+        chunk_size: Rating IDs read per database query
+        validation_fraction: Share of ratings held out for early stopping
+        patience: Epochs without validation improvement before stopping
+        embedding_dim, hidden_units: Model shape, see wide_deep.build_wide_deep_model
+        learning_rate: Adam learning rate
+        seed: Seed of the initialization and the example order
+
+    Returns:
+        Dict with the bundle path and training summary
+    """
+    import numpy as np
+    import tensorflow as tf
+    from tensorflow import keras
+    from model_bundle import ModelBundle, write_bundle
+    from wide_deep import build_vocabularies, build_scaler, build_wide_deep_model
+
+    try:
+        tf.config.set_visible_devices([], 'GPU')
+    except Exception:
+        # Devices can't change once TensorFlow has initialized them; CPU builds have none anyway
+        pass
+
+    start = time.perf_counter()
+    vocabularies = build_vocabularies(db)
+    scaler = build_scaler(db)
+    tables = FeatureTables(db, vocabularies, scaler)
+    ranges = _rating_ranges(db, chunk_size)
+    if not ranges:
+        raise ValueError("No ratings to train on")
+    logger.info(f"Feature tables built in {time.perf_counter() - start:.1f}s "
+                f"({len(tables.book_rows)} books, {len(tables.user_rows)} users, {len(ranges)} rating chunks)")
+
+    model = build_wide_deep_model({name: len(vocabulary) for name, vocabulary in vocabularies.items()},
+                                  embedding_dim=embedding_dim, hidden_units=hidden_units, seed=seed)
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=learning_rate), loss='binary_crossentropy',
+                  metrics=[keras.metrics.RootMeanSquaredError(name='rmse')])
+
+    warm_started_from = None
+    if warm_start_path:
+        previous = ModelBundle.open(warm_start_path)
+        if previous.model_config:
+            if warm_start(model, previous, vocabularies):
+                warm_started_from = previous.version
+        else:
+            logger.warning(f"{warm_start_path} has no network weights; training from scratch")
+
+    engine = db.engine
+    history = model.fit(
+        make_dataset(engine, tables, ranges, False, batch_size, validation_fraction, seed),
+        validation_data=make_dataset(engine, tables, ranges, True, batch_size, validation_fraction, seed),
+        epochs=epochs,
+        callbacks=[keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience,
+                                                 restore_best_weights=True)],
+        shuffle=False,  # Chunk order and rows within chunks are already shuffled
+        verbose=2,
+    )
+
+    val_losses = history.history.get('val_loss', [])
+    summary = {
+        'epochs_run': len(val_losses),
+        'best_epoch': int(np.argmin(val_losses)) + 1 if val_losses else None,
+        'best_val_loss': float(min(val_losses)) if val_losses else None,
+        'history': {name: [float(value) for value in values] for name, values in history.history.items()},
+        'warm_start_from': warm_started_from,
+        'training_seconds': round(time.perf_counter() - start, 1),
+    }
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    write_bundle(output_path, vocabularies, scaler=scaler, model_config=model.to_json(),
+                 weights=[np.asarray(weight, dtype=np.float32) for weight in model.get_weights()],
+                 model_version=model_version,
+                 metadata={'source': 'retrained', 'created': datetime.utcnow().isoformat(),
+                           'ratings': db.session.query(func.count(Rating.id)).scalar(),
+                           'embedding_dim': embedding_dim, 'hidden_units': list(hidden_units),
+                           'batch_size': batch_size, 'learning_rate': learning_rate, 'seed': seed,
+                           **summary})
+    logger.info(f"Retrained model {model_version} written to {output_path}: {summary}")
+    return {'path': output_path, **summary}
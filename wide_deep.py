@@ -0,0 +1,163 @@
+import logging
+import os
+from datetime import datetime
+from sqlalchemy import func
+from models import User, Book, Rating
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Age bins produced by RecommendationEngine._encode_age_bin
+AGE_BINS = ['Unknown', 'Under 18', '18-24', '25-34', '35-44', '45-54', '55-64', '65+']
+
+# Categorical model inputs: input name -> vocabulary name
+CATEGORICAL_INPUTS = {
+    'user_id_encoded': 'user_id',
+    'isbn_encoded': 'isbn',
+    'author_encoded': 'author',
+    'publisher_encoded': 'publisher',
+    'year_encoded': 'year',
+    'age_binned_encoded': 'age_bin',
+}
+
+# Numeric model inputs, min-max scaled with the bundle's scaler
+NUMERIC_INPUTS = ['avg_rating_scaled', 'num_ratings_scaled']
+
+TITLE_EMBEDDING_DIM = 50
+
+def build_vocabularies(db):
+    """
+    Build the model vocabularies from the database, like the LabelEncoders
+    fitted during training: sorted distinct values, index = encoding.
+
+    Args:
+        db: SQLAlchemy database instance
+
+    Returns:
+        Dict of vocabulary name -> model_bundle.Vocabulary
+    """
+    from model_bundle import Vocabulary
+
+    def _distinct(column):
+        return sorted(value for (value,) in db.session.query(column).distinct() if value is not None)
+
+    return {
+        'user_id': Vocabulary.from_values(_distinct(User.id)),
+        'isbn': Vocabulary.from_values(_distinct(Book.isbn)),
+        'author': Vocabulary.from_values(_distinct(Book.author)),
+        'publisher': Vocabulary.from_values(_distinct(Book.publisher)),
+        'year': Vocabulary.from_values(_distinct(Book.year_of_publication)),
+        'age_bin': Vocabulary.from_values(sorted(AGE_BINS)),
+    }
+
+def build_scaler(db):
+    """
+    Min-max scaler parameters for (avg_rating, num_ratings), in the bundle's format.
+
+    Returns:
+        Dict with 'min', 'scale' and 'features', like a fitted MinMaxScaler
+    """
+    import numpy as np
+
+    low_rating, high_rating, low_count, high_count = db.session.query(
+        func.min(Book.avg_rating), func.max(Book.avg_rating),
+        func.min(Book.num_ratings), func.max(Book.num_ratings)
+    ).one()
+    low = np.array([low_rating or 0.0, low_count or 0], dtype=np.float64)
+    high = np.array([high_rating or 1.0, high_count or 1], dtype=np.float64)
+    scale = 1.0 / np.where(high > low, high - low, 1.0)
+    return {'min': -low * scale, 'scale': scale, 'features': ['avg_rating', 'num_ratings']}
+
+def build_wide_deep_model(vocab_sizes, embedding_dim=16, hidden_units=(128, 64), seed=42):
+    """
+    Build an untrained wide & deep model with the production model's inputs.
+
+    The wide part is a linear layer over one-hot crosses of the categorical
+    ids (via 1-dim embeddings); the deep part embeds every id, adds the
+    numeric features and the title embedding, and runs an MLP.
+
+    Args:
+        vocab_sizes: Dict of vocabulary name -> number of values
+        embedding_dim: Width of the deep embeddings
+        hidden_units: Sizes of the deep part's hidden layers
+        seed: Seed for the random initial weights
+
+    Returns:
+        Compiled keras.Model predicting a score in [0, 1]
+    """
+    from tensorflow import keras
+
+    keras.utils.set_random_seed(seed)
+    inputs = {}
+    wide_terms = []
+    deep_terms = []
+
+    for input_name, vocab_name in CATEGORICAL_INPUTS.items():
+        size = max(int(vocab_sizes.get(vocab_name, 1)), 1)
+        layer_input = keras.Input(shape=(1,), name=input_name, dtype='int64')
+        inputs[input_name] = layer_input
+        # Named after their input so retraining can warm-start them (see training.py)
+        wide_terms.append(keras.layers.Flatten()(
+            keras.layers.Embedding(size, 1, name=f'{input_name}_wide')(layer_input)))
+        deep_terms.append(keras.layers.Flatten()(
+            keras.layers.Embedding(size, embedding_dim, name=f'{input_name}_deep')(layer_input)))
+
+    for input_name in NUMERIC_INPUTS:
+        layer_input = keras.Input(shape=(1,), name=input_name, dtype='float32')
+        inputs[input_name] = layer_input
+        wide_terms.append(layer_input)
+        deep_terms.append(layer_input)
+
+    title_input = keras.Input(shape=(TITLE_EMBEDDING_DIM,), name='title_embedding_features', dtype='float32')
+    inputs['title_embedding_features'] = title_input
+    deep_terms.append(title_input)
+
+    wide = keras.layers.Dense(1, name='wide_output')(keras.layers.Concatenate()(wide_terms))
+    deep = keras.layers.Concatenate()(deep_terms)
+    for index, units in enumerate(hidden_units):
+        deep = keras.layers.Dense(units, activation='relu', name=f'deep_hidden_{index}')(deep)
+    deep = keras.layers.Dense(1, name='deep_output')(deep)
+
+    output = keras.layers.Activation('sigmoid', name='score')(keras.layers.Add()([wide, deep]))
+    model = keras.Model(inputs=inputs, outputs=output, name='wide_deep')
+    model.compile(optimizer='adam', loss='binary_crossentropy')
+    return model
+
+def build_random_model_bundle(db, output_path, model_version=None, embedding_dim=16,
+                              hidden_units=(128, 64), seed=42):
+    """
+    Write a model bundle with a random-weight wide & deep model sized for the database.
+
+    Gives benchmarks and load tests the production inference cost (same
+    inputs, embedding tables sized by the catalog) without a trained model.
+
+    Args:
+        db: SQLAlchemy database instance
+        output_path: Bundle file to write
+        model_version: Version string stored in the bundle
+        embedding_dim: Width of the deep embeddings
+        hidden_units: Sizes of the deep part's hidden layers
+        seed: Seed for the random weights
+
+    Returns:
+        Path of the written bundle
+    """
+    import numpy as np
+    from model_bundle import write_bundle
+
+    vocabularies = build_vocabularies(db)
+    model = build_wide_deep_model({name: len(vocabulary) for name, vocabulary in vocabularies.items()},
+                                  embedding_dim=embedding_dim, hidden_units=hidden_units, seed=seed)
+    weights = [np.asarray(weight, dtype=np.float32) for weight in model.get_weights()]
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    write_bundle(output_path, vocabularies, scaler=build_scaler(db), model_config=model.to_json(),
+                 weights=weights, model_version=model_version,
+                 metadata={'source': 'random weights', 'seed': seed,
+                           'created': datetime.utcnow().isoformat(),
+                           'ratings': db.session.query(func.count(Rating.id)).scalar()})
+    logger.info(f"Random wide & deep bundle with {sum(w.size for w in weights)} parameters written to {output_path}")
+    return output_path